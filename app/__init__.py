@@ -33,6 +33,14 @@ def create_app(config_name=None):
     login_manager.login_message_category = 'error'
 
     from .models import User
+    from . import classification  # noqa: F401 - registers the Expense transfer/lent flag hook
+    from . import rollups  # noqa: F401 - registers the MonthlyRollup flush hooks
+    from . import tags  # noqa: F401 - registers the Expense tag sync hook
+    from . import fingerprints  # noqa: F401 - registers the Expense fingerprint hook
+    from . import search  # noqa: F401 - registers the full-text index DDL
+    from . import fx  # noqa: F401 - registers the exchange rate cache sync hook
+    from . import dashboard  # noqa: F401 - registers the dashboard cache invalidation hooks
+    from . import categorizer  # noqa: F401 - registers the categorizer cache invalidation hook
 
     @login_manager.user_loader
     def load_user(user_id):
@@ -67,6 +75,7 @@ def create_app(config_name=None):
     from .api.auth import auth_bp
     from .routes_push import push_bp
     from .routes_shared_wallets import shared_wallets_bp
+    from .routes_exports import exports_bp
 
     app.register_blueprint(main)
     app.register_blueprint(auth)
@@ -96,6 +105,7 @@ def create_app(config_name=None):
     app.register_blueprint(auth_bp)
     app.register_blueprint(push_bp)
     app.register_blueprint(shared_wallets_bp)
+    app.register_blueprint(exports_bp)
 
     # Serve service worker from root scope
     @app.route('/sw.js')
@@ -106,7 +116,8 @@ def create_app(config_name=None):
         }
 
     # Register management CLI commands
-    from .management import db_commands
+    from .management import db_commands, worker
     app.cli.add_command(db_commands)
+    app.cli.add_command(worker)
 
     return app
@@ -0,0 +1,430 @@
+"""
+Period totals for dashboards and reports.
+
+Every trend chart used to loop over its months and run one SUM() per source
+table per month, plus a FinancialSummary lookup each time. The helpers here
+answer the same questions for any number of periods with one GROUP BY per
+source table (Expense, DebtPayment, DebtorPayment, ContractPayment) and a
+single FinancialSummary query:
+
+* ``monthly_totals``   - calendar months, with monthly summaries merged in
+* ``yearly_totals``    - calendar years, with yearly summaries merged in
+* ``range_totals``     - arbitrary, possibly overlapping [start, end) ranges
+* ``SummaryIndex``     - the dashboard's "history first, live data after" rule
+* ``query_total``      - count and converted total of any filtered Expense query
+* ``category_totals``  - totals per category, converted in SQL at current rates
+
+Monthly figures in a target currency are converted at the rate in effect at
+the end of each month (see app.fx.convert_amounts); other totals use the
+current rate.
+
+Income and expense exclude transfers and ``lent`` counts money-lent expenses
+that are not transfers, both read from the flags stored on Expense (see
+app.classification).
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, extract, func, literal, select
+
+from . import db
+from .fx import convert_amounts, current_rate_table
+from .models import Category, ContractPayment, DebtPayment, DebtorPayment, Expense, FinancialSummary, Wallet
+from .rollups import rollup_month_totals
+from .utils import get_exchange_rate
+
+PAYMENT_FIELDS = {
+    'debt_payment': (DebtPayment, 'date'),
+    'debtor_payment': (DebtorPayment, 'date'),
+    'contract_payment': (ContractPayment, 'payment_date'),
+}
+
+
+def _normalize_currency(code, fallback='GHS'):
+    fallback_currency = (fallback or 'GHS').upper().strip()[:10] or 'GHS'
+    normalized_currency = (code or fallback_currency).upper().strip()[:10]
+    return normalized_currency or fallback_currency
+
+
+class PeriodTotals:
+    """Income/expense/lent and extra-payment totals for one period.
+
+    When a FinancialSummary covers the period it is the final word: income
+    and expense come from the summary and the live extras are zeroed, so the
+    ``total_*`` and ``actual_*`` figures all equal the summary values.
+    """
+
+    FIELDS = ('income', 'expense', 'lent', 'debt_payment', 'debtor_payment', 'contract_payment')
+
+    def __init__(self, **values):
+        for name in self.FIELDS:
+            setattr(self, name, float(values.get(name) or 0))
+        self.summary = None
+
+    @classmethod
+    def from_summary(cls, summary):
+        totals = cls(income=summary.total_income, expense=summary.total_expense)
+        totals.summary = summary
+        return totals
+
+    def add(self, other):
+        for name in self.FIELDS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    @property
+    def total_expense(self):
+        """Expenses including debt repayments."""
+        return self.expense + self.debt_payment
+
+    @property
+    def total_income(self):
+        """Income including debtor and contract collections."""
+        return self.income + self.debtor_payment + self.contract_payment
+
+    @property
+    def actual_expense(self):
+        """Spending net of money lent and debt repayments."""
+        return self.total_expense - self.lent - self.debt_payment
+
+    @property
+    def actual_income(self):
+        """Income net of debtor and contract collections."""
+        return self.total_income - self.debtor_payment - self.contract_payment
+
+    def __repr__(self):
+        return f'<PeriodTotals +{self.total_income:.2f} / -{self.total_expense:.2f}>'
+
+
+class SummaryIndex:
+    """A user's FinancialSummary rows, loaded once and indexed by period."""
+
+    def __init__(self, summaries):
+        self.monthly = {}
+        self.yearly = {}
+        for summary in summaries:
+            if summary.month:
+                self.monthly[(summary.year, summary.month)] = summary
+            else:
+                self.yearly[summary.year] = summary
+
+    @classmethod
+    def load(cls, user_id, years=None):
+        query = FinancialSummary.query.filter(FinancialSummary.user_id == user_id)
+        if years is not None:
+            query = query.filter(FinancialSummary.year.in_(list(years)))
+        return cls(query.all())
+
+    def all(self):
+        return list(self.monthly.values()) + list(self.yearly.values())
+
+    def latest_period(self):
+        """(year, month) of the newest summary; yearly summaries count as December."""
+        periods = [(y, m) for y, m in self.monthly] + [(y, 12) for y in self.yearly]
+        return max(periods) if periods else None
+
+    def live_start(self, default):
+        """First day after the newest summary, where live data takes over."""
+        latest = self.latest_period()
+        if not latest:
+            return default
+        year, month = latest
+        return datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+
+    def oldest_year(self, since_year=None):
+        years = [s.year for s in self.all() if since_year is None or s.year >= since_year]
+        return min(years) if years else None
+
+    def totals(self, since_year=None, year=None):
+        """Summed (income, expense) of the summaries matching the filters."""
+        income = expense = 0.0
+        for summary in self.all():
+            if since_year is not None and summary.year < since_year:
+                continue
+            if year is not None and summary.year != year:
+                continue
+            income += summary.total_income or 0
+            expense += summary.total_expense or 0
+        return income, expense
+
+
+def special_category_ids(user_id):
+    """Return (transfer_id, money_lent_id), using -1 when a category is missing."""
+    rows = Category.query.with_entities(Category.name, Category.id).filter(
+        Category.user_id == user_id,
+        Category.name.in_(('Transfer', 'Money Lent'))
+    ).all()
+    ids = {name: cid for name, cid in rows}
+    return ids.get('Transfer', -1), ids.get('Money Lent', -1)
+
+
+class _CurrencyConverter:
+    """Convert grouped sums into one currency, fetching each rate once."""
+
+    def __init__(self, target):
+        self.target = _normalize_currency(target)
+        self.rates = {}
+
+    def __call__(self, amount, from_currency):
+        source = _normalize_currency(from_currency, fallback=self.target)
+        if source == self.target:
+            return float(amount or 0)
+        if source not in self.rates:
+            self.rates[source] = get_exchange_rate(source, self.target)
+        return float(amount or 0) * self.rates[source]
+
+
+def _stored_amount(target):
+    """Expressions for the currency an Expense amount is really stored in.
+
+    Returns ``(wallet_currency, legacy_currency, amount)``. Wallets in
+    ``target`` may hold legacy rows whose amount was never converted from
+    original_currency; for those ``legacy_currency`` is that currency and
+    ``amount`` is original_amount, otherwise they are NULL and Expense.amount.
+    Needs Wallet joined to Expense.
+    """
+    target = _normalize_currency(target)
+    wallet_currency = func.upper(func.trim(func.coalesce(Wallet.currency, 'GHS')))
+    original_currency = func.upper(func.trim(func.coalesce(Expense.original_currency, wallet_currency)))
+    legacy = and_(
+        wallet_currency == target,
+        Expense.original_amount.isnot(None),
+        original_currency != target,
+        func.abs(Expense.amount - Expense.original_amount) < 0.01,
+    )
+    return (wallet_currency, case((legacy, original_currency), else_=None),
+            case((legacy, Expense.original_amount), else_=Expense.amount))
+
+
+def _expense_sums(user_id, bucket, where, currency, as_of=None):
+    """Yield (bucket, field, amount) for income/expense/lent grouped by ``bucket``.
+
+    With ``currency`` set, rows are also grouped by the currency their amount
+    is stored in so the few resulting sums can be converted (see ``_stored_amount``).
+    ``as_of`` maps a bucket key to the date whose rate applies to it.
+    """
+    keys = [bucket if bucket is not None else literal(0).label('bucket')]
+    columns = [Expense.transaction_type, Expense.is_transfer, Expense.is_money_lent]
+    amount = Expense.amount
+    query_from = Expense.__table__
+
+    if currency:
+        wallet_currency, legacy_currency, amount = _stored_amount(currency)
+        columns += [wallet_currency, legacy_currency]
+        query_from = Expense.__table__.outerjoin(Wallet.__table__, Expense.wallet_id == Wallet.id)
+
+    query = select(*keys, *columns, func.sum(amount)).select_from(query_from).where(
+        Expense.user_id == user_id,
+        Expense.transaction_type.in_(('income', 'expense')),
+        *where
+    ).group_by(*([bucket] if bucket is not None else []), *columns)
+
+    rows = db.session.execute(query).all()
+    totals = [float(row[-1] or 0) for row in rows]
+    if currency and rows:
+        if as_of:
+            dates = [as_of(row[0]) for row in rows]
+            totals = convert_amounts(totals, [row[5] or row[4] for row in rows], dates, currency).tolist()
+        else:
+            convert = _CurrencyConverter(currency)
+            totals = [convert(total, row[5] or row[4]) for row, total in zip(rows, totals)]
+    for row, total in zip(rows, totals):
+        key, transaction_type, is_transfer, is_lent = row[0], row[1], row[2], row[3]
+        if not is_transfer:
+            yield key, transaction_type, total
+        if is_lent and not is_transfer and transaction_type == 'expense':
+            yield key, 'lent', total
+
+
+def _payment_sums(user_id, bucket_for, where_for):
+    """Yield (bucket, field, amount) for each extra-payment table, one query each."""
+    for field, (model, date_field) in PAYMENT_FIELDS.items():
+        date_column = getattr(model, date_field)
+        bucket = bucket_for(date_column)
+        query = select(bucket if bucket is not None else literal(0), func.sum(model.amount)).where(
+            model.user_id == user_id, *where_for(date_column)
+        )
+        if bucket is not None:
+            query = query.group_by(bucket)
+        for key, total in db.session.execute(query):
+            yield key, field, float(total or 0)
+
+
+def _collect(user_id, bucket_for, where_for, currency, as_of=None):
+    buckets = {}
+    sums = list(_expense_sums(user_id, bucket_for(Expense.date), where_for(Expense.date), currency, as_of))
+    sums += list(_payment_sums(user_id, bucket_for, where_for))
+    for key, field, total in sums:
+        totals = buckets.setdefault(key, PeriodTotals())
+        setattr(totals, field, getattr(totals, field) + total)
+    return buckets
+
+
+def _month_bounds(months):
+    first_y, first_m = min(months)
+    last_y, last_m = max(months)
+    end = datetime(last_y + 1, 1, 1) if last_m == 12 else datetime(last_y, last_m + 1, 1)
+    return datetime(first_y, first_m, 1), end
+
+
+def _month_end(year, month):
+    return (datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)) - timedelta(seconds=1)
+
+
+def last_months(count, now=None):
+    """The ``count`` calendar months ending with the current one, oldest first."""
+    now = now or datetime.utcnow()
+    months = []
+    year, month = now.year, now.month
+    for _ in range(count):
+        months.append((year, month))
+        month -= 1
+        if month == 0:
+            month, year = 12, year - 1
+    return list(reversed(months))
+
+
+def monthly_totals(user_id, months, currency=None, summaries=None, transfer_id=None, lent_id=None):
+    """Return {(year, month): PeriodTotals} for ``months`` in O(1) queries.
+
+    Without ``currency`` the figures come from the MonthlyRollup table. With a
+    target currency they are grouped from the raw tables and each month is
+    converted at the rate in effect when it ended.
+    Monthly FinancialSummary rows replace live figures for their month; pass
+    a SummaryIndex to reuse one already loaded, or ``False`` to skip them.
+    """
+    months = list(months)
+    if not months:
+        return {}
+    if currency is None:
+        if transfer_id is None or lent_id is None:
+            transfer_id, lent_id = special_category_ids(user_id)
+        rolled = rollup_month_totals(user_id, months, transfer_id, lent_id)
+        result = {period: PeriodTotals(**rolled[period]) for period in months}
+    else:
+        start, end = _month_bounds(months)
+        buckets = _collect(
+            user_id,
+            lambda column: extract('year', column) * 100 + extract('month', column),
+            lambda column: (column >= start, column < end),
+            currency,
+            as_of=lambda key: _month_end(int(key) // 100, int(key) % 100),
+        )
+        buckets = {int(key): totals for key, totals in buckets.items()}
+        result = {(y, m): buckets.get(y * 100 + m, PeriodTotals()) for y, m in months}
+
+    if summaries is not False:
+        if summaries is None:
+            summaries = SummaryIndex.load(user_id, {y for y, _ in months})
+        for period in months:
+            if period in summaries.monthly:
+                result[period] = PeriodTotals.from_summary(summaries.monthly[period])
+    return result
+
+
+def yearly_totals(user_id, years, currency=None):
+    """Return {year: PeriodTotals}; a yearly FinancialSummary overrides its whole year."""
+    years = sorted(set(years))
+    if not years:
+        return {}
+    summaries = SummaryIndex.load(user_id, years)
+    months = [(y, m) for y in years for m in range(1, 13)]
+    by_month = monthly_totals(user_id, months, currency=currency, summaries=summaries)
+
+    result = {}
+    for year in years:
+        if year in summaries.yearly:
+            result[year] = PeriodTotals.from_summary(summaries.yearly[year])
+            continue
+        totals = PeriodTotals()
+        for month in range(1, 13):
+            totals.add(by_month[(year, month)])
+        result[year] = totals
+    return result
+
+
+def range_totals(user_id, periods, currency=None):
+    """Return {key: PeriodTotals} for ``periods`` = {key: (start, end)}.
+
+    Either bound may be None for an open range. Ranges may overlap: rows are
+    bucketed once into the segments between all distinct boundaries and each
+    range is the sum of the segments it covers. FinancialSummary rows are not
+    applied here; see SummaryIndex.
+    """
+    boundaries = sorted({b for start, end in periods.values() for b in (start, end) if b is not None})
+
+    def bucket_for(column):
+        if not boundaries:
+            return None
+        return case(*[(column < b, i) for i, b in enumerate(boundaries)], else_=len(boundaries))
+
+    starts = [start for start, _ in periods.values()]
+    ends = [end for _, end in periods.values()]
+
+    def where_for(column):
+        clauses = []
+        if starts and None not in starts:
+            clauses.append(column >= min(starts))
+        if ends and None not in ends:
+            clauses.append(column < max(ends))
+        return clauses
+
+    buckets = _collect(user_id, bucket_for, where_for, currency)
+
+    result = {}
+    for key, (start, end) in periods.items():
+        totals = PeriodTotals()
+        for index, segment in buckets.items():
+            lower = boundaries[index - 1] if index > 0 else None
+            upper = boundaries[index] if index < len(boundaries) else None
+            if start is not None and (lower is None or lower < start):
+                continue
+            if end is not None and (upper is None or upper > end):
+                continue
+            totals.add(segment)
+        result[key] = totals
+    return result
+
+
+def query_total(query, currency):
+    """Count the rows of an Expense query and sum their amounts in ``currency``.
+
+    One query grouped by stored currency replaces loading every row to
+    convert it in Python. Returns ``(count, total)``.
+    """
+    wallet_currency, legacy_currency, amount = _stored_amount(currency)
+    source_currency = func.coalesce(legacy_currency, wallet_currency)
+    rows = (query.order_by(None)
+            .outerjoin(Wallet, Expense.wallet_id == Wallet.id)
+            .with_entities(source_currency, func.count(Expense.id), func.sum(amount))
+            .group_by(source_currency))
+
+    convert = _CurrencyConverter(currency)
+    count, total = 0, 0.0
+    for source, rows_in_group, group_total in rows:
+        count += rows_in_group
+        total += convert(group_total, source)
+    return count, total
+
+
+def category_totals(user_id, currency, *where):
+    """Return {category_id: total} of matching Expense rows converted into ``currency``.
+
+    Conversion happens in the database: amounts are normalised with the
+    legacy ``original_amount`` CASE (``_stored_amount``) and multiplied by the
+    current rate joined from ``current_rate_table``, so only one row per
+    category comes back. Pairs without a stored rate count at 1.0.
+    """
+    currency = _normalize_currency(currency)
+    wallet_currency, legacy_currency, amount = _stored_amount(currency)
+    source_currency = func.coalesce(legacy_currency, wallet_currency)
+    rates = current_rate_table(currency)
+    rate = case((source_currency == currency, 1.0), else_=func.coalesce(rates.c.rate, 1.0))
+    query = (select(Expense.category_id, func.sum(amount * rate))
+             .select_from(Expense.__table__
+                          .outerjoin(Wallet.__table__, Expense.wallet_id == Wallet.id)
+                          .outerjoin(rates, rates.c.currency == source_currency))
+             .where(Expense.user_id == user_id, Expense.category_id.isnot(None), *where)
+             .group_by(Expense.category_id)
+             .order_by(func.min(Expense.date), func.min(Expense.id)))
+    return {category_id: float(total or 0) for category_id, total in db.session.execute(query)}
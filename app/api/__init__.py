@@ -1,72 +1,75 @@
-from flask import Blueprint, jsonify, request, g, current_app
+from flask import Blueprint, abort, jsonify, request, g, current_app
+from werkzeug.exceptions import BadRequest
 from functools import wraps
 from werkzeug.security import check_password_hash
 from datetime import datetime
 import time
 import threading
 
+from ..pagination import decode_cursor, keyset_page
+from .ratelimit import DEFAULT_IDLE_TTL, create_backend
+
 api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
 
-# Rate limiting configuration
+# Rate limiting configuration (defaults; ApiKey.rate_limit overrides per key)
 RATE_LIMIT = 100  # requests per window
 RATE_WINDOW = 60  # seconds (1 minute)
-rate_limit_store = {}  # {api_key_id: {'tokens': int, 'last_update': float}}
-rate_lock = threading.Lock()
 
 
-class TokenBucket:
-    """Token bucket rate limiter for each API key."""
-    
-    def __init__(self, capacity, refill_rate):
-        self.capacity = capacity
-        self.refill_rate = refill_rate  # tokens per second
-        self.tokens = capacity
-        self.last_update = time.time()
-    
-    def consume(self, tokens=1):
-        """Try to consume tokens. Returns True if successful, False if rate limited."""
-        now = time.time()
-        elapsed = now - self.last_update
-        
-        # Refill tokens based on elapsed time
-        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
-        self.last_update = now
-        
-        if self.tokens >= tokens:
-            self.tokens -= tokens
-            return True
-        return False
-    
-    def get_remaining(self):
-        """Get remaining tokens."""
-        now = time.time()
-        elapsed = now - self.last_update
-        tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
-        return int(tokens)
-    
-    def get_reset_time(self):
-        """Get seconds until bucket is fully refilled."""
-        tokens_needed = self.capacity - self.tokens
-        return int(tokens_needed / self.refill_rate) if self.refill_rate > 0 else 0
+def find_api_key(raw_key):
+    """Return the ApiKey matching ``raw_key`` (active or not, for prefixed keys), or None.
 
+    Prefixed keys cost one indexed lookup and one digest comparison. Keys
+    without a stored prefix are legacy PBKDF2 rows; the match is rehashed so
+    its next use takes the fast path too. Only raw keys that are not in
+    ``ft_<prefix>_<secret>`` form are checked against the active legacy rows,
+    so a bad new-style key never pays for a PBKDF2 scan.
+    """
+    from ..models import ApiKey
+    from .. import db
 
-def get_rate_limiter(api_key_id):
-    """Get or create rate limiter for an API key."""
-    with rate_lock:
-        if api_key_id not in rate_limit_store:
-            # refill_rate = capacity / window (tokens per second)
-            refill_rate = RATE_LIMIT / RATE_WINDOW
-            rate_limit_store[api_key_id] = TokenBucket(RATE_LIMIT, refill_rate)
-        return rate_limit_store[api_key_id]
+    key = ApiKey.query.filter_by(key_prefix=ApiKey.prefix_of(raw_key)).first()
+    if key:
+        return key if key.check_key(raw_key) else None
+    if ApiKey.is_prefixed(raw_key):
+        return None
 
+    for legacy in ApiKey.query.filter(ApiKey.key_prefix.is_(None), ApiKey.is_active.is_(True)):
+        if check_password_hash(legacy.key_hash, raw_key):
+            legacy.set_key(raw_key)
+            db.session.commit()
+            return legacy
+    return None
 
-def check_rate_limit(api_key_id):
+
+def current_api_key():
+    """The active ApiKey sent with this request, resolved once and kept on ``g``."""
+    raw_key = request.headers.get('X-API-Key') or request.args.get('api_key')
+    cached = g.get('api_key_lookup')
+    if cached is None or cached[0] != raw_key:
+        key = find_api_key(raw_key) if raw_key else None
+        g.api_key_lookup = (raw_key, key if key and key.is_active else None)
+    return g.api_key_lookup[1]
+
+
+def get_rate_limiter():
+    """The app's rate-limit backend, built from RATELIMIT_STORAGE_URL on first use."""
+    backend = current_app.extensions.get('api_rate_limiter')
+    if backend is None:
+        backend = create_backend(current_app.config.get('RATELIMIT_STORAGE_URL'),
+                                 current_app.config.get('RATELIMIT_IDLE_TTL', DEFAULT_IDLE_TTL))
+        current_app.extensions['api_rate_limiter'] = backend
+    return backend
+
+
+def check_rate_limit(api_key_id, limit=RATE_LIMIT):
     """Check if request is within rate limit. Returns (allowed, remaining, reset_time)."""
-    limiter = get_rate_limiter(api_key_id)
-    allowed = limiter.consume()
-    remaining = limiter.get_remaining()
-    reset_time = limiter.get_reset_time()
-    return allowed, remaining, reset_time
+    try:
+        return get_rate_limiter().hit(f'api_key:{api_key_id}', limit, RATE_WINDOW)
+    except Exception:
+        # A broken shared store should not take the API down with it
+        current_app.logger.exception('Rate limit backend failed; allowing request')
+        return True, limit, 0
 
 
 @api_bp.before_request
@@ -87,21 +90,16 @@ def check_api_rate_limit():
         return None
     
     # Validate key and get api_key_id
-    from ..models import ApiKey
-    api_keys = ApiKey.query.filter_by(is_active=True).all()
-    matched = None
-    for ak in api_keys:
-        if check_password_hash(ak.key_hash, key):
-            matched = ak
-            break
-    
+    matched = current_api_key()
     if not matched:
         return None
     
     # Check rate limit
-    allowed, remaining, reset_time = check_rate_limit(matched.id)
+    limit = matched.rate_limit or current_app.config.get('API_RATE_LIMIT', RATE_LIMIT)
+    allowed, remaining, reset_time = check_rate_limit(matched.id, limit)
     
     # Store for after_request
+    g.rate_limit_limit = limit
     g.rate_limit_allowed = allowed
     g.rate_limit_remaining = remaining
     g.rate_limit_reset = reset_time
@@ -109,12 +107,12 @@ def check_api_rate_limit():
     if not allowed:
         response = jsonify({
             'error': 'Rate limit exceeded',
-            'message': f'Maximum {RATE_LIMIT} requests per minute allowed',
+            'message': f'Maximum {limit} requests per minute allowed',
             'retry_after': reset_time
         })
         response.status_code = 429
         response.headers['Retry-After'] = str(reset_time)
-        response.headers['X-RateLimit-Limit'] = str(RATE_LIMIT)
+        response.headers['X-RateLimit-Limit'] = str(limit)
         response.headers['X-RateLimit-Remaining'] = '0'
         response.headers['X-RateLimit-Reset'] = str(reset_time)
         return response
@@ -126,7 +124,7 @@ def check_api_rate_limit():
 def add_rate_limit_headers(response):
     """Add rate limit headers to response."""
     if hasattr(g, 'rate_limit_allowed') and hasattr(g, 'rate_limit_remaining'):
-        response.headers['X-RateLimit-Limit'] = str(RATE_LIMIT)
+        response.headers['X-RateLimit-Limit'] = str(g.get('rate_limit_limit', RATE_LIMIT))
         response.headers['X-RateLimit-Remaining'] = str(g.rate_limit_remaining)
         if hasattr(g, 'rate_limit_reset'):
             response.headers['X-RateLimit-Reset'] = str(g.rate_limit_reset)
@@ -138,20 +136,13 @@ def require_api_key(permission='read'):
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
-            from ..models import ApiKey
             from .. import db
 
             key = request.headers.get('X-API-Key') or request.args.get('api_key')
             if not key:
                 return jsonify({'error': 'API key required. Pass via X-API-Key header or api_key query parameter.'}), 401
 
-            api_keys = ApiKey.query.filter_by(is_active=True).all()
-            matched = None
-            for ak in api_keys:
-                if check_password_hash(ak.key_hash, key):
-                    matched = ak
-                    break
-
+            matched = current_api_key()
             if not matched:
                 return jsonify({'error': 'Invalid API key'}), 401
 
@@ -168,18 +159,67 @@ def require_api_key(permission='read'):
     return decorator
 
 
-def paginate_query(query):
-    """Apply pagination to a SQLAlchemy query and return (items, meta)."""
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 20, type=int), 100)
-    total = query.count()
-    items = query.offset((page - 1) * per_page).limit(per_page).all()
-    return items, {
-        'page': page,
-        'per_page': per_page,
-        'total': total,
-        'pages': (total + per_page - 1) // per_page
-    }
+@api_bp.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify({'error': error.description}), 400
+
+
+COUNT_CACHE_TTL = 30  # seconds
+COUNT_CACHE_MAX = 1024
+count_cache = {}  # {(user_id, sql, params): (count, expires_at)}
+count_lock = threading.Lock()
+
+
+def cached_count(query):
+    """``query.count()`` memoized briefly per API user, so paging clients don't recount every page."""
+    compiled = query.statement.compile()
+    key = (g.get('api_user_id'), str(compiled), repr(sorted(compiled.params.items())))
+    now = time.time()
+    with count_lock:
+        hit = count_cache.get(key)
+        if hit and hit[1] > now:
+            return hit[0]
+
+    total = query.order_by(None).count()
+    with count_lock:
+        if len(count_cache) >= COUNT_CACHE_MAX:
+            for stale in [k for k, (_, expires) in count_cache.items() if expires <= now]:
+                del count_cache[stale]
+            while len(count_cache) >= COUNT_CACHE_MAX:
+                count_cache.pop(next(iter(count_cache)))
+        count_cache[key] = (total, now + COUNT_CACHE_TTL)
+    return total
+
+
+def paginate_query(query, keys):
+    """Apply pagination to a SQLAlchemy query and return (items, meta).
+
+    ``keys`` are the columns the list is ordered by, newest first, ending in
+    the primary key. Pass ``?cursor=`` (empty for the first page) to page by
+    keyset using ``meta['next_cursor']``; otherwise ``page``/``per_page`` apply.
+    ``include_total=false`` skips the COUNT in either mode.
+    """
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), 100))
+    include_total = request.args.get('include_total', 'true').lower() not in ('false', '0', 'no')
+    query = query.order_by(None)
+
+    if 'cursor' in request.args:
+        cursor = request.args.get('cursor')
+        if cursor and decode_cursor(cursor, keys) is None:
+            abort(400, description='Invalid cursor')
+        items, next_cursor = keyset_page(query, keys, cursor, per_page)
+        meta = {'per_page': per_page, 'next_cursor': next_cursor}
+        if include_total:
+            meta['total'] = cached_count(query)
+        return items, meta
+
+    page = max(1, request.args.get('page', 1, type=int))
+    items = query.order_by(*[key.desc() for key in keys]).offset((page - 1) * per_page).limit(per_page).all()
+    meta = {'page': page, 'per_page': per_page}
+    if include_total:
+        total = cached_count(query)
+        meta.update(total=total, pages=(total + per_page - 1) // per_page)
+    return items, meta
 
 
 # Import and register route modules
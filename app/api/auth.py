@@ -75,19 +75,11 @@ def require_api_or_jwt_auth(f):
                 return f(*args, **kwargs)
         
         # Check for API key
-        from ..models import ApiKey
-        from .. import db
-        from werkzeug.security import check_password_hash
-        
+        from . import current_api_key
+
         key = request.headers.get('X-API-Key') or request.args.get('api_key')
         if key:
-            api_keys = ApiKey.query.filter_by(is_active=True).all()
-            matched = None
-            for ak in api_keys:
-                if check_password_hash(ak.key_hash, key):
-                    matched = ak
-                    break
-            
+            matched = current_api_key()
             if matched:
                 g.api_user_id = matched.user_id
                 g.auth_type = 'api_key'
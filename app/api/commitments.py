@@ -29,8 +29,8 @@ def serialize_commitment(c):
 @api_bp.route('/commitments', methods=['GET'])
 @require_api_key('read')
 def list_commitments():
-    query = Commitment.query.filter_by(user_id=g.api_user_id).order_by(Commitment.created_at.desc())
-    items, meta = paginate_query(query)
+    query = Commitment.query.filter_by(user_id=g.api_user_id)
+    items, meta = paginate_query(query, [Commitment.id])
     return jsonify({'data': [serialize_commitment(c) for c in items], 'meta': meta})
 
 
@@ -27,8 +27,8 @@ def serialize_creditor(c):
 @api_bp.route('/creditors', methods=['GET'])
 @require_api_key('read')
 def list_creditors():
-    query = Creditor.query.filter_by(user_id=g.api_user_id).order_by(Creditor.created_at.desc())
-    items, meta = paginate_query(query)
+    query = Creditor.query.filter_by(user_id=g.api_user_id)
+    items, meta = paginate_query(query, [Creditor.id])
     return jsonify({'data': [serialize_creditor(c) for c in items], 'meta': meta})
 
 
@@ -26,8 +26,8 @@ def serialize_debtor(d):
 @api_bp.route('/debtors', methods=['GET'])
 @require_api_key('read')
 def list_debtors():
-    query = Debtor.query.filter_by(user_id=g.api_user_id).order_by(Debtor.created_at.desc())
-    items, meta = paginate_query(query)
+    query = Debtor.query.filter_by(user_id=g.api_user_id)
+    items, meta = paginate_query(query, [Debtor.id])
     return jsonify({'data': [serialize_debtor(d) for d in items], 'meta': meta})
 
 
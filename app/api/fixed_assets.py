@@ -30,8 +30,8 @@ def serialize_asset(a):
 @api_bp.route('/fixed-assets', methods=['GET'])
 @require_api_key('read')
 def list_fixed_assets():
-    query = FixedAsset.query.filter_by(user_id=g.api_user_id).order_by(FixedAsset.created_at.desc())
-    items, meta = paginate_query(query)
+    query = FixedAsset.query.filter_by(user_id=g.api_user_id)
+    items, meta = paginate_query(query, [FixedAsset.id])
     return jsonify({'data': [serialize_asset(a) for a in items], 'meta': meta})
 
 
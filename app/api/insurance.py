@@ -29,8 +29,8 @@ def serialize_policy(p):
 @api_bp.route('/insurance', methods=['GET'])
 @require_api_key('read')
 def list_insurance_policies():
-    query = InsurancePolicy.query.filter_by(user_id=g.api_user_id).order_by(InsurancePolicy.created_at.desc())
-    items, meta = paginate_query(query)
+    query = InsurancePolicy.query.filter_by(user_id=g.api_user_id)
+    items, meta = paginate_query(query, [InsurancePolicy.id])
     return jsonify({'data': [serialize_policy(p) for p in items], 'meta': meta})
 
 
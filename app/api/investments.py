@@ -39,8 +39,8 @@ def serialize_dividend(d):
 @api_bp.route('/investments', methods=['GET'])
 @require_api_key('read')
 def list_investments():
-    query = Investment.query.filter_by(user_id=g.api_user_id).order_by(Investment.created_at.desc())
-    items, meta = paginate_query(query)
+    query = Investment.query.filter_by(user_id=g.api_user_id)
+    items, meta = paginate_query(query, [Investment.id])
     return jsonify({'data': [serialize_investment(i) for i in items], 'meta': meta})
 
 
@@ -27,8 +27,8 @@ def serialize_pension(p):
 @api_bp.route('/pensions', methods=['GET'])
 @require_api_key('read')
 def list_pension_schemes():
-    query = PensionScheme.query.filter_by(user_id=g.api_user_id).order_by(PensionScheme.created_at.desc())
-    items, meta = paginate_query(query)
+    query = PensionScheme.query.filter_by(user_id=g.api_user_id)
+    items, meta = paginate_query(query, [PensionScheme.id])
     return jsonify({'data': [serialize_pension(p) for p in items], 'meta': meta})
 
 
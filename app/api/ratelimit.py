@@ -0,0 +1,319 @@
+"""
+Rate-limit storage backends for the API.
+
+Each backend answers one question, ``hit(key, limit, window)``: may this key
+make another request, given an allowance of ``limit`` requests per ``window``
+seconds? It returns ``(allowed, remaining, reset_seconds)``.
+
+- ``MemoryBackend``  - token buckets in a dict; per process, so only right for
+                       a single worker. Idle buckets are swept periodically.
+- ``SQLiteBackend``  - token buckets in a shared SQLite file, updated inside
+                       ``BEGIN IMMEDIATE`` so workers on one host agree.
+- ``RedisBackend``   - fixed-window counters over the Redis protocol
+                       (``SET NX EX`` + ``INCR``); expiry evicts idle keys.
+
+``create_backend`` picks one from ``RATELIMIT_STORAGE_URL``: ``memory://``,
+``sqlite:////path/to/limits.db`` or ``redis://[:password@]host:port/db``.
+"""
+
+import logging
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_TTL = 600  # seconds without requests before a bucket is dropped
+
+
+class RateLimitBackend:
+    def hit(self, key, limit, window):
+        raise NotImplementedError
+
+    def evict_idle(self, now=None):
+        """Drop state for keys idle longer than the idle TTL. Returns how many were dropped."""
+        return 0
+
+
+class TokenBucket:
+    """Token bucket rate limiter for each API key."""
+
+    def __init__(self, capacity, refill_rate, now=None):
+        self.capacity = capacity
+        self.refill_rate = refill_rate  # tokens per second
+        self.tokens = capacity
+        self.last_update = time.time() if now is None else now
+
+    def resize(self, capacity, refill_rate):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = min(self.tokens, capacity)
+
+    def consume(self, tokens=1, now=None):
+        """Try to consume tokens. Returns True if successful, False if rate limited."""
+        now = time.time() if now is None else now
+        elapsed = now - self.last_update
+
+        # Refill tokens based on elapsed time
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+        self.last_update = now
+
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def get_remaining(self):
+        """Get remaining tokens."""
+        return int(self.tokens)
+
+    def get_reset_time(self):
+        """Get seconds until bucket is fully refilled."""
+        tokens_needed = self.capacity - self.tokens
+        return int(tokens_needed / self.refill_rate) if self.refill_rate > 0 else 0
+
+
+class MemoryBackend(RateLimitBackend):
+    def __init__(self, idle_ttl=DEFAULT_IDLE_TTL, sweep_interval=60):
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.last_sweep = time.time()
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        refill_rate = limit / window
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(limit, refill_rate, now)
+            elif bucket.capacity != limit or bucket.refill_rate != refill_rate:
+                bucket.resize(limit, refill_rate)
+            allowed = bucket.consume(now=now)
+            result = allowed, bucket.get_remaining(), bucket.get_reset_time()
+            if now - self.last_sweep >= self.sweep_interval:
+                self._evict(now)
+        return result
+
+    def _evict(self, now):
+        idle = [key for key, bucket in self.buckets.items() if now - bucket.last_update > self.idle_ttl]
+        for key in idle:
+            del self.buckets[key]
+        self.last_sweep = now
+        return len(idle)
+
+    def evict_idle(self, now=None):
+        with self.lock:
+            return self._evict(time.time() if now is None else now)
+
+
+class SQLiteBackend(RateLimitBackend):
+    """Token buckets in one SQLite file shared by every worker on the host."""
+
+    def __init__(self, path, idle_ttl=DEFAULT_IDLE_TTL, sweep_interval=60):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.local = threading.local()
+        self.last_sweep = time.time()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limit_bucket ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self.local.conn = conn
+        return conn
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        refill_rate = limit / window
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT tokens, updated_at FROM rate_limit_bucket WHERE key = ?', (key,)
+            ).fetchone()
+            bucket = TokenBucket(limit, refill_rate, now)
+            if row:
+                bucket.tokens, bucket.last_update = min(row[0], limit), row[1]
+            allowed = bucket.consume(now=now)
+            conn.execute(
+                'INSERT INTO rate_limit_bucket (key, tokens, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                (key, bucket.tokens, now),
+            )
+            if now - self.last_sweep >= self.sweep_interval:
+                self._evict(conn, now)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, bucket.get_remaining(), bucket.get_reset_time()
+
+    def _evict(self, conn, now):
+        self.last_sweep = now
+        return conn.execute(
+            'DELETE FROM rate_limit_bucket WHERE updated_at < ?', (now - self.idle_ttl,)
+        ).rowcount
+
+    def evict_idle(self, now=None):
+        conn = self._connection()
+        return self._evict(conn, time.time() if now is None else now)
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisConnection:
+    """Just enough of the Redis wire protocol (RESP) to pipeline simple commands."""
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None, timeout=2.0):
+        self.address = (host, port)
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def _connect(self):
+        self.sock = socket.create_connection(self.address, timeout=self.timeout)
+        self.reader = self.sock.makefile('rb')
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            self._roundtrip(setup)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.reader.close()
+                self.sock.close()
+            finally:
+                self.sock = self.reader = None
+
+    @staticmethod
+    def _encode(command):
+        parts = [b'*%d\r\n' % len(command)]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Redis connection closed')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            # Returned, not raised, so the caller still reads the replies after it
+            return RedisError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise RedisError(f'Unexpected reply: {line!r}')
+
+    def _read_replies(self, count):
+        """Read ``count`` replies; error replies come back as RedisError instances."""
+        return [self._read_reply() for _ in range(count)]
+
+    @staticmethod
+    def _check(replies):
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def _roundtrip(self, commands):
+        self.sock.sendall(b''.join(self._encode(c) for c in commands))
+        return self._check(self._read_replies(len(commands)))
+
+    def pipeline(self, *commands):
+        """Send ``commands`` in one round trip and return their replies.
+
+        An idle connection the server has dropped is reopened once, but only
+        when sending fails: once the commands may have reached Redis they are
+        never resent, since INCR is not idempotent. Any failure other than an
+        error reply closes the connection so no unread replies are left on it.
+        """
+        payload = b''.join(self._encode(c) for c in commands)
+        try:
+            if self.sock is None:
+                self._connect()
+                self.sock.sendall(payload)
+            else:
+                try:
+                    self.sock.sendall(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close()
+                    self._connect()
+                    self.sock.sendall(payload)
+            replies = self._read_replies(len(commands))
+        except Exception:
+            self.close()
+            raise
+        return self._check(replies)
+
+
+class RedisBackend(RateLimitBackend):
+    """Fixed-window counters: ``SET key 0 EX window NX`` then ``INCR key`` in one round trip.
+
+    The first request of a window creates the counter with its expiry
+    atomically, so idle keys disappear on their own.
+    """
+
+    def __init__(self, connection, prefix='ratelimit:'):
+        self.connection = connection
+        self.prefix = prefix
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        window = max(1, int(window))
+        slot = int(now // window)
+        counter = f'{self.prefix}{key}:{slot}'
+        with self.lock:
+            _, count = self.connection.pipeline(
+                ('SET', counter, 0, 'EX', window, 'NX'),
+                ('INCR', counter),
+            )
+        reset = int((slot + 1) * window - now)
+        return count <= limit, max(0, limit - count), reset
+
+
+def create_backend(url=None, idle_ttl=DEFAULT_IDLE_TTL):
+    """Build a backend from a storage URL; ``None`` or ``memory://`` means in-process."""
+    if not url or url.startswith('memory://'):
+        return MemoryBackend(idle_ttl=idle_ttl)
+    parsed = urlparse(url)
+    if parsed.scheme == 'sqlite':
+        # sqlite:////abs/path.db -> /abs/path.db, sqlite:///rel.db -> rel.db
+        return SQLiteBackend(url[len('sqlite:///'):], idle_ttl=idle_ttl)
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.lstrip('/') or 0)
+        password = unquote(parsed.password) if parsed.password else None
+        return RedisBackend(RedisConnection(parsed.hostname or 'localhost', parsed.port or 6379, db, password))
+    raise ValueError(f'Unsupported rate limit storage URL: {url}')
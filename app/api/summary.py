@@ -1,9 +1,12 @@
-from flask import jsonify, g
+from flask import Response, jsonify, g, request
 from . import api_bp, require_api_key
 from ..models import Expense, Wallet, Budget, Goal, Creditor, Category
 from .. import db
+from ..aggregates import range_totals
+from ..dashboard import dashboard_cache, data_version
+from ..utils import to_float
 from datetime import datetime
-from sqlalchemy import func, or_
+from sqlalchemy import func
 
 
 @api_bp.route('/summary', methods=['GET'])
@@ -14,49 +17,23 @@ def dashboard_summary():
     month_start = datetime(now.year, now.month, 1)
     year_start = datetime(now.year, 1, 1)
 
-    # Exclude transfers
-    transfer_cat = Category.query.filter_by(name='Transfer', user_id=user_id).first()
-    transfer_id = transfer_cat.id if transfer_cat else -1
-    transfer_types = ('transfer', 'transfer_out', 'transfer_in')
-    transfer_filters = [
-        Expense.transaction_type.in_(transfer_types),
-        Expense.tags.ilike('%transfer%'),
-        Expense.description.ilike('Transfer to %'),
-        Expense.description.ilike('Transfer from %')
-    ]
-    if transfer_id != -1:
-        transfer_filters.append(Expense.category_id == transfer_id)
-    transfer_filter = or_(*transfer_filters)
+    # Exclude transfers (classified on write)
+    transfer_filter = Expense.is_transfer
 
-    total_income = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == user_id,
-        Expense.transaction_type == 'income',
-        ~transfer_filter
-    ).scalar() or 0
-
-    total_expense = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == user_id,
-        Expense.transaction_type == 'expense',
-        ~transfer_filter
-    ).scalar() or 0
-
-    monthly_expense = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == user_id,
-        Expense.transaction_type == 'expense',
-        Expense.date >= month_start,
-        ~transfer_filter
-    ).scalar() or 0
-
-    yearly_expense = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == user_id,
-        Expense.transaction_type == 'expense',
-        Expense.date >= year_start,
-        ~transfer_filter
-    ).scalar() or 0
+    # All-time, month-to-date and year-to-date totals in one grouped lookup
+    periods = range_totals(user_id, {
+        'all_time': (None, None),
+        'month': (month_start, None),
+        'year': (year_start, None),
+    })
+    total_income = periods['all_time'].income
+    total_expense = periods['all_time'].expense
+    monthly_expense = periods['month'].expense
+    yearly_expense = periods['year'].expense
 
     # Wallet balances
     wallets = Wallet.query.filter_by(user_id=user_id).all()
-    wallet_balance = sum(w.balance for w in wallets)
+    wallet_balance = sum(to_float(w.balance) for w in wallets)
 
     # Debts
     total_debt = db.session.query(func.sum(Creditor.amount)).filter(
@@ -96,3 +73,29 @@ def dashboard_summary():
             'transaction_count': Expense.query.filter_by(user_id=user_id).count(),
         }
     })
+
+
+@api_bp.route('/dashboard', methods=['GET'])
+@require_api_key('read')
+def dashboard_data():
+    """The web dashboard's figures as JSON, with a strong ETag from the user's data version.
+
+    Clients repeating the ETag in If-None-Match get a 304 after one version lookup.
+    """
+    user_id = g.api_user_id
+    now = datetime.utcnow()
+    version = data_version(user_id)
+    # Figures also roll over with the calendar day (month/year to date)
+    etag = f'dashboard-{user_id}-{version}-{now:%Y%m%d}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    figures = dashboard_cache().context(user_id, now=now, version=version)
+    data = {name: value.isoformat() if isinstance(value, datetime) else value
+            for name, value in figures.items()}
+    response = jsonify({'data': data})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -18,14 +18,13 @@ def serialize_transaction(t):
         'wallet_id': t.wallet_id,
         'tags': t.tags,
         'notes': t.notes,
-        'created_at': t.created_at.isoformat() if t.created_at else None,
     }
 
 
 @api_bp.route('/transactions', methods=['GET'])
 @require_api_key('read')
 def list_transactions():
-    query = Expense.query.filter_by(user_id=g.api_user_id).order_by(Expense.date.desc())
+    query = Expense.query.filter_by(user_id=g.api_user_id)
 
     # Filters
     tx_type = request.args.get('type')
@@ -40,7 +39,7 @@ def list_transactions():
     if wallet_id:
         query = query.filter_by(wallet_id=wallet_id)
 
-    items, meta = paginate_query(query)
+    items, meta = paginate_query(query, [Expense.date, Expense.id])
     return jsonify({'data': [serialize_transaction(t) for t in items], 'meta': meta})
 
 
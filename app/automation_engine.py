@@ -16,7 +16,9 @@ from datetime import datetime
 import requests as http_requests
 
 from . import db
+from .categorizer import categorizer_for
 from .models import AutomationRule, Category, Notification, WebhookEndpoint
+from .tags import add_tags
 
 logger = logging.getLogger(__name__)
 
@@ -158,36 +160,36 @@ def _action_add_tags(user_id, params, context):
     if not new_tags:
         return 'No tags specified'
 
-    existing = expense.tags or ''
-    existing_set = set(t.strip().lower() for t in existing.split(',') if t.strip())
-    for tag in new_tags.split(','):
-        tag = tag.strip()
-        if tag and tag.lower() not in existing_set:
-            existing = f'{existing},{tag}' if existing else tag
-            existing_set.add(tag.lower())
-    expense.tags = existing
-    return f'Tags updated: {existing}'
+    return f'Tags updated: {add_tags(expense, new_tags)}'
 
 
 def _action_auto_categorize(user_id, params, context):
-    """Reassign the transaction's category."""
+    """Reassign the transaction's category.
+
+    With no ``category`` param the category is inferred from the description
+    by the user's compiled categorizer (keywords and learned merchants).
+    """
     expense = context.get('_expense_obj')
     if not expense:
         return 'No transaction object — skipped'
 
     cat_name = params.get('category', '').strip()
     if not cat_name:
-        return 'No category specified'
-
-    category = Category.query.filter(
-        Category.user_id == user_id,
-        db.func.lower(Category.name) == cat_name.lower()
-    ).first()
-    if not category:
-        return f'Category "{cat_name}" not found'
+        matched = categorizer_for(user_id).match(expense.description)
+        if not matched:
+            return 'No category matched the description'
+        category_id, cat_name = matched
+    else:
+        category = Category.query.filter(
+            Category.user_id == user_id,
+            db.func.lower(Category.name) == cat_name.lower()
+        ).first()
+        if not category:
+            return f'Category "{cat_name}" not found'
+        category_id = category.id
 
     old_name = expense.category.name if expense.category else 'None'
-    expense.category_id = category.id
+    expense.category_id = category_id
     return f'Re-categorized from "{old_name}" to "{cat_name}"'
 
 
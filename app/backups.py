@@ -0,0 +1,513 @@
+"""
+Streaming account backups.
+
+Backups used to be one dict of every table, built with each project's items,
+each goal's tasks and so on lazy-loaded one parent at a time, then serialized
+twice: once for the file and once more for its checksum. ``write_backup`` now
+writes gzip'd JSON Lines, one section per table:
+
+    {"backup": {"backup_version": "3.0", "backup_date": ..., "user": {...}}}
+    {"section": "wallets"}
+    {"record": {...}}
+    ...
+    {"end": {"record_count": 1234, "checksum": "<sha256>"}}
+
+Each section is read BACKUP_BATCH_ROWS rows at a time with ``yield_per``,
+parents and children eager-loaded per batch, and every line is hashed as it
+is written. The checksum is the SHA-256 of all lines before ``end``. Records
+keep the version 2.0 shapes, so ``read_backup`` turns either format into the
+same dict for restore.
+"""
+
+import gzip
+import hashlib
+import json
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import db
+from .models import (
+    Wallet, Category, Expense, Budget, RecurringTransaction,
+    Project, ProjectItem, FinancialSummary, WishlistItem,
+    Creditor, Debtor, Goal, Investment, InsurancePolicy, PensionScheme, SSNITContribution,
+    NetWorthSnapshot, FixedAsset, CashFlowProjection, CashFlowAlert, BudgetPeriod,
+    CalendarEvent, AutomationRule, WebhookEndpoint,
+    BankReconciliation, ChartOfAccount, JournalEntry,
+    Commitment, SMCContract, ConstructionWork, GlobalEntity,
+    NotificationPreference, WalletShare, Notification,
+)
+
+APP_VERSION = '2.0'
+BACKUP_FORMAT_VERSION = '3.0'
+BACKUP_BATCH_ROWS = 500
+GZIP_MAGIC = b'\x1f\x8b'
+
+# (name, model, owner column, eager loader options, serializer), in file order
+BACKUP_SECTIONS = []
+
+
+def section(name, model, eager=None, owner=None):
+    """Register ``fn(row) -> record`` as the backup section ``name``.
+
+    ``eager`` returns the loader options for the section's relationships; it is
+    called per backup because backref attributes only exist once mappers are configured.
+    """
+    def register(fn):
+        BACKUP_SECTIONS.append((name, model, owner if owner is not None else model.user_id, eager, fn))
+        return fn
+    return register
+
+
+def _dt(val):
+    """Serialize a datetime to ISO string or None."""
+    return val.isoformat() if val else None
+
+
+@section('wallets', Wallet)
+def _wallet(w):
+    return {
+        'name': w.name, 'balance': w.balance, 'currency': w.currency,
+        'icon': w.icon, 'wallet_type': w.wallet_type,
+        'account_number': w.account_number, 'is_shared': w.is_shared
+    }
+
+
+@section('categories', Category)
+def _category(c):
+    return {'name': c.name, 'icon': c.icon, 'is_custom': c.is_custom}
+
+
+@section('expenses', Expense, lambda: [joinedload(Expense.category), joinedload(Expense.wallet)])
+def _expense(e):
+    return {
+        'amount': e.amount, 'description': e.description,
+        'date': _dt(e.date),
+        'category': e.category.name if e.category else '',
+        'wallet': e.wallet.name if e.wallet else '',
+        'notes': e.notes, 'tags': e.tags,
+        'transaction_type': e.transaction_type,
+        'original_amount': e.original_amount,
+        'original_currency': e.original_currency
+    }
+
+
+@section('budgets', Budget, lambda: [joinedload(Budget.category)])
+def _budget(b):
+    return {
+        'category': b.category.name if b.category else '',
+        'amount': b.amount, 'period': b.period,
+        'start_date': _dt(b.start_date), 'end_date': _dt(b.end_date),
+        'notify_at_75': b.notify_at_75, 'notify_at_90': b.notify_at_90,
+        'notify_at_100': b.notify_at_100, 'is_active': b.is_active
+    }
+
+
+@section('recurring_transactions', RecurringTransaction,
+         lambda: [joinedload(RecurringTransaction.category), joinedload(RecurringTransaction.wallet)])
+def _recurring(r):
+    return {
+        'amount': r.amount, 'description': r.description,
+        'category': r.category.name if r.category else '',
+        'wallet': r.wallet.name if r.wallet else '',
+        'transaction_type': r.transaction_type, 'frequency': r.frequency,
+        'start_date': _dt(r.start_date), 'end_date': _dt(r.end_date),
+        'last_created': _dt(r.last_created), 'next_due': _dt(r.next_due),
+        'is_active': r.is_active, 'notes': r.notes
+    }
+
+
+@section('projects', Project,
+         lambda: [joinedload(Project.wallet), selectinload(Project.items).selectinload(ProjectItem.payments)])
+def _project(p):
+    return {
+        'name': p.name, 'description': p.description,
+        'funding_source': p.funding_source,
+        'wallet': p.wallet.name if p.wallet else None,
+        'custom_funding_source': p.custom_funding_source,
+        'is_completed': p.is_completed,
+        'created_date': _dt(p.created_date),
+        'items': [{
+            'item_name': it.item_name, 'description': it.description,
+            'cost': it.cost, 'item_type': it.item_type,
+            'is_completed': it.is_completed,
+            'created_date': _dt(it.created_date),
+            'payments': [{
+                'amount': pay.amount, 'description': pay.description,
+                'is_paid': pay.is_paid,
+                'payment_date': _dt(pay.payment_date),
+                'created_date': _dt(pay.created_date)
+            } for pay in it.payments]
+        } for it in p.items]
+    }
+
+
+@section('financial_summaries', FinancialSummary)
+def _financial_summary(fs):
+    return {
+        'year': fs.year, 'month': fs.month,
+        'total_income': fs.total_income, 'total_expense': fs.total_expense,
+        'notes': fs.notes
+    }
+
+
+@section('wishlist', WishlistItem, lambda: [joinedload(WishlistItem.category)])
+def _wishlist_item(w):
+    return {
+        'name': w.name, 'amount': w.amount,
+        'category': w.category.name if w.category else None,
+        'priority': w.priority, 'notes': w.notes
+    }
+
+
+def _debt(d):
+    return {
+        'name': d.name, 'amount': d.amount, 'currency': d.currency,
+        'description': d.description, 'debt_type': d.debt_type,
+        'interest_rate': d.interest_rate, 'original_amount': d.original_amount,
+        'due_date': _dt(d.due_date), 'status': d.status,
+        'payment_frequency': d.payment_frequency,
+        'minimum_payment': d.minimum_payment,
+        'contact_info': d.contact_info, 'priority': d.priority,
+        'notes': d.notes,
+        'payments': [{
+            'amount': dp.amount, 'date': _dt(dp.date), 'notes': dp.notes
+        } for dp in d.payments]
+    }
+
+
+section('creditors', Creditor, lambda: [selectinload(Creditor.payments)])(_debt)
+section('debtors', Debtor, lambda: [selectinload(Debtor.payments)])(_debt)
+
+
+@section('goals', Goal, lambda: [selectinload(Goal.tasks), selectinload(Goal.milestones)])
+def _goal(g):
+    return {
+        'name': g.name, 'target_amount': g.target_amount,
+        'current_amount': g.current_amount, 'deadline': _dt(g.deadline),
+        'goal_type': g.goal_type, 'icon': g.icon, 'color': g.color,
+        'priority': g.priority, 'notes': g.notes,
+        'is_completed': g.is_completed,
+        'tasks': [{
+            'title': t.title, 'description': t.description,
+            'due_date': _dt(t.due_date), 'priority': t.priority,
+            'is_completed': t.is_completed
+        } for t in g.tasks],
+        'milestones': [{
+            'title': m.title, 'target_amount': m.target_amount,
+            'is_completed': m.is_completed
+        } for m in g.milestones]
+    }
+
+
+@section('investments', Investment, lambda: [selectinload(Investment.dividends)])
+def _investment(i):
+    return {
+        'name': i.name, 'investment_type': i.investment_type,
+        'amount_invested': i.amount_invested,
+        'current_value': i.current_value,
+        'purchase_date': _dt(i.purchase_date),
+        'platform': i.platform, 'notes': i.notes,
+        'dividends': [{
+            'amount': d.amount, 'date': _dt(d.date), 'notes': d.notes
+        } for d in i.dividends]
+    }
+
+
+@section('insurance_policies', InsurancePolicy)
+def _insurance_policy(ip):
+    return {
+        'provider': ip.provider, 'policy_number': ip.policy_number,
+        'policy_type': ip.policy_type, 'premium': ip.premium,
+        'coverage': ip.coverage, 'start_date': _dt(ip.start_date),
+        'end_date': _dt(ip.end_date), 'notes': ip.notes
+    }
+
+
+@section('pension_schemes', PensionScheme)
+def _pension_scheme(ps):
+    return {
+        'name': ps.name, 'scheme_type': ps.scheme_type,
+        'contributions': ps.contributions,
+        'employer_match': ps.employer_match,
+        'balance': ps.balance, 'notes': ps.notes
+    }
+
+
+@section('ssnit_contributions', SSNITContribution)
+def _ssnit_contribution(sc):
+    return {
+        'month': sc.month, 'year': sc.year, 'amount': sc.amount,
+        'employer': sc.employer, 'employee_number': sc.employee_number
+    }
+
+
+@section('net_worth_snapshots', NetWorthSnapshot)
+def _net_worth_snapshot(nw):
+    return {
+        'date': _dt(nw.date), 'total_assets': nw.total_assets,
+        'total_liabilities': nw.total_liabilities,
+        'net_worth': nw.net_worth, 'breakdown_json': nw.breakdown_json
+    }
+
+
+@section('fixed_assets', FixedAsset)
+def _fixed_asset(fa):
+    return {
+        'name': fa.name, 'asset_category': fa.asset_category,
+        'purchase_date': _dt(fa.purchase_date),
+        'purchase_price': fa.purchase_price,
+        'current_value': fa.current_value, 'location': fa.location,
+        'condition': fa.condition,
+        'depreciation_rate': fa.depreciation_rate, 'notes': fa.notes
+    }
+
+
+@section('cashflow_projections', CashFlowProjection)
+def _cashflow_projection(cf):
+    return {
+        'month': cf.month, 'year': cf.year,
+        'projected_income': cf.projected_income,
+        'projected_expenses': cf.projected_expenses,
+        'actual_income': cf.actual_income,
+        'actual_expenses': cf.actual_expenses, 'notes': cf.notes
+    }
+
+
+@section('cashflow_alerts', CashFlowAlert)
+def _cashflow_alert(ca):
+    return {
+        'alert_type': ca.alert_type, 'threshold': ca.threshold,
+        'message': ca.message, 'is_active': ca.is_active
+    }
+
+
+@section('budget_periods', BudgetPeriod)
+def _budget_period(bp):
+    return {
+        'name': bp.name, 'start_date': _dt(bp.start_date),
+        'end_date': _dt(bp.end_date), 'total_budget': bp.total_budget,
+        'notes': bp.notes
+    }
+
+
+@section('calendar_events', CalendarEvent)
+def _calendar_event(ce):
+    return {
+        'title': ce.title, 'description': ce.description,
+        'event_type': ce.event_type, 'event_date': _dt(ce.event_date),
+        'amount': ce.amount, 'reminder_date': _dt(ce.reminder_date),
+        'reminder_enabled': ce.reminder_enabled,
+        'is_recurring': ce.is_recurring, 'color': ce.color
+    }
+
+
+@section('automation_rules', AutomationRule)
+def _automation_rule(ar):
+    return {
+        'name': ar.name, 'trigger_type': ar.trigger_type,
+        'condition': ar.condition, 'action_type': ar.action_type,
+        'action_params': ar.action_params, 'is_active': ar.is_active
+    }
+
+
+@section('webhook_endpoints', WebhookEndpoint)
+def _webhook_endpoint(we):
+    return {
+        'name': we.name, 'url': we.url, 'events': we.events,
+        'secret': we.secret, 'is_active': we.is_active
+    }
+
+
+@section('bank_reconciliations', BankReconciliation, lambda: [joinedload(BankReconciliation.wallet)])
+def _bank_reconciliation(br):
+    return {
+        'wallet': br.wallet.name if br.wallet else '',
+        'statement_balance': br.statement_balance,
+        'reconciled_balance': br.reconciled_balance,
+        'date': _dt(br.date), 'status': br.status, 'notes': br.notes
+    }
+
+
+@section('chart_of_accounts', ChartOfAccount, lambda: [joinedload(ChartOfAccount.parent)])
+def _chart_of_account(coa):
+    return {
+        'code': coa.code, 'name': coa.name,
+        'account_type': coa.account_type, 'balance': coa.balance,
+        'parent_code': coa.parent.code if coa.parent else None
+    }
+
+
+@section('journal_entries', JournalEntry,
+         lambda: [joinedload(JournalEntry.debit_account), joinedload(JournalEntry.credit_account)])
+def _journal_entry(je):
+    return {
+        'date': _dt(je.date), 'description': je.description,
+        'debit_account_code': je.debit_account.code if je.debit_account else '',
+        'credit_account_code': je.credit_account.code if je.credit_account else '',
+        'amount': je.amount, 'reference': je.reference
+    }
+
+
+@section('commitments', Commitment)
+def _commitment(cm):
+    return {
+        'name': cm.name, 'commitment_category': cm.commitment_category,
+        'amount': cm.amount, 'frequency': cm.frequency,
+        'due_date': _dt(cm.due_date), 'status': cm.status, 'notes': cm.notes
+    }
+
+
+@section('smc_contracts', SMCContract, lambda: [selectinload(SMCContract.payments)])
+def _smc_contract(sc):
+    return {
+        'contract_number': sc.contract_number, 'title': sc.title,
+        'description': sc.description, 'contract_value': sc.contract_value,
+        'start_date': _dt(sc.start_date), 'end_date': _dt(sc.end_date),
+        'status': sc.status, 'location': sc.location, 'notes': sc.notes,
+        'payments': [{
+            'amount': cp.amount, 'description': cp.description,
+            'payment_date': _dt(cp.payment_date), 'status': cp.status
+        } for cp in sc.payments]
+    }
+
+
+@section('construction_works', ConstructionWork)
+def _construction_work(cw):
+    return {
+        'project_name': cw.project_name, 'description': cw.description,
+        'location': cw.location, 'budget': cw.budget, 'spent': cw.spent,
+        'status': cw.status, 'start_date': _dt(cw.start_date),
+        'end_date': _dt(cw.end_date), 'contractor': cw.contractor,
+        'notes': cw.notes
+    }
+
+
+@section('global_entities', GlobalEntity)
+def _global_entity(ge):
+    return {
+        'name': ge.name, 'entity_type': ge.entity_type,
+        'ownership_percent': ge.ownership_percent,
+        'value': ge.value, 'description': ge.description,
+        'notes': ge.notes
+    }
+
+
+@section('notification_preferences', NotificationPreference)
+def _notification_preference(np):
+    return {'notification_type': np.notification_type, 'enabled': np.enabled}
+
+
+@section('notifications', Notification)
+def _notification(n):
+    return {
+        'title': n.title, 'message': n.message,
+        'notification_type': n.notification_type, 'is_read': n.is_read,
+        'created_at': _dt(n.created_at)
+    }
+
+
+@section('wallet_shares', WalletShare,
+         lambda: [joinedload(WalletShare.wallet), joinedload(WalletShare.shared_with)], owner=WalletShare.owner_id)
+def _wallet_share(s):
+    return {
+        'wallet': s.wallet.name if s.wallet else '',
+        'shared_with_email': s.shared_with.email if s.shared_with else '',
+        'permission': s.permission, 'accepted': s.accepted
+    }
+
+
+def nested_count(record):
+    """Records nested in ``record`` (project items and their payments, goal tasks...)."""
+    total = 0
+    for value in record.values():
+        if isinstance(value, list):
+            total += len(value)
+            for child in value:
+                if isinstance(child, dict):
+                    total += sum(len(v) for v in child.values() if isinstance(v, list))
+    return total
+
+
+def iter_section(user_id, model, owner, eager, serialize, batch_rows=BACKUP_BATCH_ROWS):
+    """Yield one section's records, ``batch_rows`` parents (and their children) at a time."""
+    stmt = select(model).where(owner == user_id).order_by(model.id)
+    if eager is not None:
+        stmt = stmt.options(*eager())
+    for row in db.session.scalars(stmt.execution_options(yield_per=batch_rows)):
+        yield serialize(row)
+
+
+def _line(obj):
+    return (json.dumps(obj, default=str, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def write_backup(fileobj, user, backup_date, batch_rows=BACKUP_BATCH_ROWS):
+    """Write ``user``'s backup to the binary ``fileobj``. Returns (record_count, checksum)."""
+    digest = hashlib.sha256()
+    record_count = 0
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as out:
+        def emit(obj):
+            line = _line(obj)
+            digest.update(line)
+            out.write(line)
+
+        emit({'backup': {
+            'backup_version': BACKUP_FORMAT_VERSION, 'app_version': APP_VERSION,
+            'backup_date': backup_date.isoformat(),
+            'user': {'name': user.name, 'email': user.email},
+        }})
+        for name, model, owner, eager, serialize in BACKUP_SECTIONS:
+            emit({'section': name})
+            for record in iter_section(user.id, model, owner, eager, serialize, batch_rows):
+                record_count += 1 + nested_count(record)
+                emit({'record': record})
+        checksum = digest.hexdigest()
+        out.write(_line({'end': {'record_count': record_count, 'checksum': checksum}}))
+    return record_count, checksum
+
+
+def document_checksum(data):
+    """SHA-256 of a version 2.0 JSON backup document, excluding its checksum field."""
+    clean = {k: v for k, v in data.items() if k != 'checksum'}
+    raw = json.dumps(clean, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def read_backup(stream):
+    """Read a backup of either format into one dict. Returns (data, actual checksum).
+
+    The file's own checksum, if it has one, is ``data['checksum']``. Raises
+    ValueError for a file that is not a backup.
+    """
+    if stream.read(2) == GZIP_MAGIC:
+        stream.seek(0)
+        return _read_lines(gzip.GzipFile(fileobj=stream, mode='rb'))
+    stream.seek(0)
+    data = json.loads(stream.read().decode('utf-8'))
+    if not isinstance(data, dict):
+        raise ValueError('Not a backup file.')
+    return data, document_checksum(data)
+
+
+def _read_lines(lines):
+    digest = hashlib.sha256()
+    data = {}
+    records = None
+    for line in lines:
+        entry = json.loads(line)
+        if 'end' in entry:
+            data.update(entry['end'])
+            break
+        digest.update(line)
+        if 'record' in entry:
+            if records is None:
+                raise ValueError('Backup record outside a section.')
+            records.append(entry['record'])
+        elif 'section' in entry:
+            records = data.setdefault(entry['section'], [])
+        elif 'backup' in entry:
+            data.update(entry['backup'])
+    # A file cut short has no end line, and so no checksum that could match
+    data.setdefault('checksum', '')
+    return data, digest.hexdigest()
@@ -0,0 +1,255 @@
+"""
+Streaming bank statement import.
+
+Statements used to be read whole into memory, then written one ORM
+``Expense`` (and one wallet balance read-modify-write) per row, so a
+multi-year statement took minutes and memory grew with the file. Now:
+
+- ``iter_csv`` / ``iter_excel`` yield a statement's transactions one row at a
+  time, straight from the uploaded stream.
+- ``StatementImport`` takes them IMPORT_CHUNK_ROWS at a time. Each chunk is
+  deduplicated with one fingerprint lookup, categorized, inserted with one
+  executemany (one INSERT per row where the database cannot return the new
+  ids from an executemany), applied to the wallet balance with one UPDATE and committed
+  together with the ``ImportHistory`` progress.
+
+Chunk rows bypass the session flush hooks, so the importer writes what they
+would have: the transfer / money-lent flags, the fingerprint, the
+``imported`` tag link and the monthly rollup deltas. The full-text index is
+maintained by the database, and the wallet update invalidates the dashboard.
+"""
+
+import csv
+import io
+import zipfile
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert
+
+from . import db
+from .categorizer import categorizer_for
+from .classification import is_money_lent, is_transfer
+from .fingerprints import existing_fingerprints, fingerprint
+from .models import Expense, ImportHistory, Wallet, expense_tag
+from .rollups import apply_inserted_expenses
+from .tags import ensure_tags
+
+IMPORT_CHUNK_ROWS = 1000
+IMPORT_TAG = 'imported'
+
+# Header names accepted for each field, in order of preference
+CSV_AMOUNT_HEADERS = ('Amount', 'amount', 'Value', 'value')
+CSV_DESCRIPTION_HEADERS = ('Description', 'description', 'Narration', 'narration', 'Details', 'details')
+CSV_DATE_HEADERS = ('Date', 'date', 'Transaction Date', 'transaction_date', 'Txn Date')
+
+def parse_date(date_str):
+    """Try multiple date formats."""
+    date_str = (date_str or '').strip()
+    if not date_str:
+        return datetime.utcnow()
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%Y/%m/%d', '%d %b %Y', '%d %B %Y'):
+        try:
+            return datetime.strptime(date_str, fmt)
+        except (ValueError, AttributeError):
+            continue
+    return datetime.utcnow()
+
+
+def _first(row, headers, default):
+    for header in headers:
+        if header in row:
+            return row[header]
+    return default
+
+
+def iter_csv(stream):
+    """Yield transaction dicts from a binary CSV stream, one row at a time."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    for row in reader:
+        amount = float(str(_first(row, CSV_AMOUNT_HEADERS, '0')).replace(',', '').strip())
+        yield {
+            'amount': amount,
+            'description': str(_first(row, CSV_DESCRIPTION_HEADERS, 'Imported')).strip(),
+            'date': parse_date(_first(row, CSV_DATE_HEADERS, '')),
+        }
+
+
+def iter_excel(stream):
+    """Yield transaction dicts from an Excel (.xlsx) stream, one row at a time.
+
+    A file that is not a readable workbook raises ValueError.
+    """
+    import openpyxl
+    from openpyxl.utils.exceptions import InvalidFileException
+    try:
+        wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError, OSError) as e:
+        raise ValueError(f'not a readable Excel workbook ({e})') from e
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return
+
+        # Map common header names
+        headers = [str(h).strip().lower() if h else '' for h in header]
+        amount_col = None
+        desc_col = None
+        date_col = None
+        for i, h in enumerate(headers):
+            if h in ('amount', 'value', 'debit', 'credit'):
+                amount_col = i
+            elif h in ('description', 'narration', 'details', 'memo', 'particular'):
+                desc_col = i
+            elif h in ('date', 'transaction date', 'txn date', 'posting date'):
+                date_col = i
+
+        if amount_col is None:
+            raise ValueError("Could not find Amount column in the Excel file.")
+
+        for row in rows:
+            if not row or all(cell is None for cell in row):
+                continue
+            raw_amount = row[amount_col] if amount_col < len(row) else 0
+            amount = float(str(raw_amount).replace(',', '').strip()) if raw_amount else 0
+            if amount == 0:
+                continue
+            desc = str(row[desc_col]).strip() if desc_col is not None and desc_col < len(row) and row[desc_col] else 'Imported'
+            raw_date = row[date_col] if date_col is not None and date_col < len(row) else None
+            if isinstance(raw_date, datetime):
+                date = raw_date
+            else:
+                date = parse_date(str(raw_date) if raw_date else '')
+            yield {'amount': amount, 'description': desc, 'date': date}
+    finally:
+        wb.close()
+
+
+def chunked(transactions, size=IMPORT_CHUNK_ROWS):
+    """Lists of up to ``size`` transactions."""
+    transactions = iter(transactions)
+    while True:
+        chunk = list(islice(transactions, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def count_duplicates(user_id, transactions, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Return (duplicates, total) for a statement without importing it."""
+    duplicates = total = 0
+    for chunk in chunked(transactions, chunk_rows):
+        fingerprints = [fingerprint(t['date'], t['amount'], t['description']) for t in chunk]
+        existing = existing_fingerprints(user_id, fingerprints)
+        duplicates += sum(1 for fp in fingerprints if fp in existing)
+        total += len(chunk)
+    return duplicates, total
+
+
+class StatementImport:
+    """One statement imported into one wallet, committed chunk by chunk.
+
+    ``run`` records the outcome on an ``ImportHistory`` row, whose
+    ``records_imported`` grows as each chunk commits: ``completed``,
+    ``partial`` (an error stopped it after some chunks were committed) or
+    ``failed``.
+    """
+
+    def __init__(self, user_id, wallet, filename, skip_duplicates=True, chunk_rows=IMPORT_CHUNK_ROWS):
+        self.user_id = user_id
+        self.wallet = wallet
+        self.filename = filename
+        self.skip_duplicates = skip_duplicates
+        self.chunk_rows = chunk_rows
+        self.total = self.imported = self.categorized = self.skipped = 0
+        self.error = None
+        self.history = None
+        # Fingerprints this import wrote; later chunks must not count them as duplicates
+        self._written = set()
+
+        self.categorizer = categorizer_for(user_id)
+
+    def run(self, transactions):
+        """Import ``transactions``. Returns the ImportHistory row, or None for an empty statement."""
+        self.history = ImportHistory(user_id=self.user_id, filename=self.filename,
+                                     records_imported=0, status='importing')
+        db.session.add(self.history)
+        db.session.commit()
+        try:
+            tag_id = self._tag_id()
+            for chunk in chunked(transactions, self.chunk_rows):
+                self.total += len(chunk)
+                self._import_chunk(chunk, tag_id)
+                self.history.records_imported = self.imported
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.error = str(e)
+            self.history.status = 'partial' if self.imported else 'failed'
+            self.history.notes = self.error[:500]
+        else:
+            if not self.total:
+                db.session.delete(self.history)
+                db.session.commit()
+                return None
+            self.history.status = 'completed'
+            if self.categorized or self.skipped:
+                self.history.notes = f'Auto-categorized: {self.categorized}, Duplicates skipped: {self.skipped}'
+        db.session.commit()
+        return self.history
+
+    def _tag_id(self):
+        return ensure_tags(db.session, self.user_id, [IMPORT_TAG])[IMPORT_TAG].id
+
+    def _import_chunk(self, chunk, tag_id):
+        fingerprints = [fingerprint(t['date'], t['amount'], t['description']) for t in chunk]
+        existing = set()
+        if self.skip_duplicates:
+            existing = existing_fingerprints(self.user_id, [fp for fp in fingerprints if fp not in self._written])
+
+        rows = []
+        balance_delta = 0.0
+        for txn, fp in zip(chunk, fingerprints):
+            if fp in existing:
+                self.skipped += 1
+                continue
+
+            matched = self.categorizer.match(txn['description'])
+            if matched:
+                self.categorized += 1
+            category_id, category_name = matched or self.categorizer.default or (1, None)
+
+            t_type = 'income' if txn['amount'] > 0 else 'expense'
+            amount = abs(txn['amount'])
+            rows.append({
+                'user_id': self.user_id,
+                'amount': amount,
+                'description': txn['description'],
+                'date': txn['date'],
+                'category_id': category_id,
+                'wallet_id': self.wallet.id,
+                'transaction_type': t_type,
+                'tags': IMPORT_TAG,
+                'is_transfer': is_transfer(t_type, IMPORT_TAG, txn['description'], category_name),
+                'is_money_lent': is_money_lent(IMPORT_TAG, category_name),
+                'fingerprint': fp,
+            })
+            balance_delta += amount if t_type == 'income' else -amount
+            self._written.add(fp)
+        if not rows:
+            return
+
+        # The tag links need exactly this chunk's ids. Dialects that can RETURNING
+        # from an executemany hand them back; MySQL cannot, so there each row is
+        # inserted on its own and reports its id. Selecting rows back by id or
+        # fingerprint could pick up rows a concurrent import wrote.
+        if db.engine.dialect.insert_executemany_returning:
+            ids = db.session.scalars(insert(Expense).returning(Expense.id), rows).all()
+        else:
+            connection = db.session.connection()
+            ids = [connection.execute(insert(Expense), row).inserted_primary_key[0] for row in rows]
+        db.session.execute(insert(expense_tag), [{'expense_id': expense_id, 'tag_id': tag_id} for expense_id in ids])
+        apply_inserted_expenses(db.session.connection(), rows)
+        self.wallet.balance = Wallet.balance + balance_delta
+        self.imported += len(rows)
@@ -0,0 +1,151 @@
+"""
+Budget progress for every budget consumer.
+
+Spend used to be summed with one query per budget in the dashboard, the
+budgets page, budget planning, push alerts, AI insights and the newsletter,
+each with its own idea of the budget window. ``BudgetProgress`` answers for
+all of a user's active budgets with one grouped query, using a CASE on
+``Budget.period`` to pick each window:
+
+- ``weekly``  - since Monday 00:00 of the current week
+- ``monthly`` - since the 1st of the current month
+- ``yearly``  - since 1 January of the current year
+- anything else (custom) - from ``start_date`` up to ``end_date`` if set
+
+``BudgetProgress.for_user`` keeps the result on ``g`` for the rest of the
+request; flushing an Expense or Budget drops it so later reads see the write.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import g, has_app_context
+from sqlalchemy import and_, case, event, func, or_
+from sqlalchemy.orm import Session, joinedload
+
+from . import db
+from .models import Budget, Expense
+
+STANDARD_PERIODS = ('weekly', 'monthly', 'yearly')
+_CACHE_KEY = 'budget_progress'
+
+
+def period_starts(now):
+    """Start of the current week, month and year for ``now``."""
+    today = datetime(now.year, now.month, now.day)
+    return {
+        'weekly': today - timedelta(days=now.weekday()),
+        'monthly': datetime(now.year, now.month, 1),
+        'yearly': datetime(now.year, 1, 1),
+    }
+
+
+class BudgetStatus:
+    """One budget with the amount spent in its current window."""
+
+    def __init__(self, budget, spent, start):
+        self.budget = budget
+        self.spent = float(spent or 0)
+        self.start = start
+
+    @property
+    def amount(self):
+        return self.budget.amount
+
+    @property
+    def remaining(self):
+        return self.budget.amount - self.spent
+
+    @property
+    def percentage(self):
+        return (self.spent / self.budget.amount * 100) if self.budget.amount > 0 else 0
+
+    @property
+    def width_percentage(self):
+        return min(self.percentage, 100)
+
+    @property
+    def within(self):
+        return self.spent <= self.budget.amount
+
+    @property
+    def level(self):
+        """'exceeded', '90' or '75' once those thresholds are reached, else None."""
+        percentage = self.percentage
+        if percentage >= 100:
+            return 'exceeded'
+        if percentage >= 90:
+            return '90'
+        if percentage >= 75:
+            return '75'
+        return None
+
+
+class BudgetProgress:
+    """Spend against each of a user's active budgets, from one grouped query."""
+
+    def __init__(self, user_id, now=None):
+        self.user_id = user_id
+        self.now = now or datetime.utcnow()
+        self.items = self._load()
+
+    @classmethod
+    def for_user(cls, user_id):
+        """The user's progress, computed once per request."""
+        if not has_app_context():
+            return cls(user_id)
+        cache = g.setdefault(_CACHE_KEY, {})
+        key = (user_id, datetime.utcnow().date())
+        if key not in cache:
+            cache[key] = cls(user_id)
+        return cache[key]
+
+    def _window_start(self, starts):
+        return case(*[(Budget.period == period, starts[period]) for period in STANDARD_PERIODS],
+                    else_=Budget.start_date)
+
+    def _load(self):
+        starts = period_starts(self.now)
+        window_start = self._window_start(starts)
+        in_window = and_(
+            Expense.date >= window_start,
+            or_(Budget.period.in_(STANDARD_PERIODS), Budget.end_date.is_(None), Expense.date <= Budget.end_date),
+        )
+        spent = (db.session.query(Budget.id.label('budget_id'), func.sum(Expense.amount).label('spent'))
+                 .join(Expense, and_(Expense.user_id == Budget.user_id,
+                                     Expense.category_id == Budget.category_id,
+                                     Expense.transaction_type == 'expense',
+                                     in_window))
+                 .filter(Budget.user_id == self.user_id, Budget.is_active.is_(True))
+                 .group_by(Budget.id)
+                 .subquery())
+        rows = (db.session.query(Budget, spent.c.spent)
+                .outerjoin(spent, spent.c.budget_id == Budget.id)
+                .options(joinedload(Budget.category))
+                .filter(Budget.user_id == self.user_id, Budget.is_active.is_(True))
+                .order_by(Budget.id)
+                .all())
+        return [BudgetStatus(budget, total, starts.get(budget.period, budget.start_date))
+                for budget, total in rows]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def for_category(self, category_id):
+        return [item for item in self.items if item.budget.category_id == category_id]
+
+    def alerts(self):
+        """Budgets that have reached 75% or more of their amount."""
+        return [item for item in self.items if item.level]
+
+
+@event.listens_for(Session, 'after_flush')
+def _drop_request_cache(session, flush_context):
+    if not has_app_context() or _CACHE_KEY not in g:
+        return
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, (Expense, Budget)):
+            g.pop(_CACHE_KEY, None)
+            return
@@ -0,0 +1,208 @@
+"""
+Compiled transaction categorizer for statement imports and automation rules.
+
+Categorizing used to rebuild the user's category map and substring-search
+every ``CATEGORY_KEYWORDS`` keyword for every imported row. ``Categorizer``
+compiles, once per user, everything it matches on into a single regex:
+
+- learned merchants: normalized descriptions the user has filed under the
+  same category at least LEARN_MIN_COUNT times, matched as whole words;
+- the keyword map, resolved against the user's category names (exact name
+  first, then a partial match, as before).
+
+The alternatives are laid out as a prefix tree, so each position of a
+description is tried against all of them in one pass. A learned merchant
+beats any keyword (the longest merchant wins); otherwise the first category
+in ``CATEGORY_KEYWORDS`` order with a keyword in the description wins.
+
+``categorizer_for`` keeps each user's compiled matcher in a per-process LRU
+for CATEGORIZER_CACHE_TTL seconds; a flushed change to the user's categories
+drops it sooner. Learned merchants may lag new transactions by up to the TTL.
+"""
+
+import re
+from collections import Counter, defaultdict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from . import db
+from .cache import MemoryCache
+from .models import Category, Expense
+
+DEFAULT_TTL = 600
+DEFAULT_MAX_ENTRIES = 256
+# Category imports fall back to; filing under it says nothing about a merchant
+FALLBACK_CATEGORY = 'other'
+LEARN_MIN_COUNT = 2
+MAX_LEARNED_MERCHANTS = 500
+MERCHANT_MIN_LENGTH = 3
+MERCHANT_MAX_LENGTH = 60
+
+# Keyword map for smart categorization, in priority order
+CATEGORY_KEYWORDS = {
+    'Food': ['restaurant', 'food', 'grocery', 'supermarket', 'cafe', 'dining', 'meal',
+             'lunch', 'dinner', 'breakfast', 'pizza', 'burger', 'chicken', 'rice',
+             'market', 'shoprite', 'melcom', 'maxmart'],
+    'Transport': ['uber', 'bolt', 'taxi', 'fuel', 'petrol', 'gas', 'transport',
+                  'bus', 'fare', 'parking', 'toll', 'goil', 'shell', 'total'],
+    'Utilities': ['electricity', 'water', 'internet', 'airtime', 'mtn', 'vodafone',
+                  'glo', 'tigo', 'telecel', 'dstv', 'gotv', 'ecg', 'gwcl'],
+    'Health': ['hospital', 'pharmacy', 'clinic', 'medical', 'doctor', 'health',
+               'drug', 'medication', 'lab', 'dental'],
+    'Education': ['school', 'tuition', 'books', 'fees', 'university', 'college',
+                  'course', 'training', 'exam'],
+    'Shopping': ['shop', 'store', 'amazon', 'jumia', 'tonaton', 'clothing',
+                 'fashion', 'electronics', 'gadget'],
+    'Entertainment': ['movie', 'cinema', 'netflix', 'spotify', 'game', 'concert',
+                      'event', 'subscription', 'youtube'],
+    'Rent': ['rent', 'lease', 'housing', 'accommodation', 'landlord'],
+    'Salary': ['salary', 'wage', 'payroll', 'stipend', 'allowance', 'bonus'],
+    'Transfer': ['transfer', 'deposit', 'withdrawal', 'atm', 'mobile money', 'momo'],
+}
+
+_NON_LETTERS = re.compile(r'[^a-z]+')
+
+
+def normalize(description):
+    """Lower-case letters only, words separated by single spaces."""
+    return _NON_LETTERS.sub(' ', (description or '').lower()).strip()
+
+
+def _trie_pattern(words):
+    """Regex matching any of ``words``, longest first, factored as a prefix tree."""
+    root = {}
+    for word in words:
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        end = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if end else body
+
+    return build(root)
+
+
+class Categorizer:
+    """One user's categories, keywords and learned merchants compiled into one regex."""
+
+    def __init__(self, categories, learned=None):
+        # categories: [(id, name)] in query order; learned: {merchant: category id}
+        self.names = {category_id: name for category_id, name in categories}
+        by_name = {name.lower(): (category_id, name) for category_id, name in categories}
+        self.default = next((category for category in categories if category[1].lower() == FALLBACK_CATEGORY),
+                            categories[0] if categories else None)
+
+        # group text -> (priority, (category id, name)); lower priority wins
+        self.keywords = {}
+        for index, (cat_name, keywords) in enumerate(CATEGORY_KEYWORDS.items()):
+            target = by_name.get(cat_name.lower()) or next(
+                (category for uname, category in by_name.items()
+                 if cat_name.lower() in uname or uname in cat_name.lower()), None)
+            if target is None:
+                continue
+            for keyword in keywords:
+                self.keywords.setdefault(keyword, ((1, index), target))
+        # At one position the regex reports the longest keyword, but every shorter
+        # keyword that prefixes it matched there too.
+        for keyword, (priority, target) in list(self.keywords.items()):
+            prefixes = [self.keywords[keyword[:end]] for end in range(1, len(keyword))
+                        if keyword[:end] in self.keywords]
+            self.keywords[keyword] = min(prefixes + [(priority, target)], key=lambda entry: entry[0])
+
+        self.learned = {merchant: ((0, -len(merchant)), (category_id, self.names[category_id]))
+                        for merchant, category_id in (learned or {}).items() if category_id in self.names}
+
+        # (?!)() never matches; it keeps merchants in group 1 and keywords in group 2
+        merchants = f'(?<![a-z])({_trie_pattern(self.learned)})(?![a-z])' if self.learned else '(?!)()'
+        keywords = f'({_trie_pattern(self.keywords)})' if self.keywords else '(?!)()'
+        self.pattern = re.compile(f'(?={merchants}|{keywords})') if self.learned or self.keywords else None
+
+    @classmethod
+    def build(cls, user_id):
+        """Compile the user's (and the global) categories and the user's learned merchants."""
+        categories = db.session.execute(
+            select(Category.id, Category.name)
+            .where((Category.user_id == user_id) | (Category.user_id.is_(None)))
+            .order_by(Category.id)
+        ).all()
+        return cls([tuple(row) for row in categories], learn_merchants(user_id, categories))
+
+    def match(self, description):
+        """``(category id, name)`` for ``description``, or None when nothing matches."""
+        text = normalize(description)
+        if not text or self.pattern is None:
+            return None
+        best = None
+        for found in self.pattern.finditer(text):
+            merchant, keyword = found.group(1), found.group(2)
+            entry = self.learned[merchant] if merchant else self.keywords[keyword]
+            if best is None or entry[0] < best[0]:
+                best = entry
+        return best[1] if best else None
+
+
+def learn_merchants(user_id, categories):
+    """{normalized description: category id} for descriptions the user files consistently."""
+    fallback_ids = {category_id for category_id, name in categories if name.lower() == FALLBACK_CATEGORY}
+    counts = defaultdict(Counter)
+    rows = db.session.execute(
+        select(Expense.description, Expense.category_id, func.count())
+        .where(Expense.user_id == user_id, Expense.category_id.notin_(fallback_ids))
+        .group_by(Expense.description, Expense.category_id)
+        .execution_options(yield_per=2000)
+    )
+    for description, category_id, count in rows:
+        merchant = normalize(description)[:MERCHANT_MAX_LENGTH].strip()
+        if len(merchant) >= MERCHANT_MIN_LENGTH:
+            counts[merchant][category_id] += count
+
+    learned = []
+    for merchant, by_category in counts.items():
+        total = sum(by_category.values())
+        category_id, count = by_category.most_common(1)[0]
+        if count >= LEARN_MIN_COUNT and count * 2 > total:
+            learned.append((count, merchant, category_id))
+    learned.sort(reverse=True)
+    return {merchant: category_id for _, merchant, category_id in learned[:MAX_LEARNED_MERCHANTS]}
+
+
+def _cache(app=None):
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('categorizers')
+    if cache is None:
+        cache = MemoryCache(app.config.get('CATEGORIZER_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        app.extensions['categorizers'] = cache
+    return cache
+
+
+def categorizer_for(user_id):
+    """The user's compiled Categorizer, built at most once per TTL or category change."""
+    cache = _cache()
+    categorizer = cache.get(user_id)
+    if categorizer is None:
+        categorizer = Categorizer.build(user_id)
+        cache.set(user_id, categorizer, current_app.config.get('CATEGORIZER_CACHE_TTL', DEFAULT_TTL))
+    return categorizer
+
+
+@event.listens_for(Session, 'after_flush')
+def _drop_changed_categorizers(session, flush_context):
+    if not has_app_context():
+        return
+    cache = current_app.extensions.get('categorizers')
+    if cache is None:
+        return
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Category):
+            if obj.user_id is None:
+                cache.clear()
+                return
+            cache.delete(obj.user_id)
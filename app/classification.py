@@ -0,0 +1,150 @@
+"""
+Persisted transfer / money-lent classification for Expense rows.
+
+Reports exclude transfers and subtract money lent. Both used to be decided at
+query time with leading-wildcard ILIKE scans over tags and descriptions plus a
+lookup of the user's Transfer / Money Lent categories. The rules now run once
+on write and are stored in ``Expense.is_transfer`` and ``Expense.is_money_lent``,
+so queries filter on a single indexed column instead.
+
+A ``before_flush`` hook re-classifies every new expense and every expense whose
+type, tags, description or category changed, and an ``after_flush`` hook
+re-classifies the expenses of a renamed category (to or from Transfer /
+Money Lent). Bulk ``query.update()`` calls bypass both; run ``flask db-maintenance
+reclassify-expenses`` afterwards.
+"""
+
+from sqlalchemy import case, event, func, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import Category, Expense
+
+TRANSFER_TYPES = ('transfer', 'transfer_out', 'transfer_in')
+TRANSFER_CATEGORY = 'Transfer'
+MONEY_LENT_CATEGORY = 'Money Lent'
+CLASSIFIED_FIELDS = ('transaction_type', 'tags', 'description', 'category_id')
+
+
+def is_transfer_marked(tags, description):
+    """Tag/description part of the transfer rule: a 'transfer' tag or a 'Transfer ...' description."""
+    return 'transfer' in (tags or '').lower() or (description or '').lower().startswith('transfer ')
+
+
+def is_lent_tagged(tags):
+    """Tag part of the money-lent rule."""
+    return 'debt_lent' in (tags or '').lower()
+
+
+def is_transfer(transaction_type, tags, description, category_name):
+    return (transaction_type in TRANSFER_TYPES
+            or is_transfer_marked(tags, description)
+            or category_name == TRANSFER_CATEGORY)
+
+
+def is_money_lent(tags, category_name):
+    return category_name == MONEY_LENT_CATEGORY or is_lent_tagged(tags)
+
+
+def classify(expense, category_name):
+    """Set the stored flags on ``expense`` for the given category name."""
+    expense.is_transfer = is_transfer(expense.transaction_type, expense.tags, expense.description, category_name)
+    expense.is_money_lent = is_money_lent(expense.tags, category_name)
+
+
+def _needs_classification(obj, new):
+    if obj in new:
+        return True
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in CLASSIFIED_FIELDS)
+
+
+def _category_names(session, expenses):
+    """Map category id -> name for ``expenses``, preferring objects already in the session."""
+    names = {}
+    missing = set()
+    for expense in expenses:
+        category = expense.__dict__.get('category')
+        if category is not None and category.id is not None:
+            names[category.id] = category.name
+        elif expense.category_id is not None:
+            missing.add(expense.category_id)
+    missing -= set(names)
+    if missing:
+        rows = session.connection().execute(
+            select(Category.id, Category.name).where(Category.id.in_(missing))
+        )
+        names.update({cid: name for cid, name in rows})
+    return names
+
+
+def _classify_pending(session, flush_context, instances):
+    new = session.new
+    pending = [obj for obj in list(new) + list(session.dirty)
+               if isinstance(obj, Expense) and obj not in session.deleted and _needs_classification(obj, new)]
+    if not pending:
+        return
+    names = _category_names(session, pending)
+    for expense in pending:
+        category = expense.__dict__.get('category')
+        if category is not None and category.id is None:
+            category_name = category.name
+        else:
+            category_name = names.get(expense.category_id)
+        classify(expense, category_name)
+
+
+# Registered at the front so later before_flush hooks (e.g. rollups) see the flags.
+event.listen(Session, 'before_flush', _classify_pending, insert=True)
+
+
+def transfer_clause():
+    """SQL twin of ``is_transfer``."""
+    transfer_category_ids = select(Category.id).where(Category.name == TRANSFER_CATEGORY)
+    return or_(
+        func.coalesce(Expense.transaction_type, '').in_(TRANSFER_TYPES),
+        func.coalesce(Expense.tags, '').ilike('%transfer%'),
+        func.coalesce(Expense.description, '').ilike('Transfer %'),
+        Expense.category_id.in_(transfer_category_ids),
+    )
+
+
+def money_lent_clause():
+    """SQL twin of ``is_money_lent``."""
+    lent_category_ids = select(Category.id).where(Category.name == MONEY_LENT_CATEGORY)
+    return or_(
+        Expense.category_id.in_(lent_category_ids),
+        func.coalesce(Expense.tags, '').ilike('%debt_lent%'),
+    )
+
+
+def _reclassify_statement():
+    return update(Expense.__table__).values(
+        is_transfer=case((transfer_clause(), True), else_=False),
+        is_money_lent=case((money_lent_clause(), True), else_=False),
+    )
+
+
+def reclassify_expenses(user_id=None):
+    """Recompute the stored flags with one UPDATE. The caller commits.
+
+    Returns the number of rows matched.
+    """
+    statement = _reclassify_statement()
+    if user_id is not None:
+        statement = statement.where(Expense.__table__.c.user_id == user_id)
+    return db.session.connection().execute(statement).rowcount
+
+
+def _reclassify_renamed_categories(session, flush_context):
+    # The new names are flushed by now, so the SQL rules see them. The old
+    # name is often expired (not in the history), so any rename counts.
+    renamed = [obj.id for obj in session.dirty
+               if isinstance(obj, Category) and obj.id is not None
+               and inspect(obj).attrs.name.history.has_changes()]
+    if renamed:
+        session.connection().execute(
+            _reclassify_statement().where(Expense.__table__.c.category_id.in_(renamed)))
+
+
+event.listen(Session, 'after_flush', _reclassify_renamed_categories)
@@ -25,6 +25,36 @@ class Config:
     VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY', '')
     VAPID_CLAIMS_EMAIL = os.environ.get('VAPID_CLAIMS_EMAIL', 'mailto:admin@fintracker.app')
 
+    # API rate limiting: memory://, sqlite:////path/limits.db or redis://host:6379/0.
+    # Use a shared store when running more than one worker process.
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
+    RATELIMIT_IDLE_TTL = int(os.environ.get('RATELIMIT_IDLE_TTL', 600))
+    API_RATE_LIMIT = int(os.environ.get('API_RATE_LIMIT', 100))  # requests per minute per key
+
+    # Exchange rates: exchangerate-api, file:///path/rates.json or none.
+    # Handlers read rates from memory; stale pairs refresh in the background.
+    FX_PROVIDER = os.environ.get('FX_PROVIDER', 'exchangerate-api')
+    FX_CACHE_TTL = int(os.environ.get('FX_CACHE_TTL', 86400))
+    FX_REFRESH_INTERVAL = int(os.environ.get('FX_REFRESH_INTERVAL', 3600))  # 0 disables the refresher thread
+
+    # Per-user dashboard cache: memory:// (LRU per process) or redis://host:6379/0 (shared)
+    DASHBOARD_CACHE_URL = os.environ.get('DASHBOARD_CACHE_URL', 'memory://')
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 300))
+    DASHBOARD_CACHE_MAX_ENTRIES = int(os.environ.get('DASHBOARD_CACHE_MAX_ENTRIES', 1024))
+
+    # Compiled per-user transaction categorizers (LRU per process); also dropped when categories change
+    CATEGORIZER_CACHE_TTL = int(os.environ.get('CATEGORIZER_CACHE_TTL', 600))
+    CATEGORIZER_CACHE_MAX_ENTRIES = int(os.environ.get('CATEGORIZER_CACHE_MAX_ENTRIES', 256))
+
+    # Background exports: thread (in-process pool), external (run `flask worker`) or sync.
+    # Finished files are kept in EXPORT_STORAGE_DIR (default <instance>/exports) for EXPORT_TTL seconds.
+    EXPORT_WORKER = os.environ.get('EXPORT_WORKER', 'thread')
+    EXPORT_WORKER_THREADS = int(os.environ.get('EXPORT_WORKER_THREADS', 2))
+    EXPORT_STORAGE_DIR = os.environ.get('EXPORT_STORAGE_DIR')
+    EXPORT_TTL = int(os.environ.get('EXPORT_TTL', 86400))
+    # A running job with no heartbeat (progress write) for this many seconds is assumed lost and requeued
+    EXPORT_JOB_TIMEOUT = int(os.environ.get('EXPORT_JOB_TIMEOUT', 3600))
+
     # Google OAuth
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
@@ -42,6 +72,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    FX_PROVIDER = 'none'
+    FX_REFRESH_INTERVAL = 0
+    EXPORT_WORKER = 'sync'
 
 
 config_by_name = {
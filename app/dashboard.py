@@ -0,0 +1,375 @@
+"""
+Dashboard figures and their per-user cache.
+
+``build_dashboard_context`` computes every figure the dashboard shows as
+plain values (no ORM objects), so the result can be cached per user:
+
+- ``MemoryCache``  - LRU dict capped at ``max_entries``; per process (``app.cache``).
+- ``RedisCache``   - JSON entries in Redis with an expiry, shared by every
+                     worker (reuses the rate limiter's RESP client).
+
+``DASHBOARD_CACHE_URL`` picks one (``memory://`` or ``redis://host:6379/0``)
+and ``DASHBOARD_CACHE_TTL`` bounds how long an entry may live; entries are
+also dropped when the day changes. A session ``after_flush`` hook invalidates
+a user's entry whenever their expenses, wallets, categories, budgets,
+creditors, financial summaries or payments change. Bulk ``query.update()``/``delete()`` calls bypass
+the hook; callers using them must call ``invalidate_dashboard``.
+
+The same hook bumps ``User.data_version`` in the flushing transaction. An
+exchange rate change bumps the one shared ``fx_rates`` version instead, since
+it touches every dashboard. ``data_version`` combines the two; entries
+remember the version they were built from, so a worker whose memory cache
+missed an invalidation (or any rate change) still notices, and the version is
+what ``/api/v1/dashboard`` turns into its ETag.
+
+``DashboardCache.stats()`` reports hits, misses and invalidations for this
+process (see ``/admin/dashboard-cache``).
+"""
+
+import json
+import threading
+from datetime import datetime
+from urllib.parse import unquote, urlparse
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from . import db
+from .aggregates import SummaryIndex, last_months, monthly_totals, range_totals
+from .budgets import BudgetProgress
+from .cache import MemoryCache
+from .models import (Budget, Category, ContractPayment, Creditor, DebtorPayment, DebtPayment, ExchangeRate,
+                     Expense, FinancialSummary, SharedVersion, User, Wallet)
+from .utils import get_exchange_rate
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_ENTRIES = 1024
+DASHBOARD_START = datetime(2024, 1, 1)
+USER_SCOPED_MODELS = (Expense, Wallet, Category, Budget, Creditor, FinancialSummary,
+                      DebtPayment, DebtorPayment, ContractPayment)
+FX_VERSION = 'fx_rates'
+_PENDING_KEY = 'dashboard_cache_pending'
+
+
+def data_version(user_id):
+    """The user's current data version, ``'<user>.<fx>'``; changes whenever their dashboard would."""
+    fx_version = select(SharedVersion.version).where(SharedVersion.name == FX_VERSION).scalar_subquery()
+    row = db.session.execute(select(User.data_version, fx_version).where(User.id == user_id)).first()
+    user_version, rates_version = row if row else (0, 0)
+    return f'{user_version or 0}.{rates_version or 0}'
+
+
+def build_dashboard_context(user_id, now=None):
+    """Compute the dashboard figures for ``user_id`` as plain, cacheable values."""
+    now = now or datetime.utcnow()
+    transfer_filter = Expense.is_transfer
+    month_start = datetime(now.year, now.month, 1)
+    year_start = datetime(now.year, 1, 1)
+
+    # --- De-duplication Logic ---
+    # Live totals start after the latest month covered by summaries to avoid double-counting
+    summaries = SummaryIndex.load(user_id)
+    live_totals_start = summaries.live_start(DASHBOARD_START)
+
+    # One grouped query per source table covers every dashboard period
+    periods = range_totals(user_id, {
+        'live': (live_totals_start, None),
+        'all_time': (DASHBOARD_START, None),
+        'year': (year_start, None),
+        'month': (month_start, None),
+    })
+    live = periods['live']
+
+    # Add Historical Data to Totals (starting from 2024)
+    hist_income, hist_expenses = summaries.totals(since_year=2024)
+
+    # --- Unified Actuals: Extra Payments (Live) ---
+    # Only include payments from months NOT covered by historical sums
+    total_expenses = live.total_expense + hist_expenses
+    total_income = live.total_income + hist_income
+
+    # All-time Money Lent (Live) - starting from 2024
+    total_money_lent = periods['all_time'].lent
+
+    actual_total_expenses = total_expenses - total_money_lent
+    # Debt collections are transaction_type='debt_recovery', not 'income', so
+    # they are already excluded from total_income.
+    actual_total_income = total_income - live.debtor_payment - live.contract_payment
+
+    # Calculate total wallet balance in GHS
+    total_wallet_balance = 0.0
+    for currency, balance in db.session.query(Wallet.currency, Wallet.balance).filter(Wallet.user_id == user_id):
+        balance = float(balance or 0)
+        total_wallet_balance += balance if currency == 'GHS' else balance * get_exchange_rate(currency, 'GHS')
+
+    # Current month's expenses, including debt payments
+    monthly_expenses = periods['month'].total_expense
+
+    # Current year's expenses plus historical data for the current year
+    _, hist_yearly_expenses = summaries.totals(year=now.year)
+    yearly_expenses = periods['year'].expense + hist_yearly_expenses
+    actual_yearly_expenses = yearly_expenses - periods['year'].lent
+
+    # Budget alerts
+    budget_alerts = [
+        {'budget_id': item.budget.id, 'category_id': item.budget.category_id, 'amount': float(item.amount),
+         'spent': item.spent, 'percentage': item.percentage, 'level': item.level}
+        for item in BudgetProgress.for_user(user_id).alerts()
+    ]
+
+    # Calculate total debt and net balance
+    total_debt = float(db.session.query(func.sum(Creditor.amount)).filter(Creditor.user_id == user_id).scalar() or 0)
+
+    # Category spending data for doughnut chart (current month)
+    category_spending = db.session.query(
+        Category.name, Category.icon, func.sum(Expense.amount)
+    ).join(Expense, Expense.category_id == Category.id).filter(
+        Expense.user_id == user_id,
+        Expense.transaction_type == 'expense',
+        Expense.date >= month_start,
+        ~transfer_filter
+    ).group_by(Category.id).order_by(func.sum(Expense.amount).desc()).all()
+
+    # Monthly trend data for the last 6 months (summaries override their month)
+    trend_months = last_months(6, now)
+    month_totals = monthly_totals(user_id, trend_months, summaries=summaries)
+    trend_amounts = [float(month_totals[period].total_expense) for period in trend_months]
+
+    return {
+        'total_debt': total_debt,
+        'net_wallet_balance': total_wallet_balance - total_debt,
+        'total_expenses': total_expenses,
+        'actual_total_expenses': actual_total_expenses,
+        'total_income': total_income,
+        'actual_total_income': actual_total_income,
+        'monthly_expenses': monthly_expenses,
+        'yearly_expenses': yearly_expenses,
+        'actual_yearly_expenses': actual_yearly_expenses,
+        'actual_monthly_trend': monthly_expenses - periods['month'].lent,
+        'total_wallet_balance': total_wallet_balance,
+        'current_date': now,
+        'oldest_date': DASHBOARD_START,
+        'budget_alerts': budget_alerts,
+        'chart_categories': [row[0] for row in category_spending],
+        'chart_amounts': [float(row[2]) for row in category_spending],
+        'trend_labels': [datetime(y, m, 1).strftime('%b') for y, m in trend_months],
+        'trend_amounts': trend_amounts,
+        'actual_trend_amounts': [amount - float(month_totals[period].lent)
+                                 for amount, period in zip(trend_amounts, trend_months)],
+    }
+
+
+class RedisCache:
+    """Entries shared by every worker; Redis expiry evicts them.
+
+    Entries are stored as JSON, never pickle, so whoever can write to Redis
+    cannot run code in the web process. Datetimes in ``DATE_FIELDS`` travel as
+    ISO strings.
+    """
+
+    DATE_FIELDS = ('current_date', 'oldest_date')
+
+    def __init__(self, connection, prefix='dashboard:'):
+        self.connection = connection
+        self.prefix = prefix
+        self.generation_key = f'{prefix}generation'
+        self.lock = threading.Lock()
+
+    def _key(self, key, generation):
+        return f'{self.prefix}{generation or 0}:{key}'
+
+    def get(self, key):
+        with self.lock:
+            generation, = self.connection.pipeline(('GET', self.generation_key))
+            payload, = self.connection.pipeline(('GET', self._key(key, int(generation or 0))))
+        return self._decode(payload) if payload else None
+
+    def set(self, key, value, ttl):
+        payload = self._encode(value)
+        with self.lock:
+            generation, = self.connection.pipeline(('GET', self.generation_key))
+            self.connection.pipeline(('SET', self._key(key, int(generation or 0)), payload,
+                                      'EX', max(1, int(ttl))))
+
+    def _encode(self, value):
+        value = dict(value)
+        for name in self.DATE_FIELDS:
+            if value.get(name) is not None:
+                value[name] = value[name].isoformat()
+        return json.dumps(value)
+
+    def _decode(self, payload):
+        value = json.loads(payload)
+        for name in self.DATE_FIELDS:
+            if value.get(name) is not None:
+                value[name] = datetime.fromisoformat(value[name])
+        return value
+
+    def delete(self, key):
+        with self.lock:
+            generation, = self.connection.pipeline(('GET', self.generation_key))
+            self.connection.pipeline(('DEL', self._key(key, int(generation or 0))))
+
+    def clear(self):
+        # Bumping the generation orphans every entry; they expire on their own
+        with self.lock:
+            self.connection.pipeline(('INCR', self.generation_key))
+
+
+def create_cache(url=None, max_entries=DEFAULT_MAX_ENTRIES):
+    """Build a backend from ``DASHBOARD_CACHE_URL``; ``None`` or ``memory://`` means in-process."""
+    if not url or url.startswith('memory://'):
+        return MemoryCache(max_entries)
+    parsed = urlparse(url)
+    if parsed.scheme == 'redis':
+        from .api.ratelimit import RedisConnection
+
+        db_index = int(parsed.path.lstrip('/') or 0)
+        password = unquote(parsed.password) if parsed.password else None
+        return RedisCache(RedisConnection(parsed.hostname or 'localhost', parsed.port or 6379, db_index, password))
+    raise ValueError(f'Unsupported dashboard cache URL: {url}')
+
+
+class DashboardCache:
+    """Per-user dashboard context in front of a cache backend, with hit/miss counters."""
+
+    def __init__(self, backend, ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.counters = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+        self.lock = threading.Lock()
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def context(self, user_id, now=None, version=None):
+        """The user's dashboard figures, computed at most once per TTL, data change or day.
+
+        Pass ``version`` when the caller has already read ``data_version``.
+        """
+        now = now or datetime.utcnow()
+        version = data_version(user_id) if version is None else version
+        key = str(user_id)
+        try:
+            cached = self.backend.get(key)
+        except Exception:
+            current_app.logger.exception('Dashboard cache read failed')
+            self._count('errors')
+            cached = None
+        if (cached is not None and cached['data_version'] == version
+                and cached['current_date'].date() == now.date()):
+            self._count('hits')
+            return cached
+
+        self._count('misses')
+        context = build_dashboard_context(user_id, now)
+        context['data_version'] = version
+        try:
+            self.backend.set(key, context, self.ttl)
+        except Exception:
+            current_app.logger.exception('Dashboard cache write failed')
+            self._count('errors')
+        return context
+
+    def invalidate(self, user_id=None):
+        """Forget one user's entry, or every entry when ``user_id`` is None."""
+        self._count('invalidations')
+        if user_id is None:
+            self.backend.clear()
+        else:
+            self.backend.delete(str(user_id))
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+
+def dashboard_cache(app=None):
+    """The app's DashboardCache, built from DASHBOARD_CACHE_URL on first use."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('dashboard_cache')
+    if cache is None:
+        backend = create_cache(app.config.get('DASHBOARD_CACHE_URL'),
+                               app.config.get('DASHBOARD_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        cache = DashboardCache(backend, app.config.get('DASHBOARD_CACHE_TTL', DEFAULT_TTL))
+        app.extensions['dashboard_cache'] = cache
+    return cache
+
+
+def invalidate_dashboard(user_id=None):
+    """Drop cached dashboards (one user's or all) in the current app, if it has built a cache."""
+    if not has_app_context():
+        return
+    cache = current_app.extensions.get('dashboard_cache')
+    if cache is None:
+        return
+    try:
+        cache.invalidate(user_id)
+    except Exception:
+        current_app.logger.exception('Dashboard cache invalidation failed')
+
+
+def _affected_users(session):
+    """User ids whose dashboard rows were just flushed; ``None`` in the set means "the rates changed"."""
+    users = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, ExchangeRate):
+            users.add(None)
+        elif isinstance(obj, USER_SCOPED_MODELS):
+            users.add(obj.user_id)
+            # A row moved between users dirties both dashboards
+            history = inspect(obj).attrs.user_id.history
+            users.update(uid for uid in history.deleted or () if uid is not None)
+    return users
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_after_flush(session, flush_context):
+    users = _affected_users(session)
+    if not users:
+        return
+    connection = session.connection()
+    if None in users:
+        # Cached entries carry the old fx version, so they stop matching on their own
+        users.discard(None)
+        _bump_fx_version(connection)
+    if not users:
+        return
+    table = User.__table__
+    connection.execute(update(table).where(table.c.id.in_(users)).values(data_version=table.c.data_version + 1))
+    session.info.setdefault(_PENDING_KEY, set()).update(users)
+    _invalidate(users)
+
+
+def _bump_fx_version(connection):
+    table = SharedVersion.__table__
+    now = datetime.utcnow()
+    bumped = connection.execute(update(table).where(table.c.name == FX_VERSION)
+                                .values(version=table.c.version + 1, updated_at=now))
+    if not bumped.rowcount:
+        connection.execute(insert(table).values(name=FX_VERSION, version=1, updated_at=now))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    # A request may have rebuilt an entry between the flush and the commit
+    users = session.info.pop(_PENDING_KEY, None)
+    if users:
+        _invalidate(users)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _invalidate(users):
+    for user_id in users:
+        invalidate_dashboard(user_id)
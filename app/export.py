@@ -1,15 +1,49 @@
+import csv
 import io
-from datetime import datetime
+import json
+import zipfile
+import zlib
+from datetime import datetime, timedelta
+from flask import Response, stream_with_context
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from sqlalchemy import case, func, select, types
+from . import db
+from .models import Category, Expense, Wallet
 
+# Columns a CSV export may select, in query-string name order
+EXPORT_COLUMNS = {
+    'date': ('Date', Expense.date),
+    'description': ('Description', Expense.description),
+    'category': ('Category', Category.name),
+    'wallet': ('Wallet', Wallet.name),
+    'amount': ('Amount', Expense.amount),
+    'type': ('Type', Expense.transaction_type),
+    'tags': ('Tags', Expense.tags),
+    'notes': ('Notes', Expense.notes),
+}
+CSV_CHUNK_ROWS = 1000
+# Columns of the PDF and Excel reports, as passed to generate_pdf/generate_excel
+REPORT_COLUMNS = ['date', 'description', 'category', 'wallet', 'type', 'amount']
+# Rows per PDF table; about one A4 page at the report's font size
+PDF_TABLE_ROWS = 40
+# Rows per Parquet row group in a dataset archive
+PARQUET_BATCH_ROWS = 10000
+DATASET_FORMAT_VERSION = '1'
 
-def generate_pdf(expenses, user, title='Transaction Report'):
+
+def generate_pdf(rows, user, totals, title='Transaction Report'):
+    """Build a PDF from ``report_rows`` output; ``totals`` comes from ``expense_totals``.
+
+    Rows are laid out as a run of small tables rather than one table per
+    report, so pages are split cheaply however many transactions there are.
+    """
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
     styles = getSampleStyleSheet()
@@ -24,15 +58,14 @@ def generate_pdf(expenses, user, title='Transaction Report'):
     elements.append(Paragraph(subtitle, styles['Normal']))
     elements.append(Spacer(1, 0.3*inch))
 
-    if not expenses:
+    if not totals['count']:
         elements.append(Paragraph("No transactions found.", styles['Normal']))
         doc.build(elements)
         buffer.seek(0)
         return buffer
 
     # Summary
-    total_income = sum(e.amount for e in expenses if e.transaction_type == 'income')
-    total_expense = sum(e.amount for e in expenses if e.transaction_type == 'expense')
+    total_income, total_expense = totals['income'], totals['expense']
     summary_data = [
         ['Total Income', f'{user.default_currency} {total_income:,.2f}'],
         ['Total Expenses', f'{user.default_currency} {total_expense:,.2f}'],
@@ -50,22 +83,10 @@ def generate_pdf(expenses, user, title='Transaction Report'):
     elements.append(summary_table)
     elements.append(Spacer(1, 0.3*inch))
 
-    # Transaction table
+    # Transaction tables, PDF_TABLE_ROWS rows each
     headers = ['Date', 'Description', 'Category', 'Type', 'Amount']
-    data = [headers]
-
-    for expense in expenses:
-        data.append([
-            expense.date.strftime('%d/%m/%Y') if expense.date else '',
-            (expense.description or '')[:40],
-            expense.category.name if expense.category else '',
-            expense.transaction_type.title() if expense.transaction_type else '',
-            f'{expense.amount:,.2f}',
-        ])
-
     col_widths = [1*inch, 2.2*inch, 1.2*inch, 0.8*inch, 1.2*inch]
-    table = Table(data, colWidths=col_widths, repeatRows=1)
-    table.setStyle(TableStyle([
+    table_style = TableStyle([
         ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
         ('FONTSIZE', (0, 0), (-1, -1), 8),
         ('FONTSIZE', (0, 0), (-1, 0), 9),
@@ -78,12 +99,31 @@ def generate_pdf(expenses, user, title='Transaction Report'):
         ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
         ('LEFTPADDING', (0, 0), (-1, -1), 6),
         ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(table)
+    ])
+
+    def add_table(data):
+        table = Table(data, colWidths=col_widths, repeatRows=1)
+        table.setStyle(table_style)
+        elements.append(table)
+
+    data = [headers]
+    for date, description, category, wallet, transaction_type, amount in rows:
+        data.append([
+            date.strftime('%d/%m/%Y') if date else '',
+            (description or '')[:40],
+            category or '',
+            transaction_type.title() if transaction_type else '',
+            f'{amount:,.2f}',
+        ])
+        if len(data) > PDF_TABLE_ROWS:
+            add_table(data)
+            data = [headers]
+    if len(data) > 1:
+        add_table(data)
 
     # Footer
     elements.append(Spacer(1, 0.3*inch))
-    footer_text = f"FinTracker - {len(expenses)} transaction(s)"
+    footer_text = f"FinTracker - {totals['count']} transaction(s)"
     elements.append(Paragraph(footer_text, styles['Normal']))
 
     doc.build(elements)
@@ -91,10 +131,10 @@ def generate_pdf(expenses, user, title='Transaction Report'):
     return buffer
 
 
-def generate_excel(expenses, user, title='Transactions'):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = title
+def generate_excel(rows, user, title='Transactions'):
+    """Build a workbook from ``report_rows`` output in openpyxl's write-only mode."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
 
     # Styles
     header_font = Font(bold=True, color='FFFFFF', size=11)
@@ -109,79 +149,235 @@ def generate_excel(expenses, user, title='Transactions'):
     income_font = Font(color='22C55E')
     expense_font = Font(color='EF4444')
 
-    # Title row
-    ws.merge_cells('A1:F1')
-    ws['A1'] = f'{title} - {user.name} - {datetime.utcnow().strftime("%d %B %Y")}'
-    ws['A1'].font = Font(bold=True, size=14)
+    # Data cells use named styles: assigning one by name is far cheaper than
+    # setting font/border/format on each cell, which re-hashes every style
+    for style in (NamedStyle('report_cell', border=thin_border),
+                  NamedStyle('report_amount', border=thin_border, number_format='#,##0.00'),
+                  NamedStyle('report_income', border=thin_border, number_format='#,##0.00', font=income_font),
+                  NamedStyle('report_expense', border=thin_border, number_format='#,##0.00', font=expense_font)):
+        wb.add_named_style(style)
+    amount_styles = {'income': 'report_income', 'expense': 'report_expense'}
 
-    # Headers
-    headers = ['Date', 'Description', 'Category', 'Wallet', 'Type', 'Amount']
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col_num)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_align
-        cell.border = thin_border
+    def cell(sheet, value, **style):
+        c = WriteOnlyCell(sheet, value=value)
+        for name, setting in style.items():
+            setattr(c, name, setting)
+        return c
 
-    # Data rows
-    for row_num, expense in enumerate(expenses, 4):
-        ws.cell(row=row_num, column=1).value = expense.date.strftime('%d/%m/%Y') if expense.date else ''
-        ws.cell(row=row_num, column=2).value = expense.description or ''
-        ws.cell(row=row_num, column=3).value = expense.category.name if expense.category else ''
-        ws.cell(row=row_num, column=4).value = expense.wallet.name if expense.wallet else ''
-        ws.cell(row=row_num, column=5).value = (expense.transaction_type or '').title()
-
-        amount_cell = ws.cell(row=row_num, column=6)
-        amount_cell.value = expense.amount
-        amount_cell.number_format = '#,##0.00'
-        if expense.transaction_type == 'income':
-            amount_cell.font = income_font
-        elif expense.transaction_type == 'expense':
-            amount_cell.font = expense_font
-
-        for col in range(1, 7):
-            ws.cell(row=row_num, column=col).border = thin_border
-
-    # Auto-size columns
+    # Column widths and merges have to be set before any rows are written
     ws.column_dimensions['A'].width = 12
     ws.column_dimensions['B'].width = 35
     ws.column_dimensions['C'].width = 18
     ws.column_dimensions['D'].width = 15
     ws.column_dimensions['E'].width = 10
     ws.column_dimensions['F'].width = 15
+    ws.merged_cells.add('A1:F1')
 
-    # Summary sheet
-    summary = wb.create_sheet('Summary')
-    total_income = sum(e.amount for e in expenses if e.transaction_type == 'income')
-    total_expense = sum(e.amount for e in expenses if e.transaction_type == 'expense')
-
-    summary['A1'] = 'Financial Summary'
-    summary['A1'].font = Font(bold=True, size=14)
-    summary.merge_cells('A1:B1')
-
-    summary['A3'] = 'Total Income'
-    summary['B3'] = total_income
-    summary['B3'].number_format = '#,##0.00'
-    summary['B3'].font = income_font
-
-    summary['A4'] = 'Total Expenses'
-    summary['B4'] = total_expense
-    summary['B4'].number_format = '#,##0.00'
-    summary['B4'].font = expense_font
+    # Title row
+    ws.append([cell(ws, f'{title} - {user.name} - {datetime.utcnow().strftime("%d %B %Y")}',
+                    font=Font(bold=True, size=14))])
+    ws.append([])
 
-    summary['A5'] = 'Net Balance'
-    summary['B5'] = total_income - total_expense
-    summary['B5'].number_format = '#,##0.00'
-    summary['B5'].font = Font(bold=True, size=12)
+    # Headers
+    headers = ['Date', 'Description', 'Category', 'Wallet', 'Type', 'Amount']
+    ws.append([cell(ws, header, font=header_font, fill=header_fill, alignment=header_align, border=thin_border)
+               for header in headers])
 
-    summary['A7'] = 'Total Transactions'
-    summary['B7'] = len(expenses)
+    # Data rows
+    total_income = total_expense = count = 0
+    for date, description, category, wallet, transaction_type, amount in rows:
+        count += 1
+        if transaction_type == 'income':
+            total_income += amount
+        elif transaction_type == 'expense':
+            total_expense += amount
+        ws.append([
+            cell(ws, date.strftime('%d/%m/%Y') if date else '', style='report_cell'),
+            cell(ws, description or '', style='report_cell'),
+            cell(ws, category or '', style='report_cell'),
+            cell(ws, wallet or '', style='report_cell'),
+            cell(ws, (transaction_type or '').title(), style='report_cell'),
+            cell(ws, amount, style=amount_styles.get(transaction_type, 'report_amount')),
+        ])
 
+    # Summary sheet, from the totals gathered above
+    summary = wb.create_sheet('Summary')
     summary.column_dimensions['A'].width = 20
     summary.column_dimensions['B'].width = 20
+    summary.merged_cells.add('A1:B1')
+    summary.append([cell(summary, 'Financial Summary', font=Font(bold=True, size=14))])
+    summary.append([])
+    summary.append(['Total Income', cell(summary, total_income, number_format='#,##0.00', font=income_font)])
+    summary.append(['Total Expenses', cell(summary, total_expense, number_format='#,##0.00', font=expense_font)])
+    summary.append(['Net Balance', cell(summary, total_income - total_expense, number_format='#,##0.00',
+                                        font=Font(bold=True, size=12))])
+    summary.append([])
+    summary.append(['Total Transactions', count])
 
     buffer = io.BytesIO()
     wb.save(buffer)
     buffer.seek(0)
     return buffer
+
+
+def export_options(args, default_columns):
+    """Read ``columns``, ``start``, ``end`` and ``gzip`` from a request's query string.
+
+    Raises ValueError for unknown columns or dates that are not YYYY-MM-DD.
+    """
+    columns = [c.strip().lower() for c in args.get('columns', '').split(',') if c.strip()] or list(default_columns)
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown export column(s): {', '.join(unknown)}")
+    start = datetime.strptime(args['start'], '%Y-%m-%d') if args.get('start') else None
+    end = datetime.strptime(args['end'], '%Y-%m-%d') if args.get('end') else None
+    compress = args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    return columns, start, end, compress
+
+
+def expense_rows(user_id, columns, start=None, end=None, batch_size=CSV_CHUNK_ROWS):
+    """Yield the selected columns of a user's transactions, newest first, ``batch_size`` rows at a time."""
+    stmt = (select(*[EXPORT_COLUMNS[c][1] for c in columns])
+            .select_from(Expense)
+            .outerjoin(Category, Category.id == Expense.category_id)
+            .outerjoin(Wallet, Wallet.id == Expense.wallet_id)
+            .where(Expense.user_id == user_id, *_date_range(start, end))
+            .order_by(Expense.date.desc(), Expense.id.desc())
+            .execution_options(yield_per=batch_size))
+    yield from db.session.execute(stmt)
+
+
+def report_rows(user_id, start=None, end=None):
+    """Rows for ``generate_pdf`` and ``generate_excel``."""
+    return expense_rows(user_id, REPORT_COLUMNS, start, end)
+
+
+def expense_totals(user_id, start=None, end=None):
+    """Income, expense and transaction count for the same rows, in one query."""
+    income, expense, count = db.session.query(
+        func.sum(case((Expense.transaction_type == 'income', Expense.amount), else_=0)),
+        func.sum(case((Expense.transaction_type == 'expense', Expense.amount), else_=0)),
+        func.count(Expense.id),
+    ).filter(Expense.user_id == user_id, *_date_range(start, end)).one()
+    return {'income': income or 0, 'expense': expense or 0, 'count': count}
+
+
+def _date_range(start, end):
+    conditions = []
+    if start:
+        conditions.append(Expense.date >= start)
+    if end:
+        conditions.append(Expense.date < end + timedelta(days=1))
+    return conditions
+
+
+def iter_expense_rows(user_id, columns, start=None, end=None, batch_size=CSV_CHUNK_ROWS):
+    """``expense_rows`` formatted for CSV: dates as YYYY-MM-DD, NULLs as empty strings."""
+    for row in expense_rows(user_id, columns, start, end, batch_size):
+        yield ['' if value is None else value.strftime('%Y-%m-%d') if isinstance(value, datetime) else value
+               for value in row]
+
+
+def stream_csv(header, rows, compress=False, chunk_rows=CSV_CHUNK_ROWS):
+    """Encode ``rows`` as CSV, yielding bytes every ``chunk_rows`` rows (gzip-compressed if asked)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            chunk = drain()
+            if chunk:
+                yield chunk
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def csv_response(user_id, filename, columns, start=None, end=None, compress=False):
+    """A streamed CSV download of a user's transactions; rows are read as they are sent."""
+    header = [EXPORT_COLUMNS[c][0] for c in columns]
+    body = stream_with_context(stream_csv(header, iter_expense_rows(user_id, columns, start, end), compress))
+    if compress:
+        return Response(body, mimetype='application/gzip',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.gz'})
+    return Response(body, mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+def _arrow_type(column):
+    """Arrow type for a table column; JSON and unknown types are written as strings."""
+    import pyarrow as pa
+    sql_type = column.type
+    if isinstance(sql_type, types.Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, types.Integer):
+        return pa.int64()
+    if isinstance(sql_type, types.Float):
+        return pa.float64()
+    if isinstance(sql_type, types.Numeric):
+        return pa.decimal128(sql_type.precision or 38, sql_type.scale or 10)
+    if isinstance(sql_type, types.DateTime):
+        return pa.timestamp('us')
+    if isinstance(sql_type, types.Date):
+        return pa.date32()
+    return pa.string()
+
+
+_ARROW_NATIVE = (types.Boolean, types.Integer, types.Numeric, types.DateTime, types.Date, types.String)
+
+
+def _arrow_values(column, values):
+    if isinstance(column.type, types.JSON):
+        return [None if v is None else json.dumps(v, default=str) for v in values]
+    if not isinstance(column.type, _ARROW_NATIVE):
+        return [None if v is None else str(v) for v in values]
+    return values
+
+
+def write_parquet_archive(fileobj, user_id, tables, batch_size=PARQUET_BATCH_ROWS, progress=None):
+    """Write each of ``tables`` as a typed Parquet file into a zip archive on ``fileobj``.
+
+    ``tables`` is a list of ``(name, owner column)`` pairs, e.g. ``('wallets',
+    Wallet.user_id)``; every column of the owner's table is written for the
+    rows that belong to ``user_id``. Rows are read with ``yield_per`` and
+    each batch becomes one Parquet row group, so memory stays at one batch.
+    A ``manifest.json`` lists the tables and their row counts.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    manifest = {'format_version': DATASET_FORMAT_VERSION, 'exported_at': datetime.utcnow().isoformat(),
+                'tables': {}}
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for done, (name, owner) in enumerate(tables):
+            table = owner.class_.__table__
+            columns = list(table.columns)
+            schema = pa.schema([pa.field(c.name, _arrow_type(c), nullable=True) for c in columns])
+            stmt = (select(table)
+                    .where(table.c[owner.key] == user_id)
+                    .order_by(*table.primary_key.columns)
+                    .execution_options(yield_per=batch_size))
+            rows = 0
+            with archive.open(f'{name}.parquet', 'w') as member:
+                writer = pq.ParquetWriter(member, schema, compression='zstd')
+                for batch in db.session.execute(stmt).partitions():
+                    arrays = [pa.array(_arrow_values(c, [row[i] for row in batch]), type=schema.field(i).type)
+                              for i, c in enumerate(columns)]
+                    writer.write_batch(pa.record_batch(arrays, schema=schema))
+                    rows += len(batch)
+                writer.close()
+            manifest['tables'][name] = {'file': f'{name}.parquet', 'rows': rows}
+            if progress:
+                progress((done + 1) * 95 // len(tables))
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+    return manifest
@@ -0,0 +1,325 @@
+"""
+Background export jobs.
+
+PDF and Excel exports for large accounts ran longer than proxies allow, so
+the export routes now queue an ``ExportJob`` and redirect to its status page
+(``/exports/<id>``), which polls the job's progress and links the file once
+it is ready.
+
+Jobs are run according to EXPORT_WORKER:
+
+- ``thread``   - a small pool of daemon threads in the web process (default)
+- ``external`` - left pending for ``flask worker`` processes to claim
+- ``sync``     - run inside the request that queued them (tests)
+
+A job is claimed with a conditional UPDATE, so any number of threads and
+worker processes can share the table. Finished files are written under
+EXPORT_STORAGE_DIR (default ``<instance>/exports``) and expire after
+EXPORT_TTL seconds; workers delete expired files as they go. A running job
+records a heartbeat (``updated_at``) whenever it reports progress, at least
+every HEARTBEAT_INTERVAL seconds while it is making any; one whose heartbeat is
+older than EXPORT_JOB_TIMEOUT seconds (its worker died) is put back to
+'pending' for another worker to claim.
+"""
+
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, update
+
+from . import db
+from .models import ExportJob, User
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 86400
+DEFAULT_JOB_TIMEOUT = 3600
+PROGRESS_STEP = 5  # percentage points between progress writes
+HEARTBEAT_INTERVAL = 60  # seconds between progress writes while the percentage stands still
+
+EXPORTERS = {}
+
+
+def exporter(kind):
+    """Register ``fn(user, params, progress) -> (file object, file name, mimetype)`` for ``kind``."""
+    def register(fn):
+        EXPORTERS[kind] = fn
+        return fn
+    return register
+
+
+def _track(rows, total, progress):
+    """Pass ``rows`` through, reporting progress up to 95% (the rest is writing the file)."""
+    for done, row in enumerate(rows, 1):
+        progress(done * 95 // max(total, done))
+        yield row
+
+
+@exporter('transactions_pdf')
+def _transactions_pdf(user, params, progress):
+    from .export import expense_totals, generate_pdf, report_rows
+    totals = expense_totals(user.id)
+    buffer = generate_pdf(_track(report_rows(user.id), totals['count'], progress), user, totals)
+    return buffer, f'transactions_{datetime.utcnow().strftime("%Y%m%d")}.pdf', 'application/pdf'
+
+
+@exporter('transactions_excel')
+def _transactions_excel(user, params, progress):
+    from .export import expense_totals, generate_excel, report_rows
+    total = expense_totals(user.id)['count']
+    buffer = generate_excel(_track(report_rows(user.id), total, progress), user)
+    return (buffer, f'transactions_{datetime.utcnow().strftime("%Y%m%d")}.xlsx',
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+@exporter('tax_pdf')
+def _tax_pdf(user, params, progress):
+    from .routes_advanced import build_tax_summary_pdf
+    year = int(params['year'])
+    return build_tax_summary_pdf(user, year), f'tax_summary_{year}.pdf', 'application/pdf'
+
+
+@exporter('newsletter_pdf')
+def _newsletter_pdf(user, params, progress):
+    from .routes_newsletter import build_report_pdf
+    buffer, file_name = build_report_pdf(user, int(params.get('period_days', 30)))
+    return buffer, file_name, 'application/pdf'
+
+
+@exporter('dataset_parquet')
+def _dataset_parquet(user, params, progress):
+    from .export import write_parquet_archive
+    from .routes_backup import BACKUP_TABLES
+    archive = tempfile.TemporaryFile()
+    write_parquet_archive(archive, user.id, BACKUP_TABLES, progress=progress)
+    archive.seek(0)
+    return archive, f'fintracker_data_{datetime.utcnow().strftime("%Y%m%d")}.zip', 'application/zip'
+
+
+class _Progress:
+    """Writes a job's progress on its own connection, so readers see it mid-job.
+
+    SQLite allows one writer and a second connection would wait on the job's
+    own open read, so there progress goes through the job's session and shows
+    when the job finishes.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.written = 0
+        self.written_at = time.monotonic()
+
+    def __call__(self, percent):
+        percent = min(int(percent), 99)
+        now = time.monotonic()
+        if percent < self.written + PROGRESS_STEP and now - self.written_at < HEARTBEAT_INTERVAL:
+            return
+        self.written, self.written_at = max(percent, self.written), now
+        stmt = (update(ExportJob.__table__).where(ExportJob.__table__.c.id == self.job_id)
+                .values(progress=self.written, updated_at=datetime.utcnow()))
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(stmt)
+            return
+        with db.engine.begin() as conn:
+            conn.execute(stmt)
+
+
+def storage_dir(app=None):
+    app = app or current_app._get_current_object()
+    path = app.config.get('EXPORT_STORAGE_DIR') or os.path.join(app.instance_path, 'exports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_path(job):
+    """Absolute path of a finished job's file."""
+    return os.path.join(storage_dir(), job.file_path)
+
+
+def _store(job_id, file_name, fileobj):
+    name = f'{job_id}-{uuid.uuid4().hex}{os.path.splitext(file_name)[1]}'
+    path = os.path.join(storage_dir(), name)
+    with open(path + '.part', 'wb') as out:
+        shutil.copyfileobj(fileobj, out)
+    os.replace(path + '.part', path)
+    return name
+
+
+def enqueue_export(user_id, kind, **params):
+    """Create a pending job and hand it to the app's worker."""
+    if kind not in EXPORTERS:
+        raise ValueError(f'Unknown export kind: {kind}')
+    job = ExportJob(user_id=user_id, kind=kind, params=json.dumps(params), status='pending', progress=0)
+    db.session.add(job)
+    db.session.commit()
+    export_worker().submit(job.id)
+    return job
+
+
+def run_job(job_id):
+    """Claim and run one pending job. Returns False if another worker claimed it first."""
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(ExportJob)
+        .where(ExportJob.id == job_id, ExportJob.status == 'pending')
+        .values(status='running', started_at=now, updated_at=now)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return False
+
+    job = db.session.get(ExportJob, job_id)
+    try:
+        user = db.session.get(User, job.user_id)
+        fileobj, file_name, mimetype = EXPORTERS[job.kind](user, json.loads(job.params or '{}'), _Progress(job_id))
+        with fileobj:
+            job.file_path = _store(job_id, file_name, fileobj)
+        job.file_name, job.mimetype = file_name, mimetype
+        job.status, job.progress = 'done', 100
+        job.expires_at = datetime.utcnow() + timedelta(
+            seconds=current_app.config.get('EXPORT_TTL', DEFAULT_TTL))
+    except Exception as e:
+        logger.exception('Export job %s failed', job_id)
+        db.session.rollback()
+        job = db.session.get(ExportJob, job_id)
+        job.status, job.error = 'failed', str(e)[:500]
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def expire(job):
+    """Delete a job's file and mark it expired (the caller commits)."""
+    if job.file_path:
+        try:
+            os.remove(file_path(job))
+        except FileNotFoundError:
+            pass
+    job.status, job.file_path = 'expired', None
+
+
+def purge_expired(now=None):
+    """Expire every finished job past its ``expires_at``. Returns how many were expired."""
+    jobs = ExportJob.query.filter(ExportJob.status == 'done',
+                                  ExportJob.expires_at <= (now or datetime.utcnow())).all()
+    for job in jobs:
+        expire(job)
+    db.session.commit()
+    return len(jobs)
+
+
+def requeue_stale(now=None):
+    """Put running jobs with no heartbeat for EXPORT_JOB_TIMEOUT seconds back to 'pending'. Returns how many."""
+    timeout = current_app.config.get('EXPORT_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=timeout)
+    # Jobs claimed before the heartbeat column existed fall back to started_at
+    heartbeat = func.coalesce(ExportJob.updated_at, ExportJob.started_at)
+    requeued = db.session.execute(
+        update(ExportJob)
+        .where(ExportJob.status == 'running', heartbeat <= cutoff)
+        .values(status='pending', progress=0, started_at=None, updated_at=None)
+    ).rowcount
+    db.session.commit()
+    if requeued:
+        logger.warning('Requeued %d export jobs with no heartbeat for %d seconds', requeued, timeout)
+    return requeued
+
+
+def pending_job_ids(limit=None):
+    """Oldest pending jobs first."""
+    query = (db.session.query(ExportJob.id)
+             .filter(ExportJob.status == 'pending')
+             .order_by(ExportJob.created_at, ExportJob.id)
+             .limit(limit))
+    return [job_id for job_id, in query]
+
+
+class ExportWorker:
+    """Runs queued jobs for one app, in-process or not at all, depending on ``mode``."""
+
+    def __init__(self, app, mode='thread', threads=2):
+        self.app = app
+        self.mode = mode
+        self.threads = threads
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+
+    def submit(self, job_id):
+        if self.mode == 'sync':
+            run_job(job_id)
+        elif self.mode == 'thread':
+            self._start()
+            self.queue.put(job_id)
+        # 'external': a `flask worker` process will claim it
+
+    def _start(self):
+        with self.lock:
+            if self.started:
+                return
+            # Pick up jobs left pending (or stuck running) by a previous process; claiming is atomic
+            requeue_stale()
+            for job_id in pending_job_ids():
+                self.queue.put(job_id)
+            for n in range(self.threads):
+                threading.Thread(target=self._work, daemon=True, name=f'export-worker-{n}').start()
+            self.started = True
+
+    def _work(self):
+        while True:
+            job_id = self.queue.get()
+            with self.app.app_context():
+                try:
+                    purge_expired()
+                    run_job(job_id)
+                except Exception:
+                    logger.exception('Export worker failed on job %s', job_id)
+                finally:
+                    db.session.remove()
+
+
+def work(poll_interval=2.0, once=False):
+    """Claim pending jobs until stopped (``flask worker``); with ``once``, return when none are left.
+
+    Errors (e.g. the database going away) are logged and retried after
+    ``poll_interval``; with ``once`` they are raised instead.
+    """
+    while True:
+        job_ids = []
+        try:
+            requeue_stale()
+            purge_expired()
+            job_ids = pending_job_ids(limit=10)
+            for job_id in job_ids:
+                run_job(job_id)
+        except Exception:
+            if once:
+                raise
+            logger.exception('Export worker pass failed; retrying in %s seconds', poll_interval)
+            job_ids = []
+        finally:
+            db.session.remove()
+        if not job_ids:
+            if once:
+                return
+            time.sleep(poll_interval)
+
+
+def export_worker(app=None):
+    """The app's ExportWorker, built from the EXPORT_* settings on first use."""
+    app = app or current_app._get_current_object()
+    worker = app.extensions.get('export_worker')
+    if worker is None:
+        worker = ExportWorker(app, mode=app.config.get('EXPORT_WORKER', 'thread'),
+                              threads=app.config.get('EXPORT_WORKER_THREADS', 2))
+        app.extensions['export_worker'] = worker
+    return worker
@@ -0,0 +1,91 @@
+"""
+Stored duplicate-detection fingerprints for Expense rows.
+
+Bank statement imports used to look for an existing copy of every incoming
+row with its own query, comparing ``lower(description)`` so no index could
+help. Each expense now carries ``Expense.fingerprint``: a SHA-256 of the
+transaction day, the amount (to the cent, ignoring sign, as stored amounts
+are positive) and the lower-cased, whitespace-collapsed description.
+``existing_fingerprints`` answers a whole statement through the
+(user_id, fingerprint) index with one ``IN`` query per chunk.
+
+A ``before_flush`` hook fingerprints every new expense and every expense
+whose date, amount or description changed. Bulk ``query.update()`` calls
+bypass it; run ``flask db-maintenance refingerprint-expenses`` afterwards.
+"""
+
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import bindparam, event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import Expense
+
+FINGERPRINT_FIELDS = ('date', 'amount', 'description')
+# Fingerprints per IN (...) list; well under SQLite's bound parameter limit
+LOOKUP_CHUNK = 500
+
+
+def fingerprint(date, amount, description):
+    """Fingerprint of a transaction on ``date`` for ``amount`` described as ``description``."""
+    key = '{}|{:.2f}|{}'.format(
+        date.strftime('%Y-%m-%d'),
+        abs(float(amount or 0)),
+        ' '.join((description or '').lower().split()),
+    )
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def existing_fingerprints(user_id, fingerprints):
+    """The subset of ``fingerprints`` already recorded on the user's expenses."""
+    wanted = list(set(fingerprints))
+    found = set()
+    for start in range(0, len(wanted), LOOKUP_CHUNK):
+        found.update(db.session.scalars(
+            select(Expense.fingerprint).where(Expense.user_id == user_id,
+                                              Expense.fingerprint.in_(wanted[start:start + LOOKUP_CHUNK]))
+        ))
+    return found
+
+
+def _needs_fingerprint(obj, new):
+    if obj in new:
+        return True
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in FINGERPRINT_FIELDS)
+
+
+@event.listens_for(Session, 'before_flush')
+def _fingerprint_pending(session, flush_context, instances):
+    new = session.new
+    for obj in list(new) + list(session.dirty):
+        if isinstance(obj, Expense) and obj not in session.deleted and _needs_fingerprint(obj, new):
+            if obj.date is None:
+                obj.date = datetime.utcnow()
+            obj.fingerprint = fingerprint(obj.date, obj.amount, obj.description)
+
+
+def refingerprint_expenses(user_id=None, batch_size=1000):
+    """Recompute stored fingerprints, a batch of rows at a time. The caller commits.
+
+    Returns the number of rows updated.
+    """
+    table = Expense.__table__
+    query = select(table.c.id, table.c.date, table.c.amount, table.c.description).order_by(table.c.id)
+    if user_id is not None:
+        query = query.where(table.c.user_id == user_id)
+    statement = (update(table).where(table.c.id == bindparam('expense_id'))
+                 .values(fingerprint=bindparam('value')))
+    conn = db.session.connection()
+    updated = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(query.where(table.c.id > last_id).limit(batch_size)).all()
+        if not rows:
+            return updated
+        conn.execute(statement, [{'expense_id': expense_id, 'value': fingerprint(date, amount, description)}
+                                 for expense_id, date, amount, description in rows])
+        updated += len(rows)
+        last_id = rows[-1].id
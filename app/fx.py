@@ -0,0 +1,482 @@
+"""
+Exchange rates served from memory.
+
+Request handlers used to query ExchangeRate on every conversion and, once a
+rate was a day old, block on an HTTP call to the rate API before committing
+the answer. ``RateCache`` keeps the latest rate per pair in process memory
+instead:
+
+* it is warmed from the newest ExchangeRate row per pair in one query;
+* ``get`` never touches the network - a stale or missing pair returns the
+  last known value and schedules a background refresh of its base currency;
+  writes that store a converted amount use ``get_or_fetch``, which waits for
+  the first fetch of a pair it has never seen;
+* refreshes are single-flight per base and pull every pair for that base in
+  one provider call; of the pairs the app actually uses, only those whose
+  rate moved are persisted, by whichever process first claims the base's
+  ``fx_persist:<base>`` SharedVersion row for PERSIST_LEASE seconds;
+* a daemon thread refreshes every tracked base each ``FX_REFRESH_INTERVAL``
+  seconds, and ``flask db-maintenance refresh-rates`` does the same on demand;
+* committed ExchangeRate writes (manual rates in settings, imports) are
+  applied to the cache by a session hook.
+
+Providers implement ``fetch(base) -> {currency: rate}``. ``FX_PROVIDER``
+chooses one: ``exchangerate-api`` (default), ``file:///path/rates.json`` for
+offline use and tests, or ``none`` to disable fetching.
+
+ExchangeRate rows also form a dated history. ``RateHistory`` loads it as
+sorted NumPy arrays per currency and ``convert_amounts`` converts whole
+arrays of (amount, currency, date) at the rate in effect on each date, one
+``searchsorted`` per currency instead of one lookup per row. For aggregates
+that stay in SQL, ``current_rate_table`` is a derived table of the newest
+rate per currency to join against.
+"""
+
+import json
+import logging
+import threading
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import requests
+from flask import current_app, has_app_context
+from sqlalchemy import and_, event, func, insert, or_, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import ExchangeRate, SharedVersion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 86400  # seconds before a rate is considered stale
+RETRY_AFTER = 300  # seconds to wait after a failed fetch before trying that base again
+PERSIST_LEASE = 60  # seconds one process holds a base's persist claim, so concurrent refreshes write once
+_PENDING_KEY = 'fx_rate_changes'
+
+
+def _code(currency):
+    return (currency or '').strip().upper()
+
+
+class RateProvider:
+    def fetch(self, base):
+        """Return ``{currency: rate}`` for one unit of ``base``."""
+        raise NotImplementedError
+
+
+class ExchangeRateApiProvider(RateProvider):
+    URL = 'https://api.exchangerate-api.com/v4/latest/{base}'
+
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+
+    def fetch(self, base):
+        response = requests.get(self.URL.format(base=base), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get('rates', {})
+
+
+class FileRateProvider(RateProvider):
+    """Rates from a JSON file: ``{"base": "USD", "rates": {"GHS": 15.2, ...}}``.
+
+    The file may also hold several tables as ``{"USD": {...}, "EUR": {...}}``.
+    Bases without their own table are derived by crossing through the file's
+    base, so one table answers every pair.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _tables(self):
+        with open(self.path, encoding='utf-8') as fh:
+            data = json.load(fh)
+        if 'rates' in data:
+            base = _code(data.get('base') or 'USD')
+            return {base: {_code(k): float(v) for k, v in data['rates'].items()}}
+        return {_code(base): {_code(k): float(v) for k, v in rates.items()} for base, rates in data.items()}
+
+    def fetch(self, base):
+        base = _code(base)
+        tables = self._tables()
+        if base in tables:
+            return dict(tables[base], **{base: 1.0})
+        for anchor, rates in tables.items():
+            if rates.get(base):
+                per_base = 1.0 / rates[base]
+                crossed = {currency: rate * per_base for currency, rate in rates.items()}
+                crossed.update({anchor: per_base, base: 1.0})
+                return crossed
+        return {}
+
+
+def create_provider(spec):
+    """Build a provider from an ``FX_PROVIDER`` value; ``none`` disables fetching."""
+    spec = (spec or 'exchangerate-api').strip()
+    if spec == 'none':
+        return None
+    if spec == 'exchangerate-api':
+        return ExchangeRateApiProvider()
+    if spec.startswith('file://'):
+        return FileRateProvider(spec[len('file://'):])
+    raise ValueError(f'Unsupported exchange rate provider: {spec}')
+
+
+class RateCache:
+    """Latest rate per (from, to) pair, shared by every request in the process."""
+
+    def __init__(self, app, provider, ttl=DEFAULT_TTL, refresh_interval=0):
+        self.app = app
+        self.provider = provider
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.rates = {}  # (from, to) -> (rate, as_of timestamp)
+        self.lock = threading.Lock()
+        self.inflight = {}  # base -> Event set when its fetch finishes
+        self.failed = {}  # base -> time of the last failed fetch
+        self.wanted = set()  # pairs asked for before any rate was known
+        self.loaded = False
+        self.refresher = None
+
+    def load(self):
+        """Warm the cache from the newest ExchangeRate row of every pair."""
+        latest = select(func.max(ExchangeRate.id)).group_by(ExchangeRate.from_currency, ExchangeRate.to_currency)
+        rows = ExchangeRate.query.filter(ExchangeRate.id.in_(latest)).all()
+        with self.lock:
+            for row in rows:
+                self._store(row.from_currency, row.to_currency, row.rate, row.date)
+            self.loaded = True
+
+    def _store(self, from_currency, to_currency, rate, as_of=None):
+        if isinstance(as_of, datetime):
+            as_of = as_of.replace(tzinfo=timezone.utc).timestamp()  # stored dates are naive UTC
+        as_of = as_of or time.time()
+        key = (_code(from_currency), _code(to_currency))
+        if key not in self.rates or self.rates[key][1] <= as_of:
+            self.rates[key] = (float(rate), as_of)
+
+    def record(self, from_currency, to_currency, rate, as_of=None):
+        with self.lock:
+            self._store(from_currency, to_currency, rate, as_of)
+
+    def forget(self, from_currency, to_currency):
+        """Drop a deleted pair; the next ``get`` reloads any older row still stored for it."""
+        with self.lock:
+            self.rates.pop((_code(from_currency), _code(to_currency)), None)
+            self.loaded = False
+
+    def get(self, from_currency, to_currency):
+        """Return the cached rate, or ``None`` if the pair has never been seen.
+
+        Never blocks on the network: stale and missing pairs are refreshed in
+        the background and the last known value is returned meanwhile.
+        """
+        from_currency, to_currency = _code(from_currency), _code(to_currency)
+        if from_currency == to_currency:
+            return 1.0
+        if not self.loaded:
+            self.load()
+            self.start_refresher()
+        now = time.time()
+        entry = self.rates.get((from_currency, to_currency))
+        if entry is None or now - entry[1] >= self.ttl:
+            if entry is None:
+                self.wanted.add((from_currency, to_currency))
+            self.refresh_async(from_currency)
+        if entry is not None:
+            return entry[0]
+        inverse = self.rates.get((to_currency, from_currency))
+        if inverse is not None and inverse[0]:
+            return 1.0 / inverse[0]
+        return None
+
+    def get_or_fetch(self, from_currency, to_currency):
+        """Like ``get``, but fetch a never-seen pair before answering (for writes).
+
+        Blocks on one single-flight ``refresh`` of ``from_currency``; still
+        ``None`` if the provider is disabled or the fetch fails.
+        """
+        rate = self.get(from_currency, to_currency)
+        if rate is None and self.provider is not None:
+            self.refresh(from_currency)
+            rate = self.get(from_currency, to_currency)
+        return rate
+
+    def bases(self):
+        """Every base currency the cache holds or has been asked for."""
+        with self.lock:
+            return sorted({from_currency for from_currency, _ in self.rates.keys() | self.wanted})
+
+    def refresh(self, base):
+        """Fetch every pair for ``base`` once, even if several threads ask at the same time.
+
+        Returns the number of pairs updated.
+        """
+        base = _code(base)
+        if self.provider is None:
+            return 0
+        with self.lock:
+            running = self.inflight.get(base)
+            if running is None:
+                running = self.inflight[base] = threading.Event()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            running.wait()
+            return 0
+        try:
+            return self._fetch_and_store(base)
+        finally:
+            with self.lock:
+                del self.inflight[base]
+            running.set()
+
+    def _fetch_and_store(self, base):
+        try:
+            fetched = self.provider.fetch(base)
+        except Exception:
+            logger.exception('Exchange rate fetch failed for %s', base)
+            self.failed[base] = time.time()
+            return 0
+        now = datetime.utcnow()
+        fetched = {_code(k): float(v) for k, v in fetched.items() if v and _code(k) != base}
+        with self.lock:
+            tracked = {to for from_currency, to in self.rates.keys() | self.wanted if from_currency == base}
+            for currency, rate in fetched.items():
+                self._store(base, currency, rate, now)
+        self.failed.pop(base, None)
+
+        # Persist only the pairs the app already converts; the rest stay in memory
+        changed = self._changed_pairs(base, {c: fetched[c] for c in tracked if c in fetched})
+        if changed:
+            if self._claim_persist(base, now):
+                db.session.add_all([ExchangeRate(from_currency=base, to_currency=currency, rate=rate, date=now)
+                                    for currency, rate in sorted(changed.items())])
+            db.session.commit()
+        return len(fetched)
+
+    @staticmethod
+    def _changed_pairs(base, rates):
+        """The subset of ``{currency: rate}`` that differs from the newest stored rate from ``base``."""
+        if not rates:
+            return {}
+        latest = (select(func.max(ExchangeRate.id))
+                  .where(ExchangeRate.from_currency == base, ExchangeRate.to_currency.in_(rates))
+                  .group_by(ExchangeRate.to_currency))
+        stored = dict(db.session.execute(
+            select(ExchangeRate.to_currency, ExchangeRate.rate).where(ExchangeRate.id.in_(latest))).all())
+        # Float columns may be single precision (MySQL FLOAT), so compare loosely
+        return {currency: rate for currency, rate in rates.items()
+                if currency not in stored or not math.isclose(stored[currency], rate, rel_tol=1e-6)}
+
+    @staticmethod
+    def _claim_persist(base, now):
+        """Claim the right to persist ``base`` for PERSIST_LEASE seconds; ``False`` if another process has it.
+
+        The conditional UPDATE holds the row until the caller commits, so a
+        concurrent refresh in another process waits and then sees a fresh claim.
+        """
+        table = SharedVersion.__table__
+        name = f'fx_persist:{base}'
+        claimed = db.session.execute(
+            update(table)
+            .where(table.c.name == name,
+                   or_(table.c.updated_at.is_(None), table.c.updated_at < now - timedelta(seconds=PERSIST_LEASE)))
+            .values(version=table.c.version + 1, updated_at=now))
+        if claimed.rowcount:
+            return True
+        if db.session.get(SharedVersion, name) is not None:
+            return False
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(table).values(name=name, version=1, updated_at=now))
+        except IntegrityError:
+            return False
+        return True
+
+    def refresh_async(self, base):
+        """Refresh ``base`` on a daemon thread unless one is running or it just failed."""
+        if self.provider is None or base in self.inflight:
+            return
+        if time.time() - self.failed.get(base, 0) < RETRY_AFTER:
+            return
+        threading.Thread(target=self._refresh_in_app, args=(base,), daemon=True,
+                         name=f'fx-refresh-{base}').start()
+
+    def _refresh_in_app(self, base):
+        with self.app.app_context():
+            try:
+                self.refresh(base)
+            finally:
+                db.session.remove()
+
+    def refresh_all(self, bases=None):
+        """Refresh each base once; returns ``{base: pairs updated}``."""
+        return {base: self.refresh(base) for base in (bases or self.bases())}
+
+    def start_refresher(self):
+        if self.refresh_interval <= 0 or self.provider is None or self.refresher is not None:
+            return
+        self.refresher = threading.Thread(target=self._refresh_loop, daemon=True, name='fx-refresher')
+        self.refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            with self.app.app_context():
+                try:
+                    self.refresh_all()
+                except Exception:
+                    logger.exception('Background exchange rate refresh failed')
+                finally:
+                    db.session.remove()
+
+
+def rate_cache(app=None):
+    """The app's RateCache, built from the FX_* settings on first use."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('fx_rates')
+    if cache is None:
+        cache = RateCache(app, create_provider(app.config.get('FX_PROVIDER')),
+                          ttl=app.config.get('FX_CACHE_TTL', DEFAULT_TTL),
+                          refresh_interval=app.config.get('FX_REFRESH_INTERVAL', 0))
+        app.extensions['fx_rates'] = cache
+    return cache
+
+
+def current_rate_table(target):
+    """Derived table ``(currency, rate)``: the newest stored rate from each currency into ``target``.
+
+    Pairs stored only the other way round (``target`` -> currency) are inverted,
+    so SQL aggregates can convert with a single LEFT JOIN.
+    """
+    target = _code(target)
+    newest = select(
+        ExchangeRate.from_currency, ExchangeRate.to_currency, ExchangeRate.rate,
+        func.row_number().over(
+            partition_by=(ExchangeRate.from_currency, ExchangeRate.to_currency),
+            order_by=(ExchangeRate.date.desc(), ExchangeRate.id.desc()),
+        ).label('rate_rank'),
+    ).where(or_(ExchangeRate.to_currency == target, ExchangeRate.from_currency == target)).subquery()
+    latest = select(newest).where(newest.c.rate_rank == 1).cte('latest_rate')
+    direct = select(latest.c.from_currency.label('currency'), latest.c.rate.label('rate')).where(
+        latest.c.to_currency == target)
+    inverse = select(latest.c.to_currency, 1.0 / latest.c.rate).where(
+        latest.c.from_currency == target,
+        latest.c.rate > 0,
+        latest.c.to_currency.not_in(select(latest.c.from_currency).where(latest.c.to_currency == target)),
+    )
+    return union_all(direct, inverse).subquery('current_rate')
+
+
+class RateHistory:
+    """Every stored rate into ``target`` as ``{currency: (dates, rates)}`` sorted arrays.
+
+    Pairs stored the other way round (``target`` -> currency) are inverted
+    into the same series. Currencies without any history fall back to the
+    cached current rate.
+    """
+
+    def __init__(self, target, series):
+        self.target = _code(target)
+        self.series = series
+
+    @classmethod
+    def load(cls, target, currencies):
+        """Read the history for ``currencies`` -> ``target`` in one indexed query."""
+        target = _code(target)
+        currencies = {_code(c) for c in currencies if c} - {target}
+        if not currencies:
+            return cls(target, {})
+        rows = (db.session.query(ExchangeRate.from_currency, ExchangeRate.to_currency,
+                                 ExchangeRate.date, ExchangeRate.rate)
+                .filter(or_(and_(ExchangeRate.from_currency.in_(currencies), ExchangeRate.to_currency == target),
+                            and_(ExchangeRate.from_currency == target, ExchangeRate.to_currency.in_(currencies))))
+                .order_by(ExchangeRate.date, ExchangeRate.id))
+        points = {}
+        for from_currency, to_currency, date, rate in rows:
+            if not rate:
+                continue
+            if _code(to_currency) == target:
+                currency, value = _code(from_currency), rate
+            else:
+                currency, value = _code(to_currency), 1.0 / rate
+            dates, rates = points.setdefault(currency, ([], []))
+            dates.append(date or datetime(1970, 1, 1))
+            rates.append(value)
+        series = {currency: (np.array(dates, dtype='datetime64[s]'), np.array(rates, dtype=float))
+                  for currency, (dates, rates) in points.items()}
+        return cls(target, series)
+
+    def rates_at(self, currency, dates):
+        """The rate in effect on each of ``dates``; before the first stored rate, that rate."""
+        dates = np.asarray(dates, dtype='datetime64[s]')
+        currency = _code(currency)
+        if currency == self.target:
+            return np.ones(dates.shape)
+        if currency not in self.series:
+            current = rate_cache().get(currency, self.target)
+            return np.full(dates.shape, current if current is not None else 1.0)
+        points, rates = self.series[currency]
+        index = np.searchsorted(points, dates, side='right') - 1
+        return rates[np.maximum(index, 0)]
+
+
+def convert_amounts(amounts, currencies, dates, target, history=None):
+    """Convert parallel sequences of amounts, currency codes and dates into ``target``.
+
+    ``dates`` may be ``None`` (or contain ``None``) for "now". Returns a NumPy
+    float array in the input order.
+    """
+    target = _code(target)
+    amounts = np.asarray(amounts, dtype=float)
+    codes = np.array([_code(c) or target for c in currencies], dtype=object)
+    now = datetime.utcnow()
+    if dates is None:
+        when = np.full(amounts.shape, np.datetime64(now, 's'))
+    else:
+        when = np.array([d or now for d in dates], dtype='datetime64[s]')
+    if history is None:
+        history = RateHistory.load(target, set(codes.tolist()))
+
+    converted = amounts.copy()
+    for currency in set(codes.tolist()) - {target}:
+        mask = codes == currency
+        converted[mask] = amounts[mask] * history.rates_at(currency, when[mask])
+    return converted
+
+
+def _track_rate_changes(session, flush_context, instances):
+    changes = session.info.setdefault(_PENDING_KEY, [])
+    for obj in session.new | session.dirty:
+        if isinstance(obj, ExchangeRate):
+            changes.append(('record', obj.from_currency, obj.to_currency, obj.rate, obj.date))
+    for obj in session.deleted:
+        if isinstance(obj, ExchangeRate):
+            changes.append(('forget', obj.from_currency, obj.to_currency))
+
+
+def _apply_rate_changes(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes or not has_app_context():
+        return
+    cache = current_app.extensions.get('fx_rates')
+    if cache is None or not cache.loaded:
+        return  # the next load reads these rows from the database
+    for change in changes:
+        if change[0] == 'record':
+            cache.record(*change[1:])
+        else:
+            cache.forget(*change[1:])
+
+
+def _discard_rate_changes(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+event.listen(Session, 'before_flush', _track_rate_changes)
+event.listen(Session, 'after_commit', _apply_rate_changes)
+event.listen(Session, 'after_soft_rollback', _discard_rate_changes)
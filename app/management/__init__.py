@@ -5,14 +5,25 @@ Provides Flask CLI commands for:
 - db-audit: Check for orphaned records, missing FKs, balance inconsistencies
 - db-fix: Apply safe auto-fixes with confirmation prompts
 - db-report: Generate integrity report
+- index-report: EXPLAIN the hot dashboard/budget queries and flag full scans
+- rebuild-rollups: Backfill the MonthlyRollup table from raw transactions
+- reclassify-expenses: Recompute the stored transfer / money-lent flags
+- refingerprint-expenses: Recompute the stored duplicate-detection fingerprints
+- rebuild-search-index: Re-index transactions for full-text search (SQLite)
+- refresh-rates: Fetch exchange rates for every tracked base currency
+
+and the top-level ``flask worker`` command, which runs queued export jobs.
 """
 
 import click
+from datetime import datetime
 from flask.cli import with_appcontext
+from sqlalchemy import func, select
 from app import db
 from app.models import (
     User, Wallet, Category, Expense, Budget, 
-    Creditor, Debtor, Project, Investment
+    Creditor, Debtor, Project, Investment,
+    DebtPayment, DebtorPayment, ContractPayment, Notification, FinancialSummary
 )
 
 
@@ -214,3 +225,202 @@ def stats():
     click.echo(f"Creditors: {Creditor.query.count()}")
     click.echo(f"Debtors: {Debtor.query.count()}")
     click.echo(f"Investments: {Investment.query.count()}")
+
+
+def _hot_queries(user_id):
+    """The per-user queries behind the dashboard, analytics, budgets and notifications."""
+    since = datetime(datetime.utcnow().year, 1, 1)
+    return [
+        ('Expense totals by type', select(func.sum(Expense.amount)).where(
+            Expense.user_id == user_id,
+            Expense.transaction_type == 'expense',
+            Expense.date >= since,
+        )),
+        ('Non-transfer totals by type', select(func.sum(Expense.amount)).where(
+            Expense.user_id == user_id,
+            Expense.is_transfer == False,
+            Expense.transaction_type == 'expense',
+            Expense.date >= since,
+        )),
+        ('Money lent', select(func.sum(Expense.amount)).where(
+            Expense.user_id == user_id,
+            Expense.is_money_lent == True,
+            Expense.date >= since,
+        )),
+        ('Budget spend by category', select(func.sum(Expense.amount)).where(
+            Expense.user_id == user_id,
+            Expense.category_id == 1,
+            Expense.date >= since,
+        )),
+        ('Recent transactions', select(Expense.id).where(
+            Expense.user_id == user_id,
+        ).order_by(Expense.date.desc()).limit(5)),
+        ('Debt payments by month', select(func.sum(DebtPayment.amount)).where(
+            DebtPayment.user_id == user_id,
+            DebtPayment.date >= since,
+        )),
+        ('Debtor payments by month', select(func.sum(DebtorPayment.amount)).where(
+            DebtorPayment.user_id == user_id,
+            DebtorPayment.date >= since,
+        )),
+        ('Contract payments by month', select(func.sum(ContractPayment.amount)).where(
+            ContractPayment.user_id == user_id,
+            ContractPayment.payment_date >= since,
+        )),
+        ('Unread notifications', select(func.count(Notification.id)).where(
+            Notification.user_id == user_id,
+            Notification.is_read == False,
+        )),
+        ('Financial summary lookup', select(FinancialSummary.id).where(
+            FinancialSummary.user_id == user_id,
+            FinancialSummary.year == since.year,
+            FinancialSummary.month == 1,
+        )),
+    ]
+
+
+def _explain(statement):
+    """Run EXPLAIN for the configured dialect. Returns (plan_lines, full_scan)."""
+    dialect = db.engine.dialect
+    compiled = statement.compile(dialect=dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    conn = db.session.connection()
+
+    if dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).fetchall()
+        lines = [row[-1] for row in rows]
+        # "SCAN expense" is a full scan; "SCAN expense USING INDEX ..." is an index walk.
+        full_scan = any(line.startswith('SCAN ') and 'INDEX' not in line for line in lines)
+    elif dialect.name == 'postgresql':
+        rows = conn.exec_driver_sql(f'EXPLAIN {compiled}', params).fetchall()
+        lines = [row[0] for row in rows]
+        full_scan = any('Seq Scan' in line for line in lines)
+    elif dialect.name in ('mysql', 'mariadb'):
+        result = conn.exec_driver_sql(f'EXPLAIN {compiled}', params)
+        rows = [dict(zip(result.keys(), row)) for row in result.fetchall()]
+        lines = [f"{row.get('table')}: type={row.get('type')} key={row.get('key')}" for row in rows]
+        full_scan = any(str(row.get('type')).upper() == 'ALL' for row in rows)
+    else:
+        return [f'EXPLAIN not supported for dialect {dialect.name}'], False
+
+    return lines, full_scan
+
+
+@db_commands.command(name='index-report')
+@click.option('--user-id', type=int, default=None, help='User to plan the queries for (defaults to the first user).')
+@with_appcontext
+def index_report(user_id):
+    """EXPLAIN the hot queries and flag any that still scan a whole table."""
+    if user_id is None:
+        first_user = User.query.order_by(User.id).first()
+        user_id = first_user.id if first_user else 1
+
+    click.echo("=" * 50)
+    click.echo(f"INDEX REPORT ({db.engine.dialect.name})")
+    click.echo("=" * 50)
+
+    flagged = 0
+    for label, statement in _hot_queries(user_id):
+        lines, full_scan = _explain(statement)
+        if full_scan:
+            flagged += 1
+            click.echo(f"\n  ⚠ {label}: FULL TABLE SCAN")
+        else:
+            click.echo(f"\n  ✓ {label}")
+        for line in lines:
+            click.echo(f"      {line}")
+
+    click.echo("\n" + "=" * 50)
+    if flagged:
+        click.echo(f"⚠ {flagged} queries still scan the whole table")
+    else:
+        click.echo("✓ All hot queries use an index")
+    click.echo("=" * 50)
+
+
+@db_commands.command(name='rebuild-rollups')
+@click.option('--user-id', type=int, default=None, help='Only rebuild rollups for this user.')
+@with_appcontext
+def rebuild_rollups_command(user_id):
+    """Recompute the MonthlyRollup table from Expense and payment rows."""
+    from app.rollups import rebuild_rollups
+
+    target = f"user {user_id}" if user_id else "all users"
+    click.echo(f"Rebuilding monthly rollups for {target}...")
+    written = rebuild_rollups(user_id)
+    db.session.commit()
+    click.echo(f"✓ Wrote {written} rollup rows")
+
+
+@db_commands.command(name='reclassify-expenses')
+@click.option('--user-id', type=int, default=None, help='Only reclassify this user\'s expenses.')
+@with_appcontext
+def reclassify_expenses_command(user_id):
+    """Recompute Expense.is_transfer / is_money_lent from type, tags, description and category."""
+    from app.classification import reclassify_expenses
+
+    target = f"user {user_id}" if user_id else "all users"
+    click.echo(f"Reclassifying expenses for {target}...")
+    updated = reclassify_expenses(user_id)
+    db.session.commit()
+    click.echo(f"✓ Reclassified {updated} expenses")
+
+
+@db_commands.command(name='refingerprint-expenses')
+@click.option('--user-id', type=int, default=None, help='Only refingerprint this user\'s expenses.')
+@with_appcontext
+def refingerprint_expenses_command(user_id):
+    """Recompute Expense.fingerprint from date, amount and description."""
+    from app.fingerprints import refingerprint_expenses
+
+    target = f"user {user_id}" if user_id else "all users"
+    click.echo(f"Refingerprinting expenses for {target}...")
+    updated = refingerprint_expenses(user_id)
+    db.session.commit()
+    click.echo(f"✓ Refingerprinted {updated} expenses")
+
+
+@db_commands.command(name='rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Re-populate the transaction full-text index from the expense table."""
+    from app.search import rebuild_search_index
+
+    if rebuild_search_index():
+        db.session.commit()
+        click.echo("✓ Rebuilt the transaction search index")
+    else:
+        click.echo(f"Nothing to rebuild: {db.engine.dialect.name} maintains its full-text index itself")
+
+
+@db_commands.command(name='refresh-rates')
+@click.option('--base', 'bases', multiple=True, help='Base currency to refresh (repeatable); defaults to all tracked')
+@with_appcontext
+def refresh_rates(bases):
+    """Fetch every pair for each base currency in one provider call."""
+    from app.fx import rate_cache
+
+    cache = rate_cache()
+    if cache.provider is None:
+        click.echo("Exchange rate fetching is disabled (FX_PROVIDER=none)")
+        return
+    cache.load()
+    for base, updated in cache.refresh_all([b.upper() for b in bases] or None).items():
+        click.echo(f"✓ {base}: {updated} rates" if updated else f"✗ {base}: fetch failed")
+
+
+@click.command(name='worker')
+@click.option('--poll', 'poll_interval', type=float, default=2.0, show_default=True,
+              help='Seconds to wait between checks when no jobs are pending.')
+@click.option('--once', is_flag=True, help='Exit once no pending jobs are left.')
+@with_appcontext
+def worker(poll_interval, once):
+    """Run queued export jobs (use with EXPORT_WORKER=external)."""
+    from app.export_jobs import work
+
+    click.echo("Export worker started" + (" (until the queue is empty)" if once else ""))
+    work(poll_interval=poll_interval, once=once)
+    click.echo("✓ No pending export jobs")
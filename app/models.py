@@ -1,5 +1,8 @@
 from . import db
 from datetime import datetime
+import hashlib
+import hmac
+import secrets
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -26,6 +29,8 @@ class User(UserMixin, db.Model):
         'payment_due': True,
         'recurring_processed': True,
     })
+    # Bumped whenever the user's dashboard inputs change (see app.dashboard); drives cache validation and ETags
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -99,11 +104,77 @@ class Expense(db.Model):
     original_amount = db.Column(db.Float, nullable=True)
     original_currency = db.Column(db.String(10), nullable=True)
     project_type = db.Column(db.String(50), nullable=True)
+    # Maintained on write by app.classification
+    is_transfer = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    is_money_lent = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Duplicate-detection key (day, amount, description), maintained on write by app.fingerprints
+    fingerprint = db.Column(db.String(64), nullable=True)
 
     user = db.relationship('User', backref=db.backref('_user_expenses', cascade='all, delete-orphan'), lazy=True)
+    # Normalized copy of ``tags``, kept in sync on write by app.tags
+    tag_items = db.relationship('Tag', secondary='expense_tag', lazy='select',
+                                backref=db.backref('expenses', lazy='dynamic'))
+
+    __table_args__ = (
+        db.Index('ix_expense_user_type_date', 'user_id', 'transaction_type', 'date'),
+        db.Index('ix_expense_user_category_date', 'user_id', 'category_id', 'date'),
+        db.Index('ix_expense_user_date', 'user_id', 'date'),
+        db.Index('ix_expense_user_transfer_type_date', 'user_id', 'is_transfer', 'transaction_type', 'date'),
+        db.Index('ix_expense_user_lent_date', 'user_id', 'is_money_lent', 'date'),
+        db.Index('ix_expense_user_fingerprint', 'user_id', 'fingerprint'),
+    )
 
     def __repr__(self):
         return f'<Expense {self.amount} - {self.description}>'
+
+
+expense_tag = db.Table(
+    'expense_tag',
+    db.Column('expense_id', db.Integer, db.ForeignKey('expense.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_expense_tag_tag_id', 'tag_id', 'expense_id'),
+)
+
+
+class Tag(db.Model):
+    """One lower-cased tag per user; Expense.tags stays the display string."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+
+    user = db.relationship('User', backref=db.backref('_user_tags', cascade='all, delete-orphan'), lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_tag_user_name', 'user_id', 'name', unique=True),
+    )
+
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
+
+class MonthlyRollup(db.Model):
+    """Per-user monthly totals, kept in step with Expense and payment writes by app.rollups."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    category_id = db.Column(db.Integer, nullable=False)  # 0 for debt/debtor/contract payments
+    transaction_type = db.Column(db.String(20), nullable=False)  # Expense types, or debt_payment, debtor_payment, contract_payment
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    transfer_total = db.Column(db.Float, nullable=False, default=0.0)  # Part of total tagged/described as a transfer
+    lent_total = db.Column(db.Float, nullable=False, default=0.0)  # Part of total tagged debt_lent and not a transfer
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    user = db.relationship('User', backref=db.backref('_user_monthlyrollups', cascade='all, delete-orphan'), lazy=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year', 'month', 'category_id', 'transaction_type', name='uq_monthly_rollup_key'),
+        db.Index('ix_monthly_rollup_user_period', 'user_id', 'year', 'month'),
+    )
+
+    def __repr__(self):
+        return f'<MonthlyRollup {self.year}-{self.month} {self.transaction_type}: {self.total}>'
+
 class Budget(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -154,6 +225,11 @@ class ExchangeRate(db.Model):
     rate = db.Column(db.Float, nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Rows accumulate as a dated history; lookups read one pair's series in date order
+    __table_args__ = (
+        db.Index('ix_exchange_rate_pair_date', 'from_currency', 'to_currency', 'date'),
+    )
+
     def __repr__(self):
         return f'<ExchangeRate {self.from_currency}/{self.to_currency} = {self.rate}>'
 
@@ -244,6 +320,10 @@ class FinancialSummary(db.Model):
 
     user = db.relationship('User', backref=db.backref('_user_financialsummaries', cascade='all, delete-orphan'), lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_financial_summary_user_year_month', 'user_id', 'year', 'month'),
+    )
+
     def __repr__(self):
         period = f"{self.year}-{self.month}" if self.month else str(self.year)
         return f'<FinancialSummary {period}: +{self.total_income} / -{self.total_expense}>'
@@ -678,7 +758,7 @@ class ImportHistory(db.Model):
     filename = db.Column(db.String(200), nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
     records_imported = db.Column(db.Integer, default=0)
-    status = db.Column(db.String(20), default='completed')  # completed, failed, partial
+    status = db.Column(db.String(20), default='completed')  # importing, completed, failed, partial
     notes = db.Column(db.Text, nullable=True)
 
     user = db.relationship('User', backref=db.backref('_user_importhistories', cascade='all, delete-orphan'), lazy=True)
@@ -752,6 +832,10 @@ class DebtPayment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     creditor = db.relationship('Creditor', backref=db.backref('payments', cascade='all, delete-orphan'), lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_debt_payment_user_date', 'user_id', 'date'),
+    )
+
     def __repr__(self):
         return f'<DebtPayment {self.amount}>'
 
@@ -766,6 +850,10 @@ class DebtorPayment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     debtor = db.relationship('Debtor', backref=db.backref('payments', cascade='all, delete-orphan'), lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_debtor_payment_user_date', 'user_id', 'date'),
+    )
+
     def __repr__(self):
         return f'<DebtorPayment {self.amount}>'
 
@@ -782,6 +870,11 @@ class Notification(db.Model):
 
     user = db.relationship('User', backref=db.backref('_user_notifications', cascade='all, delete-orphan'), lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_notification_user_read_created', 'user_id', 'is_read', 'created_at'),
+        db.Index('ix_notification_user_created', 'user_id', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<Notification {self.title}>'
 
@@ -830,17 +923,61 @@ class AuditLog(db.Model):
 
 # ===== PHASE 10.3: API Keys =====
 class ApiKey(db.Model):
+    """Keys look like ``ft_<key_prefix>_<secret>``; only the SHA-256 digest is stored.
+
+    The public key_prefix finds the row with one indexed lookup, then a single
+    constant-time digest comparison verifies it. Keys are 256-bit random, so a
+    slow password hash buys nothing. Legacy keys (PBKDF2 hash, no prefix) are
+    rehashed on first use; their prefix is derived from the key's digest.
+    """
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
+    key_prefix = db.Column(db.String(16), nullable=True, unique=True, index=True)
     key_hash = db.Column(db.String(256), nullable=False)
     permissions = db.Column(db.String(500), default='read')  # Comma-separated: read, write_transactions, write_budgets, write_goals
+    rate_limit = db.Column(db.Integer, nullable=True)  # Requests per minute; NULL uses API_RATE_LIMIT
     is_active = db.Column(db.Boolean, default=True)
     last_used = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship('User', backref=db.backref('_user_apikeies', cascade='all, delete-orphan'), lazy=True)
 
+    DIGEST_PREFIX = 'sha256$'
+
+    @staticmethod
+    def generate_key():
+        return f'ft_{secrets.token_hex(6)}_{secrets.token_urlsafe(32)}'
+
+    @classmethod
+    def digest(cls, raw_key):
+        return cls.DIGEST_PREFIX + hashlib.sha256(raw_key.encode()).hexdigest()
+
+    @staticmethod
+    def is_prefixed(raw_key):
+        """Whether ``raw_key`` has the ``ft_<key_prefix>_<secret>`` form (legacy keys never do)."""
+        parts = raw_key.split('_', 2)
+        return len(parts) == 3 and parts[0] == 'ft' and bool(parts[1])
+
+    @classmethod
+    def prefix_of(cls, raw_key):
+        if cls.is_prefixed(raw_key):
+            return raw_key.split('_', 2)[1][:16]
+        return hashlib.sha256(raw_key.encode()).hexdigest()[:16]
+
+    @property
+    def is_legacy(self):
+        return not self.key_hash.startswith(self.DIGEST_PREFIX)
+
+    def set_key(self, raw_key):
+        self.key_prefix = self.prefix_of(raw_key)
+        self.key_hash = self.digest(raw_key)
+
+    def check_key(self, raw_key):
+        if self.is_legacy:
+            return check_password_hash(self.key_hash, raw_key)
+        return hmac.compare_digest(self.key_hash, self.digest(raw_key))
+
     def __repr__(self):
         return f'<ApiKey {self.name}>'
 
@@ -877,6 +1014,10 @@ class ContractPayment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     contract = db.relationship('SMCContract', backref=db.backref('payments', cascade='all, delete-orphan'), lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_contract_payment_user_date', 'user_id', 'payment_date'),
+    )
+
     def __repr__(self):
         return f'<ContractPayment {self.amount}>'
 
@@ -980,3 +1121,41 @@ class BackupHistory(db.Model):
 
     def __repr__(self):
         return f'<BackupHistory {self.file_name}: {self.backup_type}>'
+
+
+class ExportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)  # transactions_pdf, transactions_excel, tax_pdf, newsletter_pdf
+    params = db.Column(db.Text, nullable=True)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed, expired
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    file_path = db.Column(db.String(300), nullable=True)  # relative to EXPORT_STORAGE_DIR
+    file_name = db.Column(db.String(200), nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)  # Heartbeat: set on claim and by every progress write
+    finished_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User', backref=db.backref('_user_exportjobs', cascade='all, delete-orphan'), lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_export_job_status_created', 'status', 'created_at'),
+        db.Index('ix_export_job_user_created', 'user_id', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<ExportJob {self.id}: {self.kind} {self.status}>'
+
+
+class SharedVersion(db.Model):
+    """A version counter for data every user sees (e.g. exchange rates), bumped on each change."""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<SharedVersion {self.name}: {self.version}>'
@@ -0,0 +1,112 @@
+"""
+Keyset (cursor) pagination.
+
+``OFFSET n`` makes the database walk and discard ``n`` rows, so deep pages get
+slower the further a user scrolls. A keyset page instead continues strictly
+after the last row already shown, ``WHERE (date, id) < (:last_date, :last_id)``,
+which the (user_id, date) indexes answer directly at any depth.
+
+Cursors are opaque URL-safe strings holding the sort-key values of the last
+row of the previous page. Every sort must end in a unique column (the primary
+key) so rows that share a date are neither skipped nor repeated.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if value is not None and not isinstance(value, (str, int, float, bool)):
+        return float(value)
+    return value
+
+
+def _decode_value(value, column):
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, columns=None):
+    """Return the key values stored in ``token``, or None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list):
+            return None
+        if columns is None:
+            return values
+        if len(values) != len(columns):
+            return None
+        return [_decode_value(v, c) for v, c in zip(values, columns)]
+    except (ValueError, TypeError):
+        return None
+
+
+def _after(columns, values, descending):
+    """``(c1, c2, ...) > (v1, v2, ...)`` (or ``<``), expanded for every dialect."""
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        step = column < value if descending else column > value
+        clauses.append(and_(*[c == v for c, v in zip(columns[:i], values[:i])], step))
+    return or_(*clauses)
+
+
+def keyset_page(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True, key=None):
+    """Fetch one page of ``query`` ordered by ``columns`` (last one unique).
+
+    ``key(item)`` returns an item's values for ``columns``; by default each
+    column's attribute name is read from the item. Returns ``(items, next_cursor)``
+    where ``next_cursor`` is None on the last page.
+    """
+    if key is None:
+        names = [column.key for column in columns]
+
+        def key(item):
+            return [getattr(item, name) for name in names]
+
+    values = decode_cursor(cursor, columns)
+    if values is not None:
+        query = query.filter(_after(columns, values, descending))
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+
+    items = query.limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(key(items[-1]))
+
+
+def offset_page(query, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Cursor-shaped OFFSET paging for orderings with no stable key, e.g. search rank.
+
+    Only meant for result sets that are already narrow; returns ``(items, next_cursor)``.
+    """
+    values = decode_cursor(cursor)
+    offset = values[0] if values and isinstance(values[0], int) and values[0] > 0 else 0
+    items = query.offset(offset).limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+    return items[:limit], encode_cursor([offset + limit])
@@ -13,7 +13,8 @@ from flask import session
 from sqlalchemy import func
 
 from . import db
-from .models import Budget, Creditor, Expense, Goal, Notification
+from .budgets import BudgetProgress
+from .models import Creditor, Expense, Goal, Notification
 
 logger = logging.getLogger(__name__)
 
@@ -76,29 +77,8 @@ def check_budget_alerts(user_id, category_id, transaction_amount):
     if not _user_wants_push('budget_alerts', user_id):
         return
 
-    budgets = Budget.query.filter_by(
-        user_id=user_id, category_id=category_id, is_active=True
-    ).all()
-
-    now = datetime.utcnow()
-    for budget in budgets:
-        # Determine period start
-        if budget.period == 'weekly':
-            start = now - timedelta(days=now.weekday())
-        elif budget.period == 'monthly':
-            start = datetime(now.year, now.month, 1)
-        elif budget.period == 'yearly':
-            start = datetime(now.year, 1, 1)
-        else:
-            start = budget.start_date or datetime(now.year, now.month, 1)
-
-        spent = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.user_id == user_id,
-            Expense.category_id == category_id,
-            Expense.transaction_type == 'expense',
-            Expense.date >= start,
-        ).scalar() or 0
-
+    for item in BudgetProgress.for_user(user_id).for_category(category_id):
+        budget, spent = item.budget, item.spent
         pct = (spent / budget.amount * 100) if budget.amount > 0 else 0
         cat_name = budget.category.name if budget.category else 'Unknown'
 
@@ -0,0 +1,166 @@
+"""
+Line-level statement reconciliation.
+
+``match_statement`` lines a parsed bank statement up against a wallet's
+transactions, so users no longer reconcile by eye. Both sides are sorted by
+(amount in cents, date) and merged: each statement line looks up, by binary
+search, the transactions within AMOUNT_TOLERANCE of its amount and
+DATE_TOLERANCE_DAYS of its date. Candidate pairs are ranked by days apart,
+then by description similarity (shared words), and assigned best first, so
+the whole match is O(n log n) in the statement and wallet sizes.
+
+Every statement line ends up in one bucket:
+
+- ``matched``   - paired with exactly one transaction;
+- ``ambiguous`` - two or more transactions fit equally well and differ;
+- ``unmatched`` - nothing in the wallet fits.
+
+Wallet transactions inside the statement's dates that no line claimed are
+reported too, as ``missing`` from the statement.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from . import db
+from .categorizer import normalize
+from .models import Expense
+
+AMOUNT_TOLERANCE = 0.01
+DATE_TOLERANCE_DAYS = 3
+# Types that add to a wallet; everything else is money out
+INFLOW_TYPES = ('income', 'liability', 'debt_recovery', 'transfer_in')
+
+
+class StatementLine:
+    """One parsed statement row; ``amount`` is signed (negative is money out)."""
+
+    def __init__(self, index, date, amount, description):
+        self.index = index
+        self.date = date
+        self.amount = amount
+        self.description = description
+        self.cents = int(round(amount * 100))
+        self.day = date.toordinal()
+        self.words = frozenset(normalize(description).split())
+
+
+class LedgerEntry:
+    """The parts of a wallet transaction the matcher compares."""
+
+    def __init__(self, expense_id, date, amount, transaction_type, description):
+        self.id = expense_id
+        self.date = date
+        self.amount = amount if transaction_type in INFLOW_TYPES else -amount
+        self.description = description
+        self.cents = int(round(self.amount * 100))
+        self.day = date.toordinal()
+        self.words = frozenset(normalize(description).split())
+
+
+class Reconciliation:
+    """The outcome of ``match_statement``."""
+
+    def __init__(self):
+        self.matched = []    # (StatementLine, LedgerEntry)
+        self.ambiguous = []  # (StatementLine, [LedgerEntry, ...])
+        self.unmatched = []  # StatementLine
+        self.missing = []    # LedgerEntry
+
+    @property
+    def balanced(self):
+        return not (self.ambiguous or self.unmatched or self.missing)
+
+    def summary(self):
+        return (f'Lines: {len(self.matched)} matched, {len(self.ambiguous)} ambiguous, '
+                f'{len(self.unmatched)} unmatched; {len(self.missing)} wallet transactions not on the statement')
+
+
+def _similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _same(a, b):
+    """Whether two rows are indistinguishable to the matcher, so either will do."""
+    return a.cents == b.cents and a.day == b.day and a.words == b.words
+
+
+def match_lines(lines, entries, amount_tolerance=AMOUNT_TOLERANCE, date_tolerance_days=DATE_TOLERANCE_DAYS):
+    """Match StatementLines against LedgerEntries. Returns a Reconciliation (``missing`` unfiltered)."""
+    result = Reconciliation()
+    tolerance = int(round(amount_tolerance * 100))
+    entries = sorted(entries, key=lambda e: (e.cents, e.day, e.id))
+    keys = [(e.cents, e.day) for e in entries]
+
+    # Candidate pairs inside both windows, ranked by (days apart, -similarity).
+    # Each cent value in the amount window is its own date-sorted run.
+    pairs = []
+    candidates = {}
+    for line in lines:
+        options = []
+        for cents in range(line.cents - tolerance, line.cents + tolerance + 1):
+            lo = bisect_left(keys, (cents, line.day - date_tolerance_days))
+            hi = bisect_right(keys, (cents, line.day + date_tolerance_days))
+            for position in range(lo, hi):
+                entry = entries[position]
+                rank = (abs(entry.day - line.day), -_similarity(line.words, entry.words))
+                options.append((rank, position))
+                pairs.append((rank, line.index, position))
+        options.sort()
+        candidates[line.index] = options
+
+    # Best pairs first. A line whose best free candidates tie but differ is
+    # ambiguous; ties between identical rows (a repeated purchase) are not.
+    by_index = {line.index: line for line in lines}
+    done = set()
+    taken = set()
+    pairs.sort()
+    for rank, index, position in pairs:
+        if index in done or position in taken:
+            continue
+        done.add(index)
+        chosen = entries[position]
+        tied = [entries[other] for other_rank, other in candidates[index]
+                if other_rank == rank and other != position and other not in taken]
+        if any(not _same(entry, chosen) for entry in tied):
+            result.ambiguous.append((by_index[index], [chosen] + tied))
+        else:
+            result.matched.append((by_index[index], chosen))
+            taken.add(position)
+
+    result.matched.sort(key=lambda pair: pair[0].index)
+    result.ambiguous.sort(key=lambda pair: pair[0].index)
+    result.unmatched = [line for line in lines if line.index not in done]
+    result.missing = [entry for position, entry in enumerate(entries) if position not in taken]
+    return result
+
+
+def match_statement(user_id, wallet_id, transactions, amount_tolerance=AMOUNT_TOLERANCE,
+                    date_tolerance_days=DATE_TOLERANCE_DAYS):
+    """Reconcile parsed statement ``transactions`` (as from ``iter_csv``) against a wallet."""
+    lines = [StatementLine(i, t['date'], t['amount'], t['description']) for i, t in enumerate(transactions)]
+    if not lines:
+        return Reconciliation()
+    first = min(line.date for line in lines)
+    last = max(line.date for line in lines)
+    window_start = datetime(first.year, first.month, first.day) - timedelta(days=date_tolerance_days)
+    window_end = datetime(last.year, last.month, last.day) + timedelta(days=date_tolerance_days + 1)
+
+    rows = db.session.execute(
+        select(Expense.id, Expense.date, Expense.amount, Expense.transaction_type, Expense.description)
+        .where(Expense.user_id == user_id, Expense.wallet_id == wallet_id,
+               Expense.date >= window_start, Expense.date < window_end)
+    )
+    entries = [LedgerEntry(*row) for row in rows]
+    result = match_lines(lines, entries, amount_tolerance, date_tolerance_days)
+
+    # Only the statement's own dates can be missing from it
+    period_start = datetime(first.year, first.month, first.day)
+    period_end = datetime(last.year, last.month, last.day) + timedelta(days=1)
+    result.missing = sorted((e for e in result.missing if period_start <= e.date < period_end),
+                            key=lambda e: (e.date, e.id))
+    return result
@@ -0,0 +1,292 @@
+"""
+Incrementally maintained monthly rollups.
+
+MonthlyRollup keeps one row per (user, year, month, category, transaction_type)
+for Expense rows, and one row per (user, year, month) for each kind of
+debt/debtor/contract payment, keyed under category 0 so the unique key covers
+every bucket. Session flush hooks apply the delta of every
+insert, update and delete, so trend charts read a few indexed rollup rows
+instead of re-aggregating a user's whole history on every page view.
+
+Bulk ``query.delete()``/``update()`` calls bypass these hooks; callers that use
+them must clear or rebuild the affected rollups (see ``rebuild_rollups``).
+Bulk inserts of Expense rows can add their deltas with ``apply_inserted_expenses``.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import (Float, Integer, and_, bindparam, case, delete, event, extract, func, insert, inspect, literal,
+                        or_, select, update)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import db
+from .classification import is_lent_tagged, is_transfer_marked
+from .models import ContractPayment, DebtPayment, DebtorPayment, Expense, MonthlyRollup
+
+PAYMENT_SOURCES = {
+    DebtPayment: ('debt_payment', 'date'),
+    DebtorPayment: ('debtor_payment', 'date'),
+    ContractPayment: ('contract_payment', 'payment_date'),
+}
+PAYMENT_CATEGORY = 0
+EXPENSE_FIELDS = ('user_id', 'amount', 'date', 'category_id', 'transaction_type', 'tags', 'description')
+_PENDING_KEY = 'monthly_rollup_pending'
+
+
+def _tracked_fields(obj):
+    if isinstance(obj, Expense):
+        return EXPENSE_FIELDS
+    _, date_field = PAYMENT_SOURCES[type(obj)]
+    return ('user_id', 'amount', date_field)
+
+
+def _contribution(model, values):
+    """Return (key, (total, transfer_total, lent_total, count)) for one row's values."""
+    if model is Expense:
+        date = values.get('date') or datetime.utcnow()
+        amount = float(values.get('amount') or 0)
+        if values.get('user_id') is None:
+            return None
+        key = (values['user_id'], date.year, date.month, values.get('category_id'),
+               values.get('transaction_type') or 'expense')
+        transfer = amount if is_transfer_marked(values.get('tags'), values.get('description')) else 0.0
+        lent = amount if is_lent_tagged(values.get('tags')) and not transfer else 0.0
+        return key, (amount, transfer, lent, 1)
+
+    source, date_field = PAYMENT_SOURCES[model]
+    date = values.get(date_field)
+    if values.get('user_id') is None or date is None:
+        return None
+    amount = float(values.get('amount') or 0)
+    return (values['user_id'], date.year, date.month, PAYMENT_CATEGORY, source), (amount, 0.0, 0.0, 1)
+
+
+def _accumulate(pending, contribution, sign):
+    if contribution is None:
+        return
+    key, values = contribution
+    current = pending.get(key, (0.0, 0.0, 0.0, 0))
+    pending[key] = tuple(c + sign * v for c, v in zip(current, values))
+
+
+def _is_rollup_source(obj):
+    return isinstance(obj, Expense) or type(obj) in PAYMENT_SOURCES
+
+
+def _has_tracked_changes(obj):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in _tracked_fields(obj))
+
+
+def _stored_values(session, model, ids):
+    """Load the committed column values for ``ids`` straight from the database."""
+    fields = EXPENSE_FIELDS if model is Expense else ('user_id', 'amount', PAYMENT_SOURCES[model][1])
+    columns = [model.__table__.c[name] for name in fields]
+    rows = session.connection().execute(
+        select(model.__table__.c.id, *columns).where(model.__table__.c.id.in_(ids))
+    ).all()
+    return [dict(zip(fields, row[1:])) for row in rows]
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_removed_contributions(session, flush_context, instances):
+    """Subtract the stored values of rows about to be updated or deleted."""
+    pending = {}
+    ids_by_model = {}
+    deleted = session.deleted
+    for obj in list(session.dirty) + list(deleted):
+        if not _is_rollup_source(obj) or obj.id is None:
+            continue
+        if obj not in deleted and not _has_tracked_changes(obj):
+            continue
+        ids_by_model.setdefault(type(obj), set()).add(obj.id)
+
+    for model, ids in ids_by_model.items():
+        for values in _stored_values(session, model, ids):
+            _accumulate(pending, _contribution(model, values), -1)
+
+    session.info[_PENDING_KEY] = pending
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_rollup_deltas(session, flush_context):
+    """Add the new values of inserted/updated rows and write the net deltas."""
+    pending = session.info.pop(_PENDING_KEY, {})
+    new, deleted = session.new, session.deleted
+    for obj in list(new) + list(session.dirty):
+        if not _is_rollup_source(obj) or obj in deleted:
+            continue
+        if obj not in new and not _has_tracked_changes(obj):
+            continue
+        values = {name: getattr(obj, name) for name in _tracked_fields(obj)}
+        _accumulate(pending, _contribution(type(obj), values), 1)
+
+    if pending:
+        apply_deltas(session.connection(), pending)
+
+
+_DELTA_STATEMENTS = []
+
+
+def _delta_statements():
+    """(update, delete-if-empty) for one rollup key, built once and run with bound parameters."""
+    if not _DELTA_STATEMENTS:
+        table = MonthlyRollup.__table__
+        where = and_(
+            table.c.user_id == bindparam('key_user_id'),
+            table.c.year == bindparam('key_year'),
+            table.c.month == bindparam('key_month'),
+            table.c.category_id == bindparam('key_category_id'),
+            table.c.transaction_type == bindparam('key_transaction_type'),
+        )
+        _DELTA_STATEMENTS.extend((
+            update(table).where(where).values(
+                total=table.c.total + bindparam('add_total', type_=Float),
+                transfer_total=table.c.transfer_total + bindparam('add_transfer_total', type_=Float),
+                lent_total=table.c.lent_total + bindparam('add_lent_total', type_=Float),
+                count=table.c.count + bindparam('add_count', type_=Integer),
+            ),
+            delete(table).where(where, table.c.count <= 0),
+        ))
+    return _DELTA_STATEMENTS
+
+
+def apply_deltas(connection, deltas):
+    """Apply {key: (total, transfer_total, lent_total, count)} deltas to the rollup table."""
+    table = MonthlyRollup.__table__
+    add, clear = _delta_statements()
+    for key, (total, transfer_total, lent_total, count) in deltas.items():
+        if not count and not total and not transfer_total and not lent_total:
+            continue
+        user_id, year, month, category_id, transaction_type = key
+        params = {'key_user_id': user_id, 'key_year': year, 'key_month': month,
+                  'key_category_id': category_id, 'key_transaction_type': transaction_type}
+        increment = {**params, 'add_total': total, 'add_transfer_total': transfer_total,
+                     'add_lent_total': lent_total, 'add_count': count}
+        if connection.execute(add, increment).rowcount == 0:
+            # Only brand-new rows create a bucket; a negative delta against a
+            # missing bucket means the rollups were never backfilled.
+            if count <= 0:
+                continue
+            try:
+                # A concurrent transaction may create the same bucket first; the
+                # savepoint keeps our transaction usable so the delta can be
+                # added to its row instead.
+                with connection.begin_nested():
+                    connection.execute(insert(table), {
+                        'user_id': user_id, 'year': year, 'month': month, 'category_id': category_id,
+                        'transaction_type': transaction_type, 'total': total,
+                        'transfer_total': transfer_total, 'lent_total': lent_total, 'count': count,
+                    })
+            except IntegrityError:
+                connection.execute(add, increment)
+        elif count < 0:
+            connection.execute(clear, params)
+
+
+def apply_inserted_expenses(connection, rows):
+    """Add the rollup deltas for Expense rows (column value dicts) inserted outside the unit of work."""
+    pending = {}
+    for values in rows:
+        _accumulate(pending, _contribution(Expense, values), 1)
+    apply_deltas(connection, pending)
+
+
+def rebuild_rollups(user_id=None):
+    """Recompute rollups from the raw tables, for one user or for everyone.
+
+    Returns the number of rollup rows written. The caller commits.
+    """
+    table = MonthlyRollup.__table__
+    connection = db.session.connection()
+    clear = delete(table)
+    if user_id is not None:
+        clear = clear.where(table.c.user_id == user_id)
+    connection.execute(clear)
+
+    transfer_marked = or_(
+        func.coalesce(Expense.tags, '').ilike('%transfer%'),
+        func.coalesce(Expense.description, '').ilike('Transfer %'),
+    )
+    lent_tagged = func.coalesce(Expense.tags, '').ilike('%debt_lent%')
+    year = extract('year', Expense.date)
+    month = extract('month', Expense.date)
+    expense_query = select(
+        Expense.user_id, year, month, Expense.category_id,
+        func.coalesce(Expense.transaction_type, 'expense'),
+        func.sum(Expense.amount),
+        func.sum(case((transfer_marked, Expense.amount), else_=0)),
+        func.sum(case((and_(lent_tagged, ~transfer_marked), Expense.amount), else_=0)),
+        func.count(Expense.id),
+    ).group_by(
+        Expense.user_id, year, month, Expense.category_id,
+        func.coalesce(Expense.transaction_type, 'expense'),
+    )
+    if user_id is not None:
+        expense_query = expense_query.where(Expense.user_id == user_id)
+    queries = [expense_query]
+
+    for model, (source, date_field) in PAYMENT_SOURCES.items():
+        date_column = getattr(model, date_field)
+        p_year = extract('year', date_column)
+        p_month = extract('month', date_column)
+        query = select(
+            model.user_id, p_year, p_month, literal(PAYMENT_CATEGORY), literal(source),
+            func.sum(model.amount), literal(0.0), literal(0.0), func.count(model.id),
+        ).group_by(model.user_id, p_year, p_month)
+        if user_id is not None:
+            query = query.where(model.user_id == user_id)
+        queries.append(query)
+
+    rows = []
+    for query in queries:
+        for uid, y, m, category_id, transaction_type, total, transfer_total, lent_total, count in connection.execute(query):
+            rows.append({
+                'user_id': uid, 'year': int(y), 'month': int(m), 'category_id': category_id,
+                'transaction_type': transaction_type, 'total': float(total or 0),
+                'transfer_total': float(transfer_total or 0), 'lent_total': float(lent_total or 0),
+                'count': int(count),
+            })
+    if rows:
+        connection.execute(insert(table), rows)
+    return len(rows)
+
+
+def rollup_month_totals(user_id, months, transfer_category_id=None, lent_category_id=None):
+    """Return {(year, month): totals} for ``months`` from a single rollup query.
+
+    Totals mirror the dashboard's live filters: income and expense exclude
+    transfers (by type, tags, description or the Transfer category), ``lent``
+    counts the Money Lent category plus debt_lent tags, less transfers, and
+    the three payment sources are reported as-is.
+    """
+    empty = {'income': 0.0, 'expense': 0.0, 'lent': 0.0,
+             'debt_payment': 0.0, 'debtor_payment': 0.0, 'contract_payment': 0.0}
+    result = {(y, m): dict(empty) for y, m in months}
+    if not months:
+        return result
+
+    years = [y for y, _ in months]
+    period = MonthlyRollup.year * 100 + MonthlyRollup.month
+    rows = db.session.query(
+        MonthlyRollup.year, MonthlyRollup.month, MonthlyRollup.category_id,
+        MonthlyRollup.transaction_type, MonthlyRollup.total,
+        MonthlyRollup.transfer_total, MonthlyRollup.lent_total,
+    ).filter(
+        MonthlyRollup.user_id == user_id,
+        MonthlyRollup.year >= min(years),
+        MonthlyRollup.year <= max(years),
+        period.in_([y * 100 + m for y, m in months]),
+    ).all()
+
+    for year, month, category_id, transaction_type, total, transfer_total, lent_total in rows:
+        totals = result[(year, month)]
+        if transaction_type in ('income', 'expense'):
+            if transfer_category_id is None or category_id != transfer_category_id:
+                totals[transaction_type] += total - transfer_total
+            if transaction_type == 'expense' and category_id != transfer_category_id:
+                totals['lent'] += total - transfer_total if category_id == lent_category_id else lent_total
+        elif transaction_type in empty:
+            totals[transaction_type] += total
+    return result
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from . import db
 from .models import User, Expense, Wallet, Goal, Investment, Budget
@@ -31,6 +31,15 @@ def admin_panel():
                            total_transactions=total_transactions, total_wallets=total_wallets)
 
 
+@admin_bp.route('/admin/dashboard-cache')
+@login_required
+@admin_required
+def dashboard_cache_stats():
+    """Hit/miss counters of this worker's dashboard cache."""
+    from .dashboard import dashboard_cache
+    return jsonify(dashboard_cache().stats())
+
+
 @admin_bp.route('/admin/users/<int:id>/role', methods=['POST'])
 @login_required
 @admin_required
@@ -1,7 +1,7 @@
 import io
 from datetime import datetime
 
-from flask import Blueprint, flash, make_response, redirect, render_template, request, session, url_for
+from flask import Blueprint, flash, redirect, render_template, request, session, url_for
 from flask_login import current_user, login_required
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
@@ -287,20 +287,27 @@ def tax_center_add_deduction():
 @advanced_bp.route("/tax-center/export-pdf")
 @login_required
 def tax_center_export_pdf():
-    """Generate and download annual tax summary as PDF."""
+    """Queue the annual tax summary PDF; the job page offers the download."""
+    from .export_jobs import enqueue_export
     selected_year = request.args.get("year", type=int) or datetime.utcnow().year
+    job = enqueue_export(current_user.id, 'tax_pdf', year=selected_year)
+    return redirect(url_for('exports.export_status', job_id=job.id))
+
+
+def build_tax_summary_pdf(user, selected_year):
+    """Annual tax summary PDF for ``user``, run by the ``tax_pdf`` export job."""
     year_start = datetime(selected_year, 1, 1)
     year_end = datetime(selected_year + 1, 1, 1)
 
     total_income = (
         db.session.query(func.sum(Expense.amount))
-        .filter(Expense.user_id == current_user.id, Expense.transaction_type == "income",
+        .filter(Expense.user_id == user.id, Expense.transaction_type == "income",
                 Expense.date >= year_start, Expense.date < year_end)
         .scalar() or 0.0
     )
     total_expenses = (
         db.session.query(func.sum(Expense.amount))
-        .filter(Expense.user_id == current_user.id, Expense.transaction_type == "expense",
+        .filter(Expense.user_id == user.id, Expense.transaction_type == "expense",
                 Expense.date >= year_start, Expense.date < year_end)
         .scalar() or 0.0
     )
@@ -310,7 +317,7 @@ def tax_center_export_pdf():
     deductions = (
         db.session.query(func.sum(Expense.amount))
         .join(Category, Category.id == Expense.category_id)
-        .filter(Expense.user_id == current_user.id, Expense.transaction_type == "expense",
+        .filter(Expense.user_id == user.id, Expense.transaction_type == "expense",
                 Expense.date >= year_start, Expense.date < year_end, or_(*deduction_filters))
         .scalar() or 0.0
     )
@@ -323,7 +330,7 @@ def tax_center_export_pdf():
     deduction_rows = (
         db.session.query(Category.name, func.sum(Expense.amount))
         .join(Expense, Expense.category_id == Category.id)
-        .filter(Expense.user_id == current_user.id, Expense.transaction_type == "expense",
+        .filter(Expense.user_id == user.id, Expense.transaction_type == "expense",
                 Expense.date >= year_start, Expense.date < year_end, or_(*deduction_filters))
         .group_by(Category.name).order_by(func.sum(Expense.amount).desc()).all()
     )
@@ -337,7 +344,7 @@ def tax_center_export_pdf():
     title_style = ParagraphStyle('TaxTitle', parent=styles['Title'], fontSize=20, spaceAfter=6)
     elements.append(Paragraph(f"Annual Tax Summary — {selected_year}", title_style))
     elements.append(Paragraph(
-        f"Prepared for {current_user.name} on {datetime.utcnow().strftime('%d %B %Y')}",
+        f"Prepared for {user.name} on {datetime.utcnow().strftime('%d %B %Y')}",
         styles['Normal']
     ))
     elements.append(Spacer(1, 0.3 * inch))
@@ -426,11 +433,7 @@ def tax_center_export_pdf():
 
     doc.build(elements)
     buffer.seek(0)
-
-    response = make_response(buffer.read())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=tax_summary_{selected_year}.pdf'
-    return response
+    return buffer
 
 
 @advanced_bp.route("/ml-training")
@@ -1,10 +1,11 @@
 from flask import Blueprint, render_template, jsonify
 from flask_login import login_required, current_user
 from . import db
-from .models import Expense, Category, Budget, Creditor, Goal, Wallet
+from .models import Expense, Category, Creditor, Goal, Wallet
 from .utils import to_float
+from .budgets import BudgetProgress
 from datetime import datetime, timedelta
-from sqlalchemy import func, extract, or_
+from sqlalchemy import func, extract
 import statistics
 
 ai_insights_bp = Blueprint('ai_insights', __name__)
@@ -45,12 +46,8 @@ def get_top_recommendations(user_id):
     month_ago = now - timedelta(days=30)
 
     # Check budget overruns and suggest reductions
-    budgets = Budget.query.filter_by(user_id=user_id, is_active=True).all()
-    for budget in budgets:
-        spent = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.user_id == user_id, Expense.category_id == budget.category_id,
-            Expense.transaction_type == 'expense', Expense.date >= budget.start_date
-        ).scalar() or 0
+    for item in BudgetProgress.for_user(user_id):
+        budget, spent = item.budget, item.spent
         if budget.amount > 0 and spent > budget.amount:
             overage_pct = ((spent - budget.amount) / budget.amount) * 100
             recommendations.append({
@@ -229,16 +226,9 @@ def get_financial_health_score(user_id):
     debt_score = max(0, round(25 - (debt_ratio * 0.25)))
 
     # 3. Budget adherence (0-25 points)
-    budgets = Budget.query.filter_by(user_id=user_id, is_active=True).all()
+    budgets = BudgetProgress.for_user(user_id)
     if budgets:
-        within_budget = 0
-        for b in budgets:
-            spent = db.session.query(func.sum(Expense.amount)).filter(
-                Expense.user_id == user_id, Expense.category_id == b.category_id,
-                Expense.transaction_type == 'expense', Expense.date >= b.start_date
-            ).scalar() or 0
-            if spent <= b.amount:
-                within_budget += 1
+        within_budget = sum(1 for item in budgets if item.within)
         adherence = (within_budget / len(budgets)) * 100
         budget_score = round(adherence * 0.25)
     else:
@@ -352,12 +342,8 @@ def get_spending_insights(user_id):
             })
 
     # Budget alerts
-    budgets = Budget.query.filter_by(user_id=user_id, is_active=True).all()
-    for budget in budgets:
-        spent = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.user_id == user_id, Expense.category_id == budget.category_id,
-            Expense.transaction_type == 'expense', Expense.date >= budget.start_date
-        ).scalar() or 0
+    for item in BudgetProgress.for_user(user_id):
+        budget, spent = item.budget, item.spent
         if budget.amount > 0:
             usage = (spent / budget.amount) * 100
             if usage >= 90:
@@ -417,16 +403,8 @@ def ai_insights():
     now = datetime.utcnow()
     month_ago = now - timedelta(days=30)
     
-    # Exclude Transfer category
-    transfer_cat = Category.query.filter_by(name='Transfer', user_id=current_user.id).first()
-    transfer_id = transfer_cat.id if transfer_cat else -1
-    transfer_filter = or_(
-        Expense.transaction_type.in_(['transfer', 'transfer_out', 'transfer_in']),
-        func.coalesce(Expense.tags, '').ilike('%transfer%'),
-        func.coalesce(Expense.description, '').ilike('Transfer %')
-    )
-    if transfer_id != -1:
-        transfer_filter = or_(transfer_filter, Expense.category_id == transfer_id)
+    # Exclude transfers (classified on write)
+    transfer_filter = Expense.is_transfer
 
     monthly_income = db.session.query(func.sum(Expense.amount)).filter(
         Expense.user_id == current_user.id, Expense.transaction_type == 'income',
@@ -441,13 +419,11 @@ def ai_insights():
 
     # Actuals Calculations
     # 1. Money Lent (Expense to exclude)
-    debt_lent_cat = Category.query.filter_by(name='Money Lent', user_id=current_user.id).first()
-    debt_lent_id = debt_lent_cat.id if debt_lent_cat else -1
     m_lent = db.session.query(func.sum(Expense.amount)).filter(
         Expense.user_id == current_user.id,
         Expense.transaction_type == 'expense',
         Expense.date >= month_ago,
-        or_(Expense.category_id == debt_lent_id, Expense.tags.ilike('%debt_lent%'))
+        Expense.is_money_lent
     ).scalar() or 0
 
     # 3. Extra Payments
@@ -1,384 +1,82 @@
-from flask import render_template, request, redirect, url_for, flash, send_file, Response
+from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from . import db
-from .models import Expense, Category, FinancialSummary, ProjectItem, ProjectItemPayment, DebtPayment, DebtorPayment, ContractPayment
-from .utils import get_exchange_rate
+from .models import Expense, Category, FinancialSummary
+from .aggregates import category_totals, last_months, monthly_totals, yearly_totals
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
-from sqlalchemy import func, or_
-from sqlalchemy.orm import joinedload
-import io
-import csv
-
-
-def _normalize_currency(code, fallback='GHS'):
-    fallback_currency = (fallback or 'GHS').upper().strip()[:10] or 'GHS'
-    normalized_currency = (code or fallback_currency).upper().strip()[:10]
-    return normalized_currency or fallback_currency
+from sqlalchemy import func
 
 
 def register_routes(main):
     def _get_transfer_filter():
-        transfer_cat = Category.query.filter_by(name='Transfer', user_id=current_user.id).first()
-        transfer_id = transfer_cat.id if transfer_cat else -1
-        transfer_types = ('transfer', 'transfer_out', 'transfer_in')
-        
-        # Robust Transfer Filter (Handles NULLs)
-        transfer_filter = or_(
-            Expense.transaction_type.in_(transfer_types),
-            func.coalesce(Expense.tags, '').ilike('%transfer%'),
-            func.coalesce(Expense.description, '').ilike('Transfer %')
-        )
-        if transfer_id != -1:
-            transfer_filter = or_(transfer_filter, Expense.category_id == transfer_id)
-        return transfer_filter
-
-    def _build_currency_converter(target_currency='GHS'):
-        normalized_target = _normalize_currency(target_currency)
-        rate_cache = {}
-
-        def convert_amount(amount, from_currency):
-            numeric_amount = float(amount or 0)
-            normalized_source = _normalize_currency(from_currency, fallback=normalized_target)
-            if normalized_source == normalized_target:
-                return numeric_amount
-
-            cache_key = (normalized_source, normalized_target)
-            if cache_key not in rate_cache:
-                rate_cache[cache_key] = get_exchange_rate(normalized_source, normalized_target)
-
-            return numeric_amount * rate_cache[cache_key]
-
-        return convert_amount
-
-    def _expense_amount_in_ghs(expense, convert_to_ghs):
-        wallet_currency = _normalize_currency(expense.wallet.currency if expense.wallet else None, fallback='GHS')
-        original_currency = _normalize_currency(expense.original_currency, fallback=wallet_currency)
-        stored_amount = float(expense.amount or 0)
-        original_amount = float(expense.original_amount) if expense.original_amount is not None else None
-
-        # If the wallet itself is already in GHS, trust the stored amount unless the
-        # record still looks like an unconverted foreign-currency legacy entry.
-        if wallet_currency == 'GHS':
-            if original_amount is not None and original_currency != 'GHS' and abs(stored_amount - original_amount) < 0.01:
-                return convert_to_ghs(original_amount, original_currency)
-            return stored_amount
-
-        # Non-GHS wallets store amounts in the wallet currency, so convert them into
-        # a single GHS analytics base before aggregating.
-        return convert_to_ghs(stored_amount, wallet_currency)
-
-    def _load_live_expenses(*filters):
-        return Expense.query.options(
-            joinedload(Expense.wallet),
-            joinedload(Expense.category)
-        ).filter(
-            Expense.user_id == current_user.id,
-            *filters
-        ).all()
-
-    def _sum_live_expenses_in_ghs(convert_to_ghs, *filters):
-        return sum(_expense_amount_in_ghs(expense, convert_to_ghs) for expense in _load_live_expenses(*filters))
-
+        # Transfers are classified on write (type, tags, description or Transfer category)
+        return Expense.is_transfer
 
     @main.route('/analytics')
     @login_required
     def analytics():
         # Category breakdown for pie chart (Expenses only) - Exclude Transfers
         transfer_filter = _get_transfer_filter()
-        convert_to_ghs = _build_currency_converter('GHS')
-
-        debt_lent_cat = Category.query.filter_by(name='Money Lent', user_id=current_user.id).first()
-        debt_lent_id = debt_lent_cat.id if debt_lent_cat else -1
 
-        category_totals = {}
-        category_expenses = _load_live_expenses(
-            Expense.transaction_type == 'expense',
-            ~transfer_filter
-        )
-        for expense in category_expenses:
-            if not expense.category:
+        breakdown = {}
+        amounts = category_totals(current_user.id, 'GHS', Expense.transaction_type == 'expense', ~transfer_filter)
+        categories = {c.id: c for c in Category.query.filter(Category.id.in_(list(amounts)))} if amounts else {}
+        for category_id, amount in amounts.items():
+            category = categories.get(category_id)
+            if not category:
                 continue
-
-            if expense.category_id not in category_totals:
-                category_totals[expense.category_id] = {
-                    'name': expense.category.name,
-                    'icon': expense.category.icon,
-                    'amount': 0.0
-                }
-            category_totals[expense.category_id]['amount'] += _expense_amount_in_ghs(expense, convert_to_ghs)
+            breakdown[category_id] = {
+                'name': category.name,
+                'icon': category.icon,
+                'amount': amount
+            }
 
         category_data = [
             (item['name'], item['icon'], item['amount'])
-            for item in sorted(category_totals.values(), key=lambda item: item['amount'], reverse=True)
+            for item in sorted(breakdown.values(), key=lambda item: item['amount'], reverse=True)
         ]
 
-        # Monthly trend for line chart (last 6 months)
-        monthly_data = []
-        today = datetime.utcnow()
-
-        for i in range(5, -1, -1):
-            month_date = today - relativedelta(months=i)
-            month_start = datetime(month_date.year, month_date.month, 1)
-
-            if month_start.month == 12:
-                month_end = datetime(month_start.year + 1, 1, 1)
-            else:
-                month_end = datetime(month_start.year, month_start.month + 1, 1)
-
-            hist_summary = FinancialSummary.query.filter_by(
-                user_id=current_user.id,
-                year=month_start.year,
-                month=month_start.month
-            ).first()
-
-            if hist_summary:
-                # Use Historical ground truth if available
-                expense_total = hist_summary.total_expense
-                income_total = hist_summary.total_income
-                # We assume FinancialSummary is the final word (no extras needed)
-                # But for 'Actuals' (Spent - Lent), we'd need m_lent if the summary doesn't already subtract it.
-                # Usually summaries are gross, let's keep it simple or check if user has m_lent in summary.
-                # (Models show they are separate: actual_expense is there too but maybe not filled).
-                m_lent = 0
-                m_extra_debt_exp = 0
-                m_extra_debtor_inc = 0
-                m_extra_contract_inc = 0
-            else:
-                # Live query
-                expense_total = _sum_live_expenses_in_ghs(
-                    convert_to_ghs,
-                    Expense.transaction_type == 'expense',
-                    Expense.date >= month_start,
-                    Expense.date < month_end,
-                    ~transfer_filter
-                )
-
-                income_total = _sum_live_expenses_in_ghs(
-                    convert_to_ghs,
-                    Expense.transaction_type == 'income',
-                    Expense.date >= month_start,
-                    Expense.date < month_end,
-                    ~transfer_filter
-                )
-
-                m_lent = _sum_live_expenses_in_ghs(
-                    convert_to_ghs,
-                    Expense.transaction_type == 'expense',
-                    Expense.date >= month_start,
-                    Expense.date < month_end,
-                    or_(Expense.category_id == debt_lent_id, Expense.tags.ilike('%debt_lent%'))
-                )
-
-                m_extra_debt_exp = db.session.query(func.sum(DebtPayment.amount)).filter(
-                    DebtPayment.user_id == current_user.id,
-                    DebtPayment.date >= month_start,
-                    DebtPayment.date < month_end
-                ).scalar() or 0
-
-                m_extra_debtor_inc = db.session.query(func.sum(DebtorPayment.amount)).filter(
-                    DebtorPayment.user_id == current_user.id,
-                    DebtorPayment.date >= month_start,
-                    DebtorPayment.date < month_end
-                ).scalar() or 0
-
-                m_extra_contract_inc = db.session.query(func.sum(ContractPayment.amount)).filter(
-                    ContractPayment.user_id == current_user.id,
-                    ContractPayment.payment_date >= month_start,
-                    ContractPayment.payment_date < month_end
-                ).scalar() or 0
-
-                expense_total += m_extra_debt_exp
-                income_total += m_extra_debtor_inc + m_extra_contract_inc
+        # Monthly (last 6 months) and yearly (last 12 months) trends share one
+        # grouped lookup; a FinancialSummary is the ground truth for its month.
+        yearly_months = last_months(12)
+        month_totals = monthly_totals(current_user.id, yearly_months, currency='GHS')
 
-            monthly_data.append({
-                'month': month_start.strftime('%b'),
-                'expense': expense_total,
-                'actual_expense': expense_total - m_lent - m_extra_debt_exp,
-                'income': income_total,
-                'actual_income': income_total - m_extra_debtor_inc - m_extra_contract_inc
-            })
-
-        # Yearly trend (Last 12 Months)
-        yearly_data = []
-
-        for i in range(11, -1, -1):
-            month_date = today - relativedelta(months=i)
-            month_start = datetime(month_date.year, month_date.month, 1)
-
-            if month_start.month == 12:
-                month_end = datetime(month_start.year + 1, 1, 1)
-            else:
-                month_end = datetime(month_start.year, month_start.month + 1, 1)
-
-            hist_summary = FinancialSummary.query.filter_by(
-                user_id=current_user.id,
-                year=month_start.year,
-                month=month_start.month
-            ).first()
-
-            if hist_summary:
-                expense_total = hist_summary.total_expense
-                income_total = hist_summary.total_income
-                m_lent = 0
-                y_extra_debt_exp = 0
-                y_extra_debtor_inc = 0
-                y_extra_contract_inc = 0
-            else:
-                expense_total = _sum_live_expenses_in_ghs(
-                    convert_to_ghs,
-                    Expense.transaction_type == 'expense',
-                    Expense.date >= month_start,
-                    Expense.date < month_end,
-                    ~transfer_filter
-                )
-
-                income_total = _sum_live_expenses_in_ghs(
-                    convert_to_ghs,
-                    Expense.transaction_type == 'income',
-                    Expense.date >= month_start,
-                    Expense.date < month_end,
-                    ~transfer_filter
-                )
+        def _trend_point(period, label_format):
+            totals = month_totals[period]
+            return {
+                'month': datetime(period[0], period[1], 1).strftime(label_format),
+                'expense': totals.total_expense,
+                'actual_expense': totals.actual_expense,
+                'income': totals.total_income,
+                'actual_income': totals.actual_income
+            }
 
-                m_lent = _sum_live_expenses_in_ghs(
-                    convert_to_ghs,
-                    Expense.transaction_type == 'expense',
-                    Expense.date >= month_start,
-                    Expense.date < month_end,
-                    or_(Expense.category_id == debt_lent_id, Expense.tags.ilike('%debt_lent%'))
-                )
-
-                # Extra payments for this month (Yearly Trend)
-                y_extra_debt_exp = db.session.query(func.sum(DebtPayment.amount)).filter(
-                    DebtPayment.user_id == current_user.id,
-                    DebtPayment.date >= month_start,
-                    DebtPayment.date < month_end
-                ).scalar() or 0
-
-                y_extra_debtor_inc = db.session.query(func.sum(DebtorPayment.amount)).filter(
-                    DebtorPayment.user_id == current_user.id,
-                    DebtorPayment.date >= month_start,
-                    DebtorPayment.date < month_end
-                ).scalar() or 0
-
-                y_extra_contract_inc = db.session.query(func.sum(ContractPayment.amount)).filter(
-                    ContractPayment.user_id == current_user.id,
-                    ContractPayment.payment_date >= month_start,
-                    ContractPayment.payment_date < month_end
-                ).scalar() or 0
-
-                expense_total += y_extra_debt_exp
-                income_total += y_extra_debtor_inc + y_extra_contract_inc
-
-            yearly_data.append({
-                'month': month_start.strftime('%b %Y'),
-                'expense': expense_total,
-                'actual_expense': expense_total - m_lent - y_extra_debt_exp,
-                'income': income_total,
-                'actual_income': income_total - y_extra_debtor_inc - y_extra_contract_inc
-            })
+        monthly_data = [_trend_point(period, '%b') for period in yearly_months[-6:]]
+        yearly_data = [_trend_point(period, '%b %Y') for period in yearly_months]
 
         # Annual Overview (All Years)
-        expense_years = db.session.query(func.extract('year', Expense.date)).distinct().all()
-        expense_years = [int(y[0]) for y in expense_years] if expense_years else []
+        expense_years = db.session.query(func.extract('year', Expense.date)).filter(
+            Expense.user_id == current_user.id
+        ).distinct().all()
+        expense_years = [int(y[0]) for y in expense_years if y[0] is not None] if expense_years else []
 
         hist_years = db.session.query(FinancialSummary.year).filter_by(user_id=current_user.id).distinct().all()
         hist_years = [int(y[0]) for y in hist_years] if hist_years else []
 
         all_years = sorted(list(set(expense_years + hist_years)), reverse=True)
 
+        # A yearly summary (month=None) covers its whole year; otherwise months are
+        # de-duplicated individually against monthly summaries.
+        year_totals = yearly_totals(current_user.id, all_years, currency='GHS')
         annual_data = []
         for year in all_years:
-            y_expense = 0
-            y_income = 0
-            y_lent = 0
-            y_debt_payments = 0
-            y_recovered = 0
-
-            # Check for a Yearly Summary first (month=None)
-            yearly_hist = FinancialSummary.query.filter_by(
-                user_id=current_user.id, year=year, month=None
-            ).first()
-
-            if yearly_hist:
-                y_expense = yearly_hist.total_expense or 0
-                y_income = yearly_hist.total_income or 0
-                # If a yearly summary exists, we assume it covers the historical ground truth
-                # and Act will default to Total unless we have more info.
-            else:
-                # Process each month in the year for correct de-duplication
-                for m in range(1, 13):
-                    m_start = datetime(year, m, 1)
-                    if m == 12:
-                        m_end = datetime(year + 1, 1, 1)
-                    else:
-                        m_end = datetime(year, m + 1, 1)
-
-                    hist_m = FinancialSummary.query.filter_by(
-                        user_id=current_user.id, year=year, month=m
-                    ).first()
-
-                    if hist_m:
-                        y_expense += (hist_m.total_expense or 0)
-                        y_income += (hist_m.total_income or 0)
-                    else:
-                        # Sum Live Expenses + Extras
-                        m_live_exp = _sum_live_expenses_in_ghs(
-                            convert_to_ghs,
-                            Expense.transaction_type == 'expense',
-                            Expense.date >= m_start,
-                            Expense.date < m_end,
-                            ~transfer_filter
-                        )
-
-                        m_live_inc = _sum_live_expenses_in_ghs(
-                            convert_to_ghs,
-                            Expense.transaction_type == 'income',
-                            Expense.date >= m_start,
-                            Expense.date < m_end,
-                            ~transfer_filter
-                        )
-
-                        m_live_lent = _sum_live_expenses_in_ghs(
-                            convert_to_ghs,
-                            Expense.transaction_type == 'expense',
-                            Expense.date >= m_start,
-                            Expense.date < m_end,
-                            or_(Expense.category_id == debt_lent_id, Expense.tags.ilike('%debt_lent%'))
-                        )
-
-                        # Extra payments (Annual)
-                        m_extra_d_exp = db.session.query(func.sum(DebtPayment.amount)).filter(
-                            DebtPayment.user_id == current_user.id,
-                            DebtPayment.date >= m_start,
-                            DebtPayment.date < m_end
-                        ).scalar() or 0
-
-                        m_extra_dr_inc = db.session.query(func.sum(DebtorPayment.amount)).filter(
-                            DebtorPayment.user_id == current_user.id,
-                            DebtorPayment.date >= m_start,
-                            DebtorPayment.date < m_end
-                        ).scalar() or 0
-
-                        m_extra_c_inc = db.session.query(func.sum(ContractPayment.amount)).filter(
-                            ContractPayment.user_id == current_user.id,
-                            ContractPayment.payment_date >= m_start,
-                            ContractPayment.payment_date < m_end
-                        ).scalar() or 0
-
-                        y_expense += (m_live_exp + m_extra_d_exp)
-                        y_income += (m_live_inc + m_extra_dr_inc + m_extra_c_inc)
-                        y_lent += m_live_lent
-                        y_debt_payments += m_extra_d_exp
-                        y_recovered += (m_extra_dr_inc + m_extra_c_inc)
-
+            totals = year_totals[year]
             annual_data.append({
                 'year': year,
-                'expense': y_expense,
-                'actual_expense': y_expense - y_lent - y_debt_payments,
-                'income': y_income,
-                'actual_income': y_income - y_recovered
+                'expense': totals.total_expense,
+                'actual_expense': totals.actual_expense,
+                'income': totals.total_income,
+                'actual_income': totals.actual_income
             })
 
         return render_template('analytics.html',
@@ -391,49 +89,28 @@ def register_routes(main):
     @main.route('/export/csv')
     @login_required
     def export_csv():
-        expenses = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.date.desc()).all()
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Date', 'Description', 'Category', 'Wallet', 'Amount', 'Type', 'Tags', 'Notes'])
-
-        for expense in expenses:
-            writer.writerow([
-                expense.date.strftime('%Y-%m-%d'),
-                expense.description,
-                expense.category.name,
-                expense.wallet.name,
-                expense.amount,
-                expense.transaction_type,
-                expense.tags or '',
-                expense.notes or ''
-            ])
-
-        output.seek(0)
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={'Content-Disposition': 'attachment; filename=expenses.csv'}
-        )
+        from .export import csv_response, export_options
+        try:
+            columns, start, end, compress = export_options(
+                request.args, ['date', 'description', 'category', 'wallet', 'amount', 'type', 'tags', 'notes'])
+        except ValueError as e:
+            flash(f'Invalid export options: {e}', 'error')
+            return redirect(url_for('main.all_expenses'))
+        return csv_response(current_user.id, 'expenses.csv', columns, start, end, compress)
 
     @main.route('/export/pdf')
     @login_required
     def export_pdf():
-        from .export import generate_pdf
-        expenses = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.date.desc()).all()
-        buffer = generate_pdf(expenses, current_user)
-        return send_file(buffer, mimetype='application/pdf', as_attachment=True,
-                         download_name=f'transactions_{datetime.utcnow().strftime("%Y%m%d")}.pdf')
+        from .export_jobs import enqueue_export
+        job = enqueue_export(current_user.id, 'transactions_pdf')
+        return redirect(url_for('exports.export_status', job_id=job.id))
 
     @main.route('/export/excel')
     @login_required
     def export_excel():
-        from .export import generate_excel
-        expenses = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.date.desc()).all()
-        buffer = generate_excel(expenses, current_user)
-        return send_file(buffer, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                         as_attachment=True,
-                         download_name=f'transactions_{datetime.utcnow().strftime("%Y%m%d")}.xlsx')
+        from .export_jobs import enqueue_export
+        job = enqueue_export(current_user.id, 'transactions_excel')
+        return redirect(url_for('exports.export_status', job_id=job.id))
 
     # ===== REPORTS =====
     @main.route('/reports')
@@ -2,9 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from . import db
 from .models import ApiKey
-from werkzeug.security import generate_password_hash
 from datetime import datetime
-import secrets
 
 api_keys_bp = Blueprint('api_keys', __name__)
 
@@ -23,14 +21,16 @@ def api_keys_list():
 def create_key():
     name = request.form.get('name', '').strip()
     perms = request.form.getlist('permissions')
-    raw_key = secrets.token_urlsafe(32)
+    rate_limit = request.form.get('rate_limit', type=int)
+    raw_key = ApiKey.generate_key()
 
     key = ApiKey(
         user_id=current_user.id,
         name=name,
-        key_hash=generate_password_hash(raw_key),
         permissions=','.join(perms) if perms else 'read',
+        rate_limit=rate_limit if rate_limit and rate_limit > 0 else None,
     )
+    key.set_key(raw_key)
     db.session.add(key)
     db.session.commit()
     flash(f'API Key created. Save this key now (shown only once): {raw_key}', 'success')
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
 from flask_login import login_required, current_user
 from . import db
 from .models import (
@@ -14,303 +14,48 @@ from .models import (
     BankReconciliation, ChartOfAccount, JournalEntry,
     Commitment, SMCContract, ContractPayment, ConstructionWork, GlobalEntity,
     NotificationPreference, BackupHistory, WalletShare, Notification,
-    AuditLog, SecurityEvent, ImportHistory, ApiKey, PushSubscription
+    AuditLog, SecurityEvent, ImportHistory, ApiKey, PushSubscription,
+    MonthlyRollup, Tag, expense_tag
 )
+from .backups import nested_count, read_backup, write_backup
 from datetime import datetime
-import json
-import hashlib
+import tempfile
 
 backup_bp = Blueprint('backup', __name__)
 
-APP_VERSION = '2.0'
-BACKUP_FORMAT_VERSION = '2.0'
+BACKUP_EXTENSIONS = ('.json', '.gz')
+
+
+# Tables covered by the backup sections, with the column that ties a row to its
+# owner. Nested lists in the backup (project items, payments, goal tasks...)
+# are tables of their own here. Used by the columnar dataset export.
+BACKUP_TABLES = [
+    ('wallets', Wallet.user_id), ('categories', Category.user_id), ('expenses', Expense.user_id),
+    ('budgets', Budget.user_id), ('recurring_transactions', RecurringTransaction.user_id),
+    ('projects', Project.user_id), ('project_items', ProjectItem.user_id),
+    ('project_item_payments', ProjectItemPayment.user_id),
+    ('financial_summaries', FinancialSummary.user_id), ('wishlist', WishlistItem.user_id),
+    ('creditors', Creditor.user_id), ('debt_payments', DebtPayment.user_id),
+    ('debtors', Debtor.user_id), ('debtor_payments', DebtorPayment.user_id),
+    ('goals', Goal.user_id), ('goal_tasks', GoalTask.user_id), ('goal_milestones', GoalMilestone.user_id),
+    ('investments', Investment.user_id), ('dividends', Dividend.user_id),
+    ('insurance_policies', InsurancePolicy.user_id), ('pension_schemes', PensionScheme.user_id),
+    ('ssnit_contributions', SSNITContribution.user_id), ('net_worth_snapshots', NetWorthSnapshot.user_id),
+    ('fixed_assets', FixedAsset.user_id), ('cashflow_projections', CashFlowProjection.user_id),
+    ('cashflow_alerts', CashFlowAlert.user_id), ('budget_periods', BudgetPeriod.user_id),
+    ('calendar_events', CalendarEvent.user_id), ('automation_rules', AutomationRule.user_id),
+    ('webhook_endpoints', WebhookEndpoint.user_id), ('bank_reconciliations', BankReconciliation.user_id),
+    ('chart_of_accounts', ChartOfAccount.user_id), ('journal_entries', JournalEntry.user_id),
+    ('commitments', Commitment.user_id), ('smc_contracts', SMCContract.user_id),
+    ('contract_payments', ContractPayment.user_id), ('construction_works', ConstructionWork.user_id),
+    ('global_entities', GlobalEntity.user_id), ('notification_preferences', NotificationPreference.user_id),
+    ('notifications', Notification.user_id), ('wallet_shares', WalletShare.owner_id),
+]
 
 
 # ──────────────────────────────────────────────
 # Helpers
 # ──────────────────────────────────────────────
-def _dt(val):
-    """Serialize a datetime to ISO string or None."""
-    return val.isoformat() if val else None
-
-
-def _build_full_backup(uid):
-    """Build the complete backup dict for a user, covering ALL models."""
-    user = User.query.get(uid)
-
-    data = {
-        'wallets': [{
-            'name': w.name, 'balance': w.balance, 'currency': w.currency,
-            'icon': w.icon, 'wallet_type': w.wallet_type,
-            'account_number': w.account_number, 'is_shared': w.is_shared
-        } for w in Wallet.query.filter_by(user_id=uid).all()],
-
-        'categories': [{
-            'name': c.name, 'icon': c.icon, 'is_custom': c.is_custom
-        } for c in Category.query.filter_by(user_id=uid).all()],
-
-        'expenses': [{
-            'amount': e.amount, 'description': e.description,
-            'date': _dt(e.date),
-            'category': e.category.name if e.category else '',
-            'wallet': e.wallet.name if e.wallet else '',
-            'notes': e.notes, 'tags': e.tags,
-            'transaction_type': e.transaction_type,
-            'original_amount': e.original_amount,
-            'original_currency': e.original_currency
-        } for e in Expense.query.filter_by(user_id=uid).all()],
-
-        'budgets': [{
-            'category': b.category.name if b.category else '',
-            'amount': b.amount, 'period': b.period,
-            'start_date': _dt(b.start_date), 'end_date': _dt(b.end_date),
-            'notify_at_75': b.notify_at_75, 'notify_at_90': b.notify_at_90,
-            'notify_at_100': b.notify_at_100, 'is_active': b.is_active
-        } for b in Budget.query.filter_by(user_id=uid).all()],
-
-        'recurring_transactions': [{
-            'amount': r.amount, 'description': r.description,
-            'category': r.category.name if r.category else '',
-            'wallet': r.wallet.name if r.wallet else '',
-            'transaction_type': r.transaction_type, 'frequency': r.frequency,
-            'start_date': _dt(r.start_date), 'end_date': _dt(r.end_date),
-            'last_created': _dt(r.last_created), 'next_due': _dt(r.next_due),
-            'is_active': r.is_active, 'notes': r.notes
-        } for r in RecurringTransaction.query.filter_by(user_id=uid).all()],
-
-        'projects': [{
-            'name': p.name, 'description': p.description,
-            'funding_source': p.funding_source,
-            'wallet': p.wallet.name if p.wallet else None,
-            'custom_funding_source': p.custom_funding_source,
-            'is_completed': p.is_completed,
-            'created_date': _dt(p.created_date),
-            'items': [{
-                'item_name': it.item_name, 'description': it.description,
-                'cost': it.cost, 'item_type': it.item_type,
-                'is_completed': it.is_completed,
-                'created_date': _dt(it.created_date),
-                'payments': [{
-                    'amount': pay.amount, 'description': pay.description,
-                    'is_paid': pay.is_paid,
-                    'payment_date': _dt(pay.payment_date),
-                    'created_date': _dt(pay.created_date)
-                } for pay in it.payments]
-            } for it in p.items]
-        } for p in Project.query.filter_by(user_id=uid).all()],
-
-        'financial_summaries': [{
-            'year': fs.year, 'month': fs.month,
-            'total_income': fs.total_income, 'total_expense': fs.total_expense,
-            'notes': fs.notes
-        } for fs in FinancialSummary.query.filter_by(user_id=uid).all()],
-
-        'wishlist': [{
-            'name': w.name, 'amount': w.amount,
-            'category': w.category.name if w.category else None,
-            'priority': w.priority, 'notes': w.notes
-        } for w in WishlistItem.query.filter_by(user_id=uid).all()],
-
-        'creditors': [{
-            'name': c.name, 'amount': c.amount, 'currency': c.currency,
-            'description': c.description, 'debt_type': c.debt_type,
-            'interest_rate': c.interest_rate, 'original_amount': c.original_amount,
-            'due_date': _dt(c.due_date), 'status': c.status,
-            'payment_frequency': c.payment_frequency,
-            'minimum_payment': c.minimum_payment,
-            'contact_info': c.contact_info, 'priority': c.priority,
-            'notes': c.notes,
-            'payments': [{
-                'amount': dp.amount, 'date': _dt(dp.date), 'notes': dp.notes
-            } for dp in c.payments]
-        } for c in Creditor.query.filter_by(user_id=uid).all()],
-
-        'debtors': [{
-            'name': d.name, 'amount': d.amount, 'currency': d.currency,
-            'description': d.description, 'debt_type': d.debt_type,
-            'interest_rate': d.interest_rate, 'original_amount': d.original_amount,
-            'due_date': _dt(d.due_date), 'status': d.status,
-            'payment_frequency': d.payment_frequency,
-            'minimum_payment': d.minimum_payment,
-            'contact_info': d.contact_info, 'priority': d.priority,
-            'notes': d.notes,
-            'payments': [{
-                'amount': dp.amount, 'date': _dt(dp.date), 'notes': dp.notes
-            } for dp in d.payments]
-        } for d in Debtor.query.filter_by(user_id=uid).all()],
-
-        'goals': [{
-            'name': g.name, 'target_amount': g.target_amount,
-            'current_amount': g.current_amount, 'deadline': _dt(g.deadline),
-            'goal_type': g.goal_type, 'icon': g.icon, 'color': g.color,
-            'priority': g.priority, 'notes': g.notes,
-            'is_completed': g.is_completed,
-            'tasks': [{
-                'title': t.title, 'description': t.description,
-                'due_date': _dt(t.due_date), 'priority': t.priority,
-                'is_completed': t.is_completed
-            } for t in g.tasks],
-            'milestones': [{
-                'title': m.title, 'target_amount': m.target_amount,
-                'is_completed': m.is_completed
-            } for m in g.milestones]
-        } for g in Goal.query.filter_by(user_id=uid).all()],
-
-        'investments': [{
-            'name': i.name, 'investment_type': i.investment_type,
-            'amount_invested': i.amount_invested,
-            'current_value': i.current_value,
-            'purchase_date': _dt(i.purchase_date),
-            'platform': i.platform, 'notes': i.notes,
-            'dividends': [{
-                'amount': d.amount, 'date': _dt(d.date), 'notes': d.notes
-            } for d in i.dividends]
-        } for i in Investment.query.filter_by(user_id=uid).all()],
-
-        'insurance_policies': [{
-            'provider': ip.provider, 'policy_number': ip.policy_number,
-            'policy_type': ip.policy_type, 'premium': ip.premium,
-            'coverage': ip.coverage, 'start_date': _dt(ip.start_date),
-            'end_date': _dt(ip.end_date), 'notes': ip.notes
-        } for ip in InsurancePolicy.query.filter_by(user_id=uid).all()],
-
-        'pension_schemes': [{
-            'name': ps.name, 'scheme_type': ps.scheme_type,
-            'contributions': ps.contributions,
-            'employer_match': ps.employer_match,
-            'balance': ps.balance, 'notes': ps.notes
-        } for ps in PensionScheme.query.filter_by(user_id=uid).all()],
-
-        'ssnit_contributions': [{
-            'month': sc.month, 'year': sc.year, 'amount': sc.amount,
-            'employer': sc.employer, 'employee_number': sc.employee_number
-        } for sc in SSNITContribution.query.filter_by(user_id=uid).all()],
-
-        'net_worth_snapshots': [{
-            'date': _dt(nw.date), 'total_assets': nw.total_assets,
-            'total_liabilities': nw.total_liabilities,
-            'net_worth': nw.net_worth, 'breakdown_json': nw.breakdown_json
-        } for nw in NetWorthSnapshot.query.filter_by(user_id=uid).all()],
-
-        'fixed_assets': [{
-            'name': fa.name, 'asset_category': fa.asset_category,
-            'purchase_date': _dt(fa.purchase_date),
-            'purchase_price': fa.purchase_price,
-            'current_value': fa.current_value, 'location': fa.location,
-            'condition': fa.condition,
-            'depreciation_rate': fa.depreciation_rate, 'notes': fa.notes
-        } for fa in FixedAsset.query.filter_by(user_id=uid).all()],
-
-        'cashflow_projections': [{
-            'month': cf.month, 'year': cf.year,
-            'projected_income': cf.projected_income,
-            'projected_expenses': cf.projected_expenses,
-            'actual_income': cf.actual_income,
-            'actual_expenses': cf.actual_expenses, 'notes': cf.notes
-        } for cf in CashFlowProjection.query.filter_by(user_id=uid).all()],
-
-        'cashflow_alerts': [{
-            'alert_type': ca.alert_type, 'threshold': ca.threshold,
-            'message': ca.message, 'is_active': ca.is_active
-        } for ca in CashFlowAlert.query.filter_by(user_id=uid).all()],
-
-        'budget_periods': [{
-            'name': bp.name, 'start_date': _dt(bp.start_date),
-            'end_date': _dt(bp.end_date), 'total_budget': bp.total_budget,
-            'notes': bp.notes
-        } for bp in BudgetPeriod.query.filter_by(user_id=uid).all()],
-
-        'calendar_events': [{
-            'title': ce.title, 'description': ce.description,
-            'event_type': ce.event_type, 'event_date': _dt(ce.event_date),
-            'amount': ce.amount, 'reminder_date': _dt(ce.reminder_date),
-            'reminder_enabled': ce.reminder_enabled,
-            'is_recurring': ce.is_recurring, 'color': ce.color
-        } for ce in CalendarEvent.query.filter_by(user_id=uid).all()],
-
-        'automation_rules': [{
-            'name': ar.name, 'trigger_type': ar.trigger_type,
-            'condition': ar.condition, 'action_type': ar.action_type,
-            'action_params': ar.action_params, 'is_active': ar.is_active
-        } for ar in AutomationRule.query.filter_by(user_id=uid).all()],
-
-        'webhook_endpoints': [{
-            'name': we.name, 'url': we.url, 'events': we.events,
-            'secret': we.secret, 'is_active': we.is_active
-        } for we in WebhookEndpoint.query.filter_by(user_id=uid).all()],
-
-        'bank_reconciliations': [{
-            'wallet': br.wallet.name if br.wallet else '',
-            'statement_balance': br.statement_balance,
-            'reconciled_balance': br.reconciled_balance,
-            'date': _dt(br.date), 'status': br.status, 'notes': br.notes
-        } for br in BankReconciliation.query.filter_by(user_id=uid).all()],
-
-        'chart_of_accounts': [{
-            'code': coa.code, 'name': coa.name,
-            'account_type': coa.account_type, 'balance': coa.balance,
-            'parent_code': coa.parent.code if coa.parent else None
-        } for coa in ChartOfAccount.query.filter_by(user_id=uid).all()],
-
-        'journal_entries': [{
-            'date': _dt(je.date), 'description': je.description,
-            'debit_account_code': je.debit_account.code if je.debit_account else '',
-            'credit_account_code': je.credit_account.code if je.credit_account else '',
-            'amount': je.amount, 'reference': je.reference
-        } for je in JournalEntry.query.filter_by(user_id=uid).all()],
-
-        'commitments': [{
-            'name': cm.name, 'commitment_category': cm.commitment_category,
-            'amount': cm.amount, 'frequency': cm.frequency,
-            'due_date': _dt(cm.due_date), 'status': cm.status, 'notes': cm.notes
-        } for cm in Commitment.query.filter_by(user_id=uid).all()],
-
-        'smc_contracts': [{
-            'contract_number': sc.contract_number, 'title': sc.title,
-            'description': sc.description, 'contract_value': sc.contract_value,
-            'start_date': _dt(sc.start_date), 'end_date': _dt(sc.end_date),
-            'status': sc.status, 'location': sc.location, 'notes': sc.notes,
-            'payments': [{
-                'amount': cp.amount, 'description': cp.description,
-                'payment_date': _dt(cp.payment_date), 'status': cp.status
-            } for cp in sc.payments]
-        } for sc in SMCContract.query.filter_by(user_id=uid).all()],
-
-        'construction_works': [{
-            'project_name': cw.project_name, 'description': cw.description,
-            'location': cw.location, 'budget': cw.budget, 'spent': cw.spent,
-            'status': cw.status, 'start_date': _dt(cw.start_date),
-            'end_date': _dt(cw.end_date), 'contractor': cw.contractor,
-            'notes': cw.notes
-        } for cw in ConstructionWork.query.filter_by(user_id=uid).all()],
-
-        'global_entities': [{
-            'name': ge.name, 'entity_type': ge.entity_type,
-            'ownership_percent': ge.ownership_percent,
-            'value': ge.value, 'description': ge.description,
-            'notes': ge.notes
-        } for ge in GlobalEntity.query.filter_by(user_id=uid).all()],
-
-        'notification_preferences': [{
-            'notification_type': np.notification_type, 'enabled': np.enabled
-        } for np in NotificationPreference.query.filter_by(user_id=uid).all()],
-
-        'notifications': [{
-            'title': n.title, 'message': n.message,
-            'notification_type': n.notification_type, 'is_read': n.is_read,
-            'created_at': _dt(n.created_at)
-        } for n in Notification.query.filter_by(user_id=uid).all()],
-
-        'wallet_shares': [{
-            'wallet': s.wallet.name if s.wallet else '',
-            'shared_with_email': s.shared_with.email if s.shared_with else '',
-            'permission': s.permission, 'accepted': s.accepted
-        } for s in WalletShare.query.filter_by(owner_id=uid).all()],
-    }
-
-    return data
-
-
 def _count_records(data):
     """Count total records across all data keys."""
     total = 0
@@ -318,26 +63,25 @@ def _count_records(data):
         if key.startswith('_') or key in ('backup_date', 'backup_version', 'app_version', 'user', 'checksum', 'record_count'):
             continue
         if isinstance(val, list):
-            total += len(val)
             # Count nested records (e.g. project items, payments)
-            for item in val:
-                if isinstance(item, dict):
-                    for k, v in item.items():
-                        if isinstance(v, list):
-                            total += len(v)
-                            for sub in v:
-                                if isinstance(sub, dict):
-                                    for sk, sv in sub.items():
-                                        if isinstance(sv, list):
-                                            total += len(sv)
+            total += len(val) + sum(nested_count(item) for item in val if isinstance(item, dict))
     return total
 
 
-def _compute_checksum(data_dict):
-    """Compute SHA-256 checksum of the data payload (excluding the checksum field itself)."""
-    clean = {k: v for k, v in data_dict.items() if k != 'checksum'}
-    raw = json.dumps(clean, sort_keys=True, default=str)
-    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+def _write_backup_file(user):
+    """Write ``user``'s backup to a temporary file. Returns (file, size, record_count, checksum)."""
+    backup_file = tempfile.TemporaryFile()
+    record_count, checksum = write_backup(backup_file, user, datetime.utcnow())
+    size = backup_file.tell()
+    backup_file.seek(0)
+    return backup_file, size, record_count, checksum
+
+
+def _read_upload(file):
+    """Read an uploaded backup. Returns (data, actual checksum, file size)."""
+    data, actual = read_backup(file.stream)
+    file.stream.seek(0, 2)
+    return data, actual, file.stream.tell()
 
 
 def _parse_dt(val):
@@ -391,20 +135,8 @@ def create_backup():
     uid = current_user.id
     backup_type = request.form.get('backup_type', 'manual')
 
-    data = _build_full_backup(uid)
-
-    # Add metadata
-    data['backup_date'] = datetime.utcnow().isoformat()
-    data['backup_version'] = BACKUP_FORMAT_VERSION
-    data['app_version'] = APP_VERSION
-    data['user'] = {'name': current_user.name, 'email': current_user.email}
-
-    record_count = _count_records(data)
-    data['record_count'] = record_count
-    data['checksum'] = _compute_checksum(data)
-
-    json_str = json.dumps(data, indent=2, default=str)
-    file_name = f'fintracker_backup_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.json'
+    backup_file, file_size, record_count, checksum = _write_backup_file(current_user)
+    file_name = f'fintracker_backup_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.jsonl.gz'
 
     # Log to history
     try:
@@ -412,9 +144,9 @@ def create_backup():
             user_id=uid,
             backup_type=backup_type,
             file_name=file_name,
-            file_size=len(json_str.encode('utf-8')),
+            file_size=file_size,
             record_count=record_count,
-            checksum=data['checksum'],
+            checksum=checksum,
             status='completed',
             notes=f'Full backup with {record_count} records'
         )
@@ -423,24 +155,19 @@ def create_backup():
     except Exception:
         db.session.rollback()
 
-    return Response(
-        json_str,
-        mimetype='application/json',
-        headers={'Content-Disposition': f'attachment;filename={file_name}'}
-    )
+    return send_file(backup_file, mimetype='application/gzip', as_attachment=True, download_name=file_name)
 
 
 @backup_bp.route('/backup/restore', methods=['POST'])
 @login_required
 def restore_backup():
     file = request.files.get('file')
-    if not file or not file.filename.endswith('.json'):
-        flash('Please upload a valid JSON backup file.', 'error')
+    if not file or not file.filename.endswith(BACKUP_EXTENSIONS):
+        flash('Please upload a valid backup file (.jsonl.gz or .json).', 'error')
         return redirect(url_for('backup.backup_page'))
 
     try:
-        raw = file.stream.read().decode('utf-8')
-        data = json.loads(raw)
+        data, actual, file_size = _read_upload(file)
     except Exception as e:
         flash(f'Failed to read backup file: {str(e)}', 'error')
         return redirect(url_for('backup.backup_page'))
@@ -448,7 +175,6 @@ def restore_backup():
     # Verify checksum if present
     if 'checksum' in data:
         expected = data['checksum']
-        actual = _compute_checksum(data)
         if expected != actual:
             flash('⚠️ Backup integrity check FAILED. The file may be corrupted or tampered with. Restore aborted.', 'error')
             return redirect(url_for('backup.backup_page'))
@@ -458,22 +184,16 @@ def restore_backup():
 
     # ── Step 1: Create pre-restore safety snapshot ──
     try:
-        safety_data = _build_full_backup(uid)
-        safety_data['backup_date'] = datetime.utcnow().isoformat()
-        safety_data['backup_version'] = BACKUP_FORMAT_VERSION
-        safety_data['app_version'] = APP_VERSION
-        safety_data['user'] = {'name': current_user.name, 'email': current_user.email}
-        safety_count = _count_records(safety_data)
-        safety_data['record_count'] = safety_count
-        safety_data['checksum'] = _compute_checksum(safety_data)
+        snapshot, safety_size, safety_count, safety_checksum = _write_backup_file(current_user)
+        snapshot.close()
 
         safety_entry = BackupHistory(
             user_id=uid,
             backup_type='pre_restore',
-            file_name=f'pre_restore_snapshot_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.json',
-            file_size=len(json.dumps(safety_data).encode('utf-8')),
+            file_name=f'pre_restore_snapshot_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.jsonl.gz',
+            file_size=safety_size,
             record_count=safety_count,
-            checksum=safety_data['checksum'],
+            checksum=safety_checksum,
             status='completed',
             notes='Automatic safety snapshot before restore'
         )
@@ -496,7 +216,7 @@ def restore_backup():
             user_id=uid,
             backup_type='restore',
             file_name=file.filename,
-            file_size=len(raw.encode('utf-8')),
+            file_size=file_size,
             record_count=restored_count,
             checksum=data.get('checksum', ''),
             status='completed',
@@ -553,7 +273,13 @@ def _delete_all_user_data(uid):
     BankReconciliation.query.filter_by(user_id=uid).delete(synchronize_session=False)
 
     # Main entities
+    db.session.execute(expense_tag.delete().where(
+        expense_tag.c.expense_id.in_(db.select(Expense.id).where(Expense.user_id == uid))
+    ))
     Expense.query.filter_by(user_id=uid).delete(synchronize_session=False)
+    Tag.query.filter_by(user_id=uid).delete(synchronize_session=False)
+    # Bulk deletes skip the rollup flush hooks; the re-inserted rows rebuild them
+    MonthlyRollup.query.filter_by(user_id=uid).delete(synchronize_session=False)
     Budget.query.filter_by(user_id=uid).delete(synchronize_session=False)
     RecurringTransaction.query.filter_by(user_id=uid).delete(synchronize_session=False)
     Project.query.filter_by(user_id=uid).delete(synchronize_session=False)
@@ -1108,12 +834,11 @@ def _insert_from_backup(uid, data, merge=False):
 def preview_backup():
     """Parse an uploaded backup file and return a summary without restoring."""
     file = request.files.get('file')
-    if not file or not file.filename.endswith('.json'):
-        return jsonify({'error': 'Please upload a valid JSON file.'}), 400
+    if not file or not file.filename.endswith(BACKUP_EXTENSIONS):
+        return jsonify({'error': 'Please upload a valid backup file.'}), 400
 
     try:
-        raw = file.stream.read().decode('utf-8')
-        data = json.loads(raw)
+        data, actual, file_size = _read_upload(file)
     except Exception as e:
         return jsonify({'error': f'Failed to parse: {str(e)}'}), 400
 
@@ -1145,7 +870,6 @@ def preview_backup():
     checksum_valid = None
     if 'checksum' in data:
         expected = data['checksum']
-        actual = _compute_checksum(data)
         checksum_valid = (expected == actual)
 
     return jsonify({
@@ -1155,7 +879,7 @@ def preview_backup():
         'record_count': total,
         'entities': summary,
         'checksum_valid': checksum_valid,
-        'file_size': len(raw)
+        'file_size': file_size
     })
 
 
@@ -1164,12 +888,11 @@ def preview_backup():
 def verify_backup():
     """Verify a backup file's integrity via checksum."""
     file = request.files.get('file')
-    if not file or not file.filename.endswith('.json'):
-        return jsonify({'error': 'Please upload a valid JSON file.'}), 400
+    if not file or not file.filename.endswith(BACKUP_EXTENSIONS):
+        return jsonify({'error': 'Please upload a valid backup file.'}), 400
 
     try:
-        raw = file.stream.read().decode('utf-8')
-        data = json.loads(raw)
+        data, actual, file_size = _read_upload(file)
     except Exception as e:
         return jsonify({'error': f'Failed to parse: {str(e)}'}), 400
 
@@ -1180,7 +903,6 @@ def verify_backup():
         })
 
     expected = data['checksum']
-    actual = _compute_checksum(data)
 
     return jsonify({
         'valid': expected == actual,
@@ -1,7 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from . import db
-from .models import BudgetPeriod, Budget, Expense, Category
+from .models import BudgetPeriod, Expense, Category
+from .budgets import BudgetProgress
 from datetime import datetime
 from sqlalchemy import func
 
@@ -12,7 +13,6 @@ budget_planning_bp = Blueprint('budget_planning', __name__)
 @login_required
 def budget_planning():
     periods = BudgetPeriod.query.filter_by(user_id=current_user.id).order_by(BudgetPeriod.start_date.desc()).all()
-    budgets = Budget.query.filter_by(user_id=current_user.id, is_active=True).all()
 
     # Calculate Arkad 10% rule
     month_start = datetime(datetime.utcnow().year, datetime.utcnow().month, 1)
@@ -30,14 +30,11 @@ def budget_planning():
     savings_rate = (savings / monthly_income * 100) if monthly_income > 0 else 0
     arkad_met = savings >= arkad_target
 
-    for b in budgets:
-        b.spent = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.user_id == current_user.id,
-            Expense.category_id == b.category_id,
-            Expense.transaction_type == 'expense',
-            Expense.date >= month_start
-        ).scalar() or 0
-        b.remaining = b.amount - b.spent
+    budgets = []
+    for item in BudgetProgress.for_user(current_user.id):
+        item.budget.spent = item.spent
+        item.budget.remaining = item.remaining
+        budgets.append(item.budget)
 
     return render_template('budget_planning.html', periods=periods, budgets=budgets,
                            monthly_income=monthly_income, monthly_expenses=monthly_expenses,
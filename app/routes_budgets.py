@@ -1,9 +1,9 @@
 from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from . import db
-from .models import Expense, Category, Budget
+from .models import Category, Budget
+from .budgets import BudgetProgress
 from datetime import datetime, timedelta
-from sqlalchemy import func
 
 
 def register_routes(main):
@@ -12,36 +12,8 @@ def register_routes(main):
     @main.route('/budget')
     @login_required
     def budgets():
-        all_budgets = Budget.query.filter_by(user_id=current_user.id, is_active=True).all()
-        budget_data = []
-
-        for budget in all_budgets:
-            # Calculate effective start date based on period
-            now = datetime.utcnow()
-            if budget.period == 'weekly':
-                effective_start = now - timedelta(days=now.weekday())
-            elif budget.period == 'monthly':
-                effective_start = datetime(now.year, now.month, 1)
-            elif budget.period == 'yearly':
-                effective_start = datetime(now.year, 1, 1)
-            else:
-                effective_start = budget.start_date
-
-            spent = db.session.query(func.sum(Expense.amount)).filter(
-                Expense.user_id == current_user.id,
-                Expense.category_id == budget.category_id,
-                Expense.transaction_type == 'expense',
-                Expense.date >= effective_start
-            ).scalar() or 0
-
-            percentage = (spent / budget.amount * 100) if budget.amount > 0 else 0
-            budget_data.append({
-                'budget': budget,
-                'spent': spent,
-                'remaining': budget.amount - spent,
-                'percentage': percentage,
-                'width_percentage': min(percentage, 100)
-            })
+        # Spend for every active budget in one grouped query (see app.budgets)
+        budget_data = list(BudgetProgress.for_user(current_user.id))
 
         return render_template('budgets.html', budgets=budget_data)
 
@@ -1,9 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from . import db
-from .models import CashFlowProjection, CashFlowAlert, Expense, ProjectItem, ProjectItemPayment, DebtPayment, DebtorPayment, ContractPayment, Category, FinancialSummary
+from .models import CashFlowProjection, CashFlowAlert
+from .aggregates import last_months, monthly_totals
 from datetime import datetime, timedelta
-from sqlalchemy import func, or_
 import calendar as cal_module
 
 cashflow_bp = Blueprint('cashflow', __name__)
@@ -17,88 +17,20 @@ def cash_flow():
         CashFlowProjection.year.desc(), CashFlowProjection.month.desc()).all()
     alerts = CashFlowAlert.query.filter_by(user_id=current_user.id).order_by(CashFlowAlert.created_at.desc()).all()
 
-    # Build monthly data for last 6 months
+    # Build monthly data for last 6 months (one aggregate lookup, summaries override their month)
     monthly_data = []
-    months_list = []
-    curr_y, curr_m = now.year, now.month
-    for _ in range(6):
-        months_list.append((curr_y, curr_m))
-        curr_m -= 1
-        if curr_m == 0:
-            curr_m = 12
-            curr_y -= 1
-    months_list.reverse()
-
-    # Exclude Transfer category
-    transfer_cat = Category.query.filter_by(name='Transfer', user_id=current_user.id).first()
-    transfer_id = transfer_cat.id if transfer_cat else -1
-    transfer_types = ('transfer', 'transfer_out', 'transfer_in')
-    
-    # Robust Transfer Filter (Handles NULLs)
-    transfer_filter = or_(
-        Expense.transaction_type.in_(transfer_types),
-        func.coalesce(Expense.tags, '').ilike('%transfer%'),
-        func.coalesce(Expense.description, '').ilike('Transfer %')
-    )
-    if transfer_id != -1:
-        transfer_filter = or_(transfer_filter, Expense.category_id == transfer_id)
+    months_list = last_months(6, now)
+    month_totals = monthly_totals(current_user.id, months_list)
+    projections_by_month = {(p.year, p.month): p for p in projections}
 
     for y, m in months_list:
-        month_start = datetime(y, m, 1)
-        if m == 12:
-            month_end = datetime(y + 1, 1, 1)
-        else:
-            month_end = datetime(y, m + 1, 1)
-
-        # Check for historical summary
-        hist_summary = FinancialSummary.query.filter_by(
-            user_id=current_user.id, year=y, month=m).first()
-
-        if hist_summary:
-            actual_income = hist_summary.total_income
-            actual_expenses = hist_summary.total_expense
-        else:
-            actual_income = db.session.query(func.sum(Expense.amount)).filter(
-                Expense.user_id == current_user.id,
-                Expense.transaction_type == 'income',
-                Expense.date >= month_start,
-                Expense.date < month_end,
-                ~transfer_filter
-            ).scalar() or 0
-
-            actual_expenses = db.session.query(func.sum(Expense.amount)).filter(
-                Expense.user_id == current_user.id,
-                Expense.transaction_type == 'expense',
-                Expense.date >= month_start,
-                Expense.date < month_end,
-                ~transfer_filter
-            ).scalar() or 0
-
-            # Extra payments for this month (Cash Flow)
-            m_extra_debt_exp = db.session.query(func.sum(DebtPayment.amount)).filter(
-                DebtPayment.user_id == current_user.id,
-                DebtPayment.date >= month_start,
-                DebtPayment.date < month_end
-            ).scalar() or 0
-
-            m_extra_debtor_inc = db.session.query(func.sum(DebtorPayment.amount)).filter(
-                DebtorPayment.user_id == current_user.id,
-                DebtorPayment.date >= month_start,
-                DebtorPayment.date < month_end
-            ).scalar() or 0
-
-            m_extra_contract_inc = db.session.query(func.sum(ContractPayment.amount)).filter(
-                ContractPayment.user_id == current_user.id,
-                ContractPayment.payment_date >= month_start,
-                ContractPayment.payment_date < month_end
-            ).scalar() or 0
-
-            actual_expenses += m_extra_debt_exp
-
+        totals = month_totals[(y, m)]
+        actual_income = totals.income
+        # Extra payments for this month (Cash Flow)
+        actual_expenses = totals.total_expense
 
         # Find matching projection
-        proj = CashFlowProjection.query.filter_by(
-            user_id=current_user.id, year=y, month=m).first()
+        proj = projections_by_month.get((y, m))
 
         monthly_data.append({
             'month': m, 'year': y,
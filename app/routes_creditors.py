@@ -2,6 +2,7 @@ from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from . import db
 from .models import Expense, Category, Wallet, Creditor, DebtPayment
+from .tags import has_tag
 from datetime import datetime
 from sqlalchemy import func
 
@@ -120,7 +121,7 @@ def register_routes(main):
         # Fetch payment history
         payment_history = Expense.query.filter(
             Expense.user_id == current_user.id,
-            Expense.tags.like('%debt_payment%')
+            has_tag(current_user.id, 'debt_payment')
         ).order_by(Expense.date.desc()).limit(30).all()
 
         return render_template(
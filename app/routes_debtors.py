@@ -2,6 +2,7 @@ from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from . import db
 from .models import Expense, Category, Wallet, Debtor, DebtorPayment
+from .tags import has_tag
 from datetime import datetime
 from sqlalchemy import func, or_
 
@@ -101,12 +102,11 @@ def register_routes(main):
         bad_debt_count = len(bad_debt_debtors)
         total_bad_debt = db.session.query(func.sum(Expense.amount)).filter(
             Expense.user_id == current_user.id,
-            Expense.tags.like('%bad_debt%'),
-            ~Expense.tags.like('%bad_debt_recovery%')
+            has_tag(current_user.id, 'bad_debt')
         ).scalar() or 0
         total_recovered = db.session.query(func.sum(Expense.amount)).filter(
             Expense.user_id == current_user.id,
-            Expense.tags.like('%bad_debt_recovery%')
+            has_tag(current_user.id, 'bad_debt_recovery')
         ).scalar() or 0
 
         categories = Category.query.filter_by(user_id=current_user.id).order_by(Category.name).all()
@@ -138,7 +138,7 @@ def register_routes(main):
         # Fetch collection history
         collection_history = Expense.query.filter(
             Expense.user_id == current_user.id,
-            Expense.tags.like('%debt_collection%')
+            has_tag(current_user.id, 'debt_collection')
         ).order_by(Expense.date.desc()).limit(30).all()
 
         return render_template(
@@ -599,13 +599,12 @@ def register_routes(main):
 
         total_written_off = db.session.query(func.sum(Expense.amount)).filter(
             Expense.user_id == current_user.id,
-            Expense.tags.like('%bad_debt%'),
-            ~Expense.tags.like('%bad_debt_recovery%'),
+            has_tag(current_user.id, 'bad_debt'),
             Expense.description.like(f'%{debtor.name}%')
         ).scalar() or 0
         total_already_recovered = db.session.query(func.sum(Expense.amount)).filter(
             Expense.user_id == current_user.id,
-            Expense.tags.like('%bad_debt_recovery%'),
+            has_tag(current_user.id, 'bad_debt_recovery'),
             Expense.description.like(f'%{debtor.name}%')
         ).scalar() or 0
         max_recoverable = total_written_off - total_already_recovered
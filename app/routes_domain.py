@@ -44,7 +44,7 @@ def add_contract():
 @login_required
 def delete_contract(id):
     c = SMCContract.query.filter_by(id=id, user_id=current_user.id).first_or_404()
-    ContractPayment.query.filter_by(contract_id=c.id).delete()
+    # Payments go through the ORM cascade so the monthly rollups see the deletes
     db.session.delete(c)
     db.session.commit()
     flash('Contract deleted.', 'success')
@@ -1,16 +1,18 @@
 from flask import render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from . import db
+from .aggregates import query_total
 from .models import Expense, Category, Wallet
 from .project_expenses import (
     PROJECT_TYPE_OPTIONS,
     is_project_category,
     normalize_project_type,
 )
+from .pagination import keyset_page, offset_page
+from .search import match_expenses
 from .utils import get_exchange_rate
 from .currencies import CURRENCIES
 from datetime import datetime, timedelta
-from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
 
 
@@ -20,42 +22,6 @@ def _normalize_currency(code, fallback='GHS'):
     return normalized_currency or fallback_currency
 
 
-def _build_currency_converter(target_currency='GHS'):
-    normalized_target = _normalize_currency(target_currency)
-    rate_cache = {}
-
-    def convert_amount(amount, from_currency):
-        numeric_amount = float(amount or 0)
-        normalized_source = _normalize_currency(from_currency, fallback=normalized_target)
-        if normalized_source == normalized_target:
-            return numeric_amount
-
-        cache_key = (normalized_source, normalized_target)
-        if cache_key not in rate_cache:
-            rate_cache[cache_key] = get_exchange_rate(normalized_source, normalized_target)
-
-        return numeric_amount * rate_cache[cache_key]
-
-    return convert_amount
-
-
-def _expense_amount_in_currency(expense, convert_amount, target_currency='GHS'):
-    normalized_target = _normalize_currency(target_currency)
-    wallet_currency = _normalize_currency(expense.wallet.currency if expense.wallet else None, fallback='GHS')
-    original_currency = _normalize_currency(expense.original_currency, fallback=wallet_currency)
-    stored_amount = float(expense.amount or 0)
-    original_amount = float(expense.original_amount) if expense.original_amount is not None else None
-
-    # Trust same-currency stored amounts unless the record still looks like a
-    # legacy foreign-currency entry that was saved before conversion support.
-    if wallet_currency == normalized_target:
-        if original_amount is not None and original_currency != normalized_target and abs(stored_amount - original_amount) < 0.01:
-            return convert_amount(original_amount, original_currency)
-        return stored_amount
-
-    return convert_amount(stored_amount, wallet_currency)
-
-
 def _format_currency_amount(amount, currency):
     return f"{_normalize_currency(currency)} {float(amount or 0):,.2f}"
 
@@ -130,7 +96,7 @@ def register_routes(main):
             converted_amount = input_amount
 
             if currency != wallet_currency:
-                rate = get_exchange_rate(currency, wallet_currency)
+                rate = get_exchange_rate(currency, wallet_currency, fetch=True)
                 converted_amount = input_amount * rate
                 print(f"Converting {input_amount} {currency} to {converted_amount} {wallet_currency} (Rate: {rate})")
 
@@ -180,7 +146,7 @@ def register_routes(main):
                 to_converted_amount = input_amount
                 to_wallet_currency = _normalize_currency(to_wallet.currency, fallback='GHS')
                 if currency != to_wallet_currency:
-                    rate = get_exchange_rate(currency, to_wallet_currency)
+                    rate = get_exchange_rate(currency, to_wallet_currency, fetch=True)
                     to_converted_amount = input_amount * rate
 
                 expense_in = Expense(
@@ -292,7 +258,7 @@ def register_routes(main):
             wallet_currency = _normalize_currency(new_wallet.currency, fallback='GHS')
             converted_amount = input_amount
             if currency != wallet_currency:
-                rate = get_exchange_rate(currency, wallet_currency)
+                rate = get_exchange_rate(currency, wallet_currency, fetch=True)
                 converted_amount = input_amount * rate
 
             expense.amount = converted_amount
@@ -383,14 +349,9 @@ def register_routes(main):
 
         query = Expense.query.filter_by(user_id=current_user.id)
 
+        rank = None
         if search_query:
-            query = query.filter(or_(
-                Expense.description.contains(search_query),
-                Expense.income_source.contains(search_query),
-                Expense.project_type.contains(search_query),
-                Expense.notes.contains(search_query),
-                Expense.tags.contains(search_query)
-            ))
+            query, rank = match_expenses(query, search_query)
 
         if category_filter:
             query = query.filter_by(category_id=int(category_filter))
@@ -416,62 +377,57 @@ def register_routes(main):
         if date_to:
             query = query.filter(Expense.date < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
 
-        # Sorting
-        sort_by = request.args.get('sort', 'date')
-        sort_order = request.args.get('order', 'desc')
+        total_currency = _normalize_currency(current_user.default_currency, fallback='GHS')
+        total_count, filtered_total = query_total(query, total_currency)
+        filtered_total_display = _format_currency_amount(filtered_total, total_currency)
 
-        if sort_by == 'date':
-            if sort_order == 'asc':
-                query = query.order_by(Expense.date.asc())
-            else:
-                query = query.order_by(Expense.date.desc())
-        elif sort_by == 'description':
-            if sort_order == 'asc':
-                query = query.order_by(Expense.description.asc())
-            else:
-                query = query.order_by(Expense.description.desc())
-        elif sort_by == 'category':
-            query = query.join(Category)
-            if sort_order == 'asc':
-                query = query.order_by(Category.name.asc())
-            else:
-                query = query.order_by(Category.name.desc())
-        elif sort_by == 'amount':
-            if sort_order == 'asc':
-                query = query.order_by(Expense.amount.asc())
-            else:
-                query = query.order_by(Expense.amount.desc())
-        else:
-            # Default fallback
-            query = query.order_by(Expense.date.desc())
+        # Sorting; every order ends in Expense.id so each page continues after the last row shown
+        sort_by = request.args.get('sort', 'relevance' if search_query else 'date')
+        sort_order = request.args.get('order', 'desc')
+        cursor = request.args.get('cursor')
 
         query = query.options(
             joinedload(Expense.wallet),
             joinedload(Expense.category)
         )
-        expenses = query.all()
+        if sort_by == 'relevance' and rank is not None:
+            expenses, next_cursor = offset_page(
+                query.order_by(rank, Expense.date.desc(), Expense.id.desc()), cursor
+            )
+        else:
+            key = None
+            if sort_by == 'description':
+                columns = [Expense.description, Expense.id]
+            elif sort_by == 'category':
+                query = query.join(Category)
+                columns = [Category.name, Expense.id]
+                key = lambda expense: [expense.category.name, expense.id]
+            elif sort_by == 'amount':
+                columns = [Expense.amount, Expense.id]
+            else:
+                # Default fallback
+                columns = [Expense.date, Expense.id]
+            expenses, next_cursor = keyset_page(query, columns, cursor,
+                                                descending=sort_order != 'asc', key=key)
+
         categories = Category.query.filter_by(user_id=current_user.id).all()
         wallets = Wallet.query.filter_by(user_id=current_user.id).all()
-        total_currency = _normalize_currency(current_user.default_currency, fallback='GHS')
-        convert_amount = _build_currency_converter(total_currency)
-        filtered_total = sum(
-            _expense_amount_in_currency(expense, convert_amount, total_currency)
-            for expense in expenses
-        )
-        filtered_total_display = _format_currency_amount(filtered_total, total_currency)
 
         # AJAX live search: return JSON with rendered partial
         if request.args.get('ajax') == '1':
             html = render_template('_partials/expense_rows.html', expenses=expenses)
             return jsonify({
                 'html': html,
-                'count': len(expenses),
+                'count': total_count,
+                'next_cursor': next_cursor,
                 'total_display': filtered_total_display,
                 'total_currency': total_currency
             })
 
         return render_template('all_expenses.html',
                              expenses=expenses,
+                             total_count=total_count,
+                             next_cursor=next_cursor,
                              categories=categories,
                              wallets=wallets,
                              filtered_total_display=filtered_total_display,
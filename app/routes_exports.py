@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from flask import Blueprint, abort, jsonify, render_template, request, send_file, url_for
+from flask_login import current_user, login_required
+
+from . import db
+from .export_jobs import expire, file_path
+from .models import ExportJob
+
+exports_bp = Blueprint('exports', __name__)
+
+EXPORT_TITLES = {
+    'transactions_pdf': 'Transactions (PDF)',
+    'transactions_excel': 'Transactions (Excel)',
+    'tax_pdf': 'Annual tax summary (PDF)',
+    'newsletter_pdf': 'Financial report (PDF)',
+    'dataset_parquet': 'Full dataset (Parquet)',
+}
+
+
+def _get_job(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        abort(404)
+    if job.status == 'done' and job.expires_at and job.expires_at <= datetime.utcnow():
+        expire(job)
+        db.session.commit()
+    return job
+
+
+def _job_data(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+        'download_url': url_for('exports.download_export', job_id=job.id) if job.status == 'done' else None,
+    }
+
+
+@exports_bp.route('/exports/<int:job_id>')
+@login_required
+def export_status(job_id):
+    """Job status page; answers with JSON when the client asks for it (the page polls this way)."""
+    job = _get_job(job_id)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(_job_data(job))
+    return render_template('export_status.html', job=job, job_data=_job_data(job),
+                           title=EXPORT_TITLES.get(job.kind, 'Export'))
+
+
+@exports_bp.route('/exports/<int:job_id>/download')
+@login_required
+def download_export(job_id):
+    job = _get_job(job_id)
+    if job.status == 'expired':
+        abort(410)
+    if job.status != 'done':
+        abort(404)
+    return send_file(file_path(job), mimetype=job.mimetype, as_attachment=True, download_name=job.file_name)
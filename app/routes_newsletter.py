@@ -1,9 +1,11 @@
 import io
-from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_login import login_required, current_user
 from . import db
-from .models import Expense, Wallet, Goal, Creditor, Investment, Budget, Category
+from .models import Expense, Wallet, Goal, Creditor, Investment, Category
 from .mail import mail, Message
+from .aggregates import range_totals
+from .budgets import BudgetProgress
 from datetime import datetime, timedelta
 from sqlalchemy import func
 from reportlab.lib.pagesizes import A4
@@ -21,25 +23,15 @@ def _gather_report_data(user_id, period_days=30):
     period_start = now - timedelta(days=period_days)
     prev_start = period_start - timedelta(days=period_days)
 
-    # Income & expenses
-    income = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == user_id, Expense.transaction_type == 'income',
-        Expense.date >= period_start
-    ).scalar() or 0
-    expenses = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == user_id, Expense.transaction_type == 'expense',
-        Expense.date >= period_start
-    ).scalar() or 0
-
-    # Previous period for comparison
-    prev_income = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == user_id, Expense.transaction_type == 'income',
-        Expense.date >= prev_start, Expense.date < period_start
-    ).scalar() or 0
-    prev_expenses = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == user_id, Expense.transaction_type == 'expense',
-        Expense.date >= prev_start, Expense.date < period_start
-    ).scalar() or 0
+    # Income & expenses for this period and the previous one, in one grouped lookup
+    periods = range_totals(user_id, {
+        'current': (period_start, None),
+        'previous': (prev_start, period_start),
+    })
+    income = periods['current'].income
+    expenses = periods['current'].expense
+    prev_income = periods['previous'].income
+    prev_expenses = periods['previous'].expense
 
     income_change = ((income - prev_income) / prev_income * 100) if prev_income > 0 else 0
     expense_change = ((expenses - prev_expenses) / prev_expenses * 100) if prev_expenses > 0 else 0
@@ -69,15 +61,12 @@ def _gather_report_data(user_id, period_days=30):
     ).group_by(Category.name).order_by(func.sum(Expense.amount).desc()).limit(5).all()
 
     # Budget adherence
-    budgets = Budget.query.filter_by(user_id=user_id, is_active=True).all()
+    budgets = BudgetProgress.for_user(user_id)
     budget_data = []
     budgets_within = 0
-    for b in budgets:
-        spent = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.user_id == user_id, Expense.category_id == b.category_id,
-            Expense.transaction_type == 'expense', Expense.date >= b.start_date
-        ).scalar() or 0
-        pct = (spent / b.amount * 100) if b.amount > 0 else 0
+    for item in budgets:
+        b, spent = item.budget, item.spent
+        pct = item.percentage
         within = spent <= b.amount
         if within:
             budgets_within += 1
@@ -291,20 +280,20 @@ def generate_newsletter():
     return render_template('newsletter_report.html', user=current_user, **data)
 
 
+def build_report_pdf(user, period_days=30):
+    """The report PDF and its download name, run by the ``newsletter_pdf`` export job."""
+    data = _gather_report_data(user.id, period_days)
+    return _build_pdf(data, user), f'financial_report_{data["month_name"].replace(" ", "_")}.pdf'
+
+
 @newsletter_bp.route('/newsletter/download')
 @login_required
 def newsletter_download():
+    from .export_jobs import enqueue_export
     prefs = session.get('newsletter_prefs', {'frequency': 'monthly'})
     period_days = 7 if prefs.get('frequency') == 'weekly' else 30
-    data = _gather_report_data(current_user.id, period_days)
-    buffer = _build_pdf(data, current_user)
-
-    response = make_response(buffer.read())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = (
-        f'attachment; filename=financial_report_{data["month_name"].replace(" ", "_")}.pdf'
-    )
-    return response
+    job = enqueue_export(current_user.id, 'newsletter_pdf', period_days=period_days)
+    return redirect(url_for('exports.export_status', job_id=job.id))
 
 
 @newsletter_bp.route('/newsletter/email', methods=['POST'])
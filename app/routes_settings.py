@@ -1,5 +1,3 @@
-import csv
-import io
 import json
 from datetime import datetime
 
@@ -11,7 +9,6 @@ from .models import (
     AuditLog, Budget, Category, Creditor, Expense, Goal,
     Investment, SecurityEvent, User, Wallet, ExchangeRate,
 )
-from .utils import get_exchange_rate
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -180,28 +177,24 @@ def export_data():
 @settings_bp.route('/settings/export-csv')
 @login_required
 def export_data_csv():
-    """Export all transactions as CSV."""
-    uid = current_user.id
-    expenses = Expense.query.filter_by(user_id=uid).order_by(Expense.date.desc()).all()
+    """Export all transactions as CSV, streamed; accepts start/end dates, columns and gzip."""
+    from .export import csv_response, export_options
+    try:
+        columns, start, end, compress = export_options(request.args, ['date', 'description', 'amount', 'type', 'category'])
+    except ValueError as e:
+        flash(f'Invalid export options: {e}', 'error')
+        return redirect(url_for('settings.settings'))
+    return csv_response(current_user.id, f'transactions_{datetime.utcnow().strftime("%Y%m%d")}.csv',
+                        columns, start, end, compress)
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Date', 'Description', 'Amount', 'Type', 'Category'])
-    for e in expenses:
-        writer.writerow([
-            e.date.strftime('%Y-%m-%d') if e.date else '',
-            e.description or '',
-            e.amount,
-            e.transaction_type,
-            e.category.name if e.category else '',
-        ])
 
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename=transactions_{datetime.utcnow().strftime("%Y%m%d")}.csv'}
-    )
+@settings_bp.route('/settings/export-parquet')
+@login_required
+def export_data_parquet():
+    """Queue a zip of typed Parquet files, one per table in the full backup."""
+    from .export_jobs import enqueue_export
+    job = enqueue_export(current_user.id, 'dataset_parquet')
+    return redirect(url_for('exports.export_status', job_id=job.id))
 
 
 @settings_bp.route('/settings/exchange-rates', methods=['GET', 'POST'])
@@ -255,17 +248,16 @@ def exchange_rates():
                 flash('Exchange rate deleted.', 'success')
         
         elif action == 'refresh_all':
-            # Refresh all common currency rates to GHS
-            currencies = ['USD', 'EUR', 'GBP', 'NGN', 'KES', 'ZAR']
-            refreshed = 0
-            for curr in currencies:
-                try:
-                    rate = get_exchange_rate(curr, 'GHS')
-                    if rate > 0:
-                        refreshed += 1
-                except Exception:
-                    pass
-            flash(f'Refreshed {refreshed} exchange rates.', 'success')
+            # Refresh common currencies in the background; one fetch covers every pair of a base
+            from .fx import rate_cache
+            cache = rate_cache()
+            if cache.provider is None:
+                flash('Automatic exchange rate updates are disabled.', 'error')
+            else:
+                currencies = ['USD', 'EUR', 'GBP', 'NGN', 'KES', 'ZAR']
+                for curr in currencies:
+                    cache.refresh_async(curr)
+                flash(f'Refreshing {len(currencies)} exchange rates in the background.', 'success')
         
         return redirect(url_for('settings.exchange_rates'))
     
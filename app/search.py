@@ -0,0 +1,135 @@
+"""
+Full-text search over transactions.
+
+The transactions page and its live search used to filter with ``LIKE '%q%'``
+over five text columns, which scans every row the user owns on each
+keystroke. Each backend now keeps its own full-text index, maintained by the
+database itself so bulk updates and raw SQL stay in sync:
+
+- SQLite: an external-content FTS5 table ``expense_fts`` plus insert/update/
+  delete triggers on ``expense``.
+- PostgreSQL: a GIN index on a ``to_tsvector('simple', ...)`` expression.
+- MySQL / MariaDB: a FULLTEXT index over the searched columns.
+
+Every word of the query must match the start of a word in the transaction
+(prefix search), and results carry a rank for "best match first" ordering.
+Other dialects, and queries with no searchable words, fall back to ``LIKE``.
+"""
+
+import re
+
+from sqlalchemy import event, func, literal_column, or_, text
+from sqlalchemy.dialects import mysql
+from sqlalchemy.sql import column, table
+
+from . import db
+from .models import Expense
+
+SEARCH_COLUMNS = ('description', 'income_source', 'project_type', 'notes', 'tags')
+MAX_TERMS = 8
+
+FTS_TABLE = 'expense_fts'
+_fts = table(FTS_TABLE, column('rowid'), column('rank'))
+
+
+def _sqlite_ddl():
+    cols = ', '.join(SEARCH_COLUMNS)
+    new = ', '.join(f'new.{c}' for c in SEARCH_COLUMNS)
+    old = ', '.join(f'old.{c}' for c in SEARCH_COLUMNS)
+    delete_old = (f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) "
+                  f"VALUES ('delete', old.id, {old});")
+    insert_new = f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({cols}, "
+        "content='expense', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS expense_fts_ai AFTER INSERT ON expense BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS expense_fts_ad AFTER DELETE ON expense BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS expense_fts_au AFTER UPDATE OF {cols} ON expense "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def _pg_document(prefix=''):
+    parts = " || ' ' || ".join(f"coalesce({prefix}{c}, '')" for c in SEARCH_COLUMNS)
+    return f"to_tsvector('simple', {parts})"
+
+
+def create_search_index(connection):
+    """Create the dialect's full-text index on ``expense`` if it is missing."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statements = _sqlite_ddl()
+    elif dialect == 'postgresql':
+        statements = [f"CREATE INDEX IF NOT EXISTS ix_expense_search ON expense USING GIN ({_pg_document()})"]
+    elif dialect in ('mysql', 'mariadb'):
+        statements = [f"CREATE FULLTEXT INDEX ix_expense_fulltext ON expense ({', '.join(SEARCH_COLUMNS)})"]
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def rebuild_search_index():
+    """Re-index every transaction. Only SQLite keeps a separate copy; the caller commits.
+
+    Returns True when an index was rebuilt.
+    """
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return False
+    db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+def _after_create(target, connection, **kw):
+    create_search_index(connection)
+
+
+def _before_drop(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+
+event.listen(Expense.__table__, 'after_create', _after_create)
+event.listen(Expense.__table__, 'before_drop', _before_drop)
+
+
+def search_terms(search_text, dialect='sqlite'):
+    """Split ``search_text`` into words the way the dialect's tokenizer does."""
+    # MySQL keeps '_' inside words ('debt_lent'); FTS5 and tsvector split on it
+    pattern = r'\w+' if dialect in ('mysql', 'mariadb') else r'[^\W_]+'
+    return re.findall(pattern, search_text.lower())[:MAX_TERMS]
+
+
+def _substring_filter(search_text):
+    return or_(*(getattr(Expense, c).contains(search_text, autoescape=True) for c in SEARCH_COLUMNS))
+
+
+def match_expenses(query, search_text):
+    """Restrict an ``Expense`` query to rows matching ``search_text``.
+
+    Returns ``(query, rank)`` where ``rank`` is an ``order_by`` clause putting
+    the best matches first, or ``None`` when the ``LIKE`` fallback was used.
+    """
+    dialect = db.session.get_bind().dialect.name
+    terms = search_terms(search_text, dialect)
+    if not terms or dialect not in ('sqlite', 'postgresql', 'mysql', 'mariadb'):
+        return query.filter(_substring_filter(search_text)), None
+
+    if dialect == 'sqlite':
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        query = query.join(_fts, _fts.c.rowid == Expense.id).filter(
+            literal_column(FTS_TABLE).op('MATCH')(expression)
+        )
+        # FTS5's rank is bm25(), where smaller is better
+        return query, _fts.c.rank.asc()
+
+    if dialect == 'postgresql':
+        document = literal_column(_pg_document('expense.'))
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        return query.filter(document.op('@@')(tsquery)), func.ts_rank(document, tsquery).desc()
+
+    against = ' '.join(f'+{term}*' for term in terms)
+    columns = [getattr(Expense, c) for c in SEARCH_COLUMNS]
+    return (query.filter(mysql.match(*columns, against=against).in_boolean_mode()),
+            mysql.match(*columns, against=against).in_boolean_mode().desc())
@@ -1,6 +1,33 @@
-// Debounced live search for the expenses/transactions page
+// Debounced live search and infinite scroll for the expenses/transactions page
 (function() {
   var debounceTimer;
+  var loading = false;
+
+  // Filters come from the form; sort/order live in the page URL (column header links)
+  function buildParams(cursor) {
+    var form = document.getElementById('filterForm');
+    var params = new URLSearchParams(new FormData(form));
+    var pageParams = new URLSearchParams(window.location.search);
+    ['sort', 'order'].forEach(function(name) {
+      if (pageParams.has(name)) params.set(name, pageParams.get(name));
+    });
+    params.set('ajax', '1');
+    if (cursor) params.set('cursor', cursor);
+    return params;
+  }
+
+  function setNextCursor(cursor) {
+    var sentinel = document.getElementById('loadMore');
+    if (!sentinel) return;
+    sentinel.dataset.nextCursor = cursor || '';
+    sentinel.hidden = !cursor;
+  }
+
+  function refreshIcons() {
+    if (window.lucide && typeof window.lucide.createIcons === 'function') {
+      window.lucide.createIcons();
+    }
+  }
 
   function liveSearch() {
     clearTimeout(debounceTimer);
@@ -8,8 +35,7 @@
       var form = document.getElementById('filterForm');
       if (!form) return;
 
-      var params = new URLSearchParams(new FormData(form));
-      params.set('ajax', '1');
+      var params = buildParams();
 
       var tbody = document.getElementById('expenseTableBody');
       var countEl = document.getElementById('resultCount');
@@ -31,9 +57,8 @@
           if (totalEl && data.total_display !== undefined) {
             totalEl.textContent = data.total_display;
           }
-          if (window.lucide && typeof window.lucide.createIcons === 'function') {
-            window.lucide.createIcons();
-          }
+          setNextCursor(data.next_cursor);
+          refreshIcons();
         })
         .catch(function(err) {
           console.error('Live search error:', err);
@@ -42,6 +67,45 @@
     }, 300);
   }
 
+  function loadMore() {
+    var form = document.getElementById('filterForm');
+    var sentinel = document.getElementById('loadMore');
+    var tbody = document.getElementById('expenseTableBody');
+    if (!form || !sentinel || !tbody || loading || !sentinel.dataset.nextCursor) return;
+
+    loading = true;
+    fetch(form.action + '?' + buildParams(sentinel.dataset.nextCursor).toString())
+      .then(function(r) { return r.json(); })
+      .then(function(data) {
+        if (data.html) {
+          tbody.insertAdjacentHTML('beforeend', data.html);
+        }
+        setNextCursor(data.next_cursor);
+        refreshIcons();
+      })
+      .catch(function(err) {
+        console.error('Load more error:', err);
+      })
+      .then(function() {
+        loading = false;
+        // The observer only fires on changes; keep going while the sentinel is still in view
+        if (!sentinel.hidden && sentinel.getBoundingClientRect().top < window.innerHeight + 400) {
+          loadMore();
+        }
+      });
+  }
+
+  document.addEventListener('DOMContentLoaded', function() {
+    var sentinel = document.getElementById('loadMore');
+    if (!sentinel || !('IntersectionObserver' in window)) return;
+    new IntersectionObserver(function(entries) {
+      if (entries.some(function(entry) { return entry.isIntersecting; })) {
+        loadMore();
+      }
+    }, { rootMargin: '400px' }).observe(sentinel);
+  });
+
   // Expose globally
   window.liveSearch = liveSearch;
+  window.loadMoreTransactions = loadMore;
 })();
@@ -0,0 +1,123 @@
+"""
+Normalized transaction tags.
+
+``Expense.tags`` remains the comma-separated string users type and the API
+returns. A ``before_flush`` hook mirrors it into the ``tag`` / ``expense_tag``
+tables, so "all transactions tagged X" resolves through the (user_id, name)
+index instead of a ``LIKE '%x%'`` scan of the user's whole history.
+
+Use ``has_tag`` in filters and ``add_tags`` to append tags to a transaction.
+``ensure_tags`` is the get-or-create for Tag rows; it tolerates another
+request creating the same tag at the same time.
+"""
+
+from sqlalchemy import event, insert, inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import Expense, Tag, expense_tag
+
+TAG_MAX_LENGTH = 50
+
+
+def normalize_tag(tag):
+    return (tag or '').strip().lower()[:TAG_MAX_LENGTH]
+
+
+def parse_tags(value):
+    """Split a comma-separated tag string into unique normalized names, in order."""
+    names = []
+    for part in (value or '').split(','):
+        name = normalize_tag(part)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def add_tags(expense, new_tags):
+    """Append ``new_tags`` (string or list) to ``expense.tags``, skipping duplicates.
+
+    Returns the updated tag string. The Tag rows follow on the next flush.
+    """
+    if isinstance(new_tags, str):
+        new_tags = new_tags.split(',')
+    existing = expense.tags or ''
+    existing_set = set(parse_tags(existing))
+    for tag in new_tags:
+        tag = tag.strip()
+        if tag and normalize_tag(tag) not in existing_set:
+            existing = f'{existing},{tag}' if existing else tag
+            existing_set.add(normalize_tag(tag))
+    expense.tags = existing
+    return existing
+
+
+def has_tag(user_id, tag):
+    """Filter clause matching the user's transactions carrying ``tag`` (exact, case-insensitive)."""
+    tagged_ids = select(expense_tag.c.expense_id).join(Tag, Tag.id == expense_tag.c.tag_id).where(
+        Tag.user_id == user_id,
+        Tag.name == normalize_tag(tag),
+    )
+    return Expense.id.in_(tagged_ids)
+
+
+def ensure_tags(session, user_id, names):
+    """Return ``{name: Tag}`` for the user's normalized tag ``names``, creating missing rows.
+
+    Each insert runs in its own SAVEPOINT. If a concurrent request wins the
+    unique (user_id, name) index, the insert is rolled back and its row is
+    re-read with a locking read, which sees it even under REPEATABLE READ.
+    Safe to call from a flush hook: nothing here autoflushes.
+    """
+    names = set(names)
+    if not names:
+        return {}
+    with session.no_autoflush:
+        tags = {tag.name: tag for tag in session.query(Tag).filter(Tag.user_id == user_id, Tag.name.in_(names))}
+        missing = names - set(tags)
+        if missing:
+            connection = session.connection()
+            raced = False
+            for name in sorted(missing):
+                try:
+                    with connection.begin_nested():
+                        connection.execute(insert(Tag.__table__).values(user_id=user_id, name=name))
+                except IntegrityError:
+                    raced = True
+            created = session.query(Tag).filter(Tag.user_id == user_id, Tag.name.in_(missing))
+            if raced:
+                created = created.with_for_update(read=True)
+            tags.update((tag.name, tag) for tag in created)
+    return tags
+
+
+def _needs_sync(obj, new):
+    if obj in new:
+        return bool(obj.tags)
+    state = inspect(obj)
+    return state.attrs.tags.history.has_changes() or state.attrs.user_id.history.has_changes()
+
+
+def _sync_pending(session, flush_context, instances):
+    new = session.new
+    pending = [obj for obj in list(new) + list(session.dirty)
+               if isinstance(obj, Expense) and obj not in session.deleted
+               and obj.user_id is not None and _needs_sync(obj, new)]
+    if not pending:
+        return
+
+    wanted = {}
+    for expense in pending:
+        wanted.setdefault(expense.user_id, set()).update(parse_tags(expense.tags))
+
+    tags = {}
+    for user_id, names in wanted.items():
+        tags.update(((user_id, name), tag) for name, tag in ensure_tags(session, user_id, names).items())
+
+    with session.no_autoflush:
+        for expense in pending:
+            expense.tag_items = [tags[(expense.user_id, name)] for name in parse_tags(expense.tags)]
+
+
+event.listen(Session, 'before_flush', _sync_pending)
+
@@ -1,9 +1,7 @@
 from decimal import Decimal
-from datetime import datetime
 
 from . import db
-from .models import ExchangeRate, Wallet, Category
-import requests
+from .models import Wallet, Category
 
 
 def to_float(value, default=0.0):
@@ -18,46 +16,18 @@ def to_float(value, default=0.0):
         return default
 
 
-def get_exchange_rate(from_currency, to_currency='GHS'):
-    if from_currency == to_currency:
-        return 1.0
-        
-    # Get exchange rate from DB
-    rate = ExchangeRate.query.filter_by(
-        from_currency=from_currency, 
-        to_currency=to_currency
-    ).order_by(ExchangeRate.date.desc()).first()
-    
-    # If rate exists and is recent (e.g., within 24 hours), use it
-    if rate and (datetime.utcnow() - rate.date).days < 1:
-        return rate.rate
-    
-    # Otherwise fetch new rate
-    try:
-        api_url = f'https://api.exchangerate-api.com/v4/latest/{from_currency}'
-        response = requests.get(api_url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            current_rate = data.get('rates', {}).get(to_currency, 0)
-            
-            if current_rate > 0:
-                # Save new rate
-                new_rate = ExchangeRate(
-                    from_currency=from_currency,
-                    to_currency=to_currency,
-                    rate=current_rate
-                )
-                db.session.add(new_rate)
-                db.session.commit()
-                return current_rate
-    except Exception as e:
-        print(f"Error fetching rate fo {from_currency}: {e}")
-    
-    # Fallback to last known rate if available
-    if rate:
-        return rate.rate
-        
-    return 1.0 # Default fallback if nothing works
+def get_exchange_rate(from_currency, to_currency='GHS', fetch=False):
+    """Rate from the in-memory cache (see app.fx).
+
+    Reads never wait: an unknown pair is 1.0 until the background refresh
+    lands. Pass ``fetch=True`` when the converted amount will be stored, so a
+    never-seen pair is fetched first; 1.0 only if the provider fails.
+    """
+    from .fx import rate_cache
+
+    cache = rate_cache()
+    rate = cache.get_or_fetch(from_currency, to_currency) if fetch else cache.get(from_currency, to_currency)
+    return rate if rate is not None else 1.0
 
 def initialize_user_data(user):
     """Create default wallet and categories for a new user."""
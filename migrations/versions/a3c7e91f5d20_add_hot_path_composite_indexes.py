@@ -0,0 +1,61 @@
+"""add composite indexes for hot query paths
+
+Revision ID: a3c7e91f5d20
+Revises: 069d3b1994a3
+Create Date: 2026-06-20 10:15:42.118304
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c7e91f5d20'
+down_revision = '069d3b1994a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_user_type_date', ['user_id', 'transaction_type', 'date'], unique=False)
+        batch_op.create_index('ix_expense_user_category_date', ['user_id', 'category_id', 'date'], unique=False)
+        batch_op.create_index('ix_expense_user_date', ['user_id', 'date'], unique=False)
+
+    with op.batch_alter_table('debt_payment', schema=None) as batch_op:
+        batch_op.create_index('ix_debt_payment_user_date', ['user_id', 'date'], unique=False)
+
+    with op.batch_alter_table('debtor_payment', schema=None) as batch_op:
+        batch_op.create_index('ix_debtor_payment_user_date', ['user_id', 'date'], unique=False)
+
+    with op.batch_alter_table('contract_payment', schema=None) as batch_op:
+        batch_op.create_index('ix_contract_payment_user_date', ['user_id', 'payment_date'], unique=False)
+
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_user_read_created', ['user_id', 'is_read', 'created_at'], unique=False)
+        batch_op.create_index('ix_notification_user_created', ['user_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('financial_summary', schema=None) as batch_op:
+        batch_op.create_index('ix_financial_summary_user_year_month', ['user_id', 'year', 'month'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('financial_summary', schema=None) as batch_op:
+        batch_op.drop_index('ix_financial_summary_user_year_month')
+
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_user_created')
+        batch_op.drop_index('ix_notification_user_read_created')
+
+    with op.batch_alter_table('contract_payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_contract_payment_user_date')
+
+    with op.batch_alter_table('debtor_payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_debtor_payment_user_date')
+
+    with op.batch_alter_table('debt_payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_debt_payment_user_date')
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_user_date')
+        batch_op.drop_index('ix_expense_user_category_date')
+        batch_op.drop_index('ix_expense_user_type_date')
@@ -0,0 +1,66 @@
+"""add stored duplicate-detection fingerprint to expense
+
+Revision ID: a7c4e1f93d52
+Revises: d8a3f6b21c94
+Create Date: 2026-07-18 09:05:12.734410
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e1f93d52'
+down_revision = 'd8a3f6b21c94'
+branch_labels = None
+depends_on = None
+
+
+def _fingerprint(date, amount, description):
+    # Same key as app.fingerprints.fingerprint
+    key = '{}|{:.2f}|{}'.format(
+        date.strftime('%Y-%m-%d'),
+        abs(float(amount or 0)),
+        ' '.join((description or '').lower().split()),
+    )
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.String(length=64), nullable=True))
+
+    conn = op.get_bind()
+    expense = sa.table('expense',
+        sa.column('id', sa.Integer),
+        sa.column('date', sa.DateTime),
+        sa.column('amount', sa.Float),
+        sa.column('description', sa.String),
+        sa.column('fingerprint', sa.String),
+    )
+    set_fingerprint = (expense.update().where(expense.c.id == sa.bindparam('expense_id'))
+                       .values(fingerprint=sa.bindparam('value')))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(expense.c.id, expense.c.date, expense.c.amount, expense.c.description)
+            .where(expense.c.id > last_id, expense.c.date.isnot(None))
+            .order_by(expense.c.id)
+            .limit(1000)
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(set_fingerprint, [{'expense_id': expense_id, 'value': _fingerprint(date, amount, description)}
+                                       for expense_id, date, amount, description in rows])
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_user_fingerprint', ['user_id', 'fingerprint'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_user_fingerprint')
+        batch_op.drop_column('fingerprint')
@@ -0,0 +1,26 @@
+"""add per-key rate limit to api_key
+
+Revision ID: a7c4e2f85b19
+Revises: f1b7d3a92c64
+Create Date: 2026-07-08 16:45:52.117630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e2f85b19'
+down_revision = 'f1b7d3a92c64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rate_limit', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.drop_column('rate_limit')
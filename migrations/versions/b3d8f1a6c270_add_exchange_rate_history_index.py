@@ -0,0 +1,25 @@
+"""add (from, to, date) index to exchange_rate
+
+Revision ID: b3d8f1a6c270
+Revises: a7c4e2f85b19
+Create Date: 2026-07-09 10:12:37.402518
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d8f1a6c270'
+down_revision = 'a7c4e2f85b19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('exchange_rate', schema=None) as batch_op:
+        batch_op.create_index('ix_exchange_rate_pair_date', ['from_currency', 'to_currency', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('exchange_rate', schema=None) as batch_op:
+        batch_op.drop_index('ix_exchange_rate_pair_date')
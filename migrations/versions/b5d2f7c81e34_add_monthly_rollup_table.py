@@ -0,0 +1,90 @@
+"""add monthly_rollup table
+
+Revision ID: b5d2f7c81e34
+Revises: a3c7e91f5d20
+Create Date: 2026-06-24 16:02:11.540917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d2f7c81e34'
+down_revision = 'a3c7e91f5d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    rollup = op.create_table('monthly_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('transaction_type', sa.String(length=20), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('transfer_total', sa.Float(), nullable=False),
+    sa.Column('lent_total', sa.Float(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'year', 'month', 'category_id', 'transaction_type', name='uq_monthly_rollup_key')
+    )
+    with op.batch_alter_table('monthly_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_monthly_rollup_user_period', ['user_id', 'year', 'month'], unique=False)
+
+    # Backfill with the same grouping app.rollups.rebuild_rollups uses, so
+    # existing history shows up (and later deltas land in full buckets)
+    columns = ['user_id', 'year', 'month', 'category_id', 'transaction_type',
+               'total', 'transfer_total', 'lent_total', 'count']
+    expense = sa.table('expense',
+        sa.column('id', sa.Integer),
+        sa.column('user_id', sa.Integer),
+        sa.column('amount', sa.Float),
+        sa.column('date', sa.DateTime),
+        sa.column('category_id', sa.Integer),
+        sa.column('transaction_type', sa.String),
+        sa.column('tags', sa.String),
+        sa.column('description', sa.String),
+    )
+    transfer_marked = sa.or_(
+        sa.func.lower(sa.func.coalesce(expense.c.tags, '')).like('%transfer%'),
+        sa.func.lower(sa.func.coalesce(expense.c.description, '')).like('transfer %'),
+    )
+    lent_tagged = sa.func.lower(sa.func.coalesce(expense.c.tags, '')).like('%debt_lent%')
+    year = sa.cast(sa.extract('year', expense.c.date), sa.Integer)
+    month = sa.cast(sa.extract('month', expense.c.date), sa.Integer)
+    transaction_type = sa.func.coalesce(expense.c.transaction_type, 'expense')
+    op.execute(rollup.insert().from_select(columns, sa.select(
+        expense.c.user_id, year, month, expense.c.category_id, transaction_type,
+        sa.func.sum(expense.c.amount),
+        sa.func.sum(sa.case((transfer_marked, expense.c.amount), else_=0)),
+        sa.func.sum(sa.case((sa.and_(lent_tagged, sa.not_(transfer_marked)), expense.c.amount), else_=0)),
+        sa.func.count(expense.c.id),
+    ).where(expense.c.date.isnot(None)).group_by(
+        expense.c.user_id, year, month, expense.c.category_id, transaction_type)))
+
+    for name, date_column in (('debt_payment', 'date'), ('debtor_payment', 'date'),
+                              ('contract_payment', 'payment_date')):
+        payment = sa.table(name,
+            sa.column('id', sa.Integer),
+            sa.column('user_id', sa.Integer),
+            sa.column('amount', sa.Float),
+            sa.column(date_column, sa.DateTime),
+        )
+        date = payment.c[date_column]
+        p_year = sa.cast(sa.extract('year', date), sa.Integer)
+        p_month = sa.cast(sa.extract('month', date), sa.Integer)
+        op.execute(rollup.insert().from_select(columns, sa.select(
+            payment.c.user_id, p_year, p_month, sa.literal(0), sa.literal(name),
+            sa.func.sum(payment.c.amount), sa.literal(0.0), sa.literal(0.0), sa.func.count(payment.c.id),
+        ).where(date.isnot(None)).group_by(payment.c.user_id, p_year, p_month)))
+
+
+def downgrade():
+    with op.batch_alter_table('monthly_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_monthly_rollup_user_period')
+
+    op.drop_table('monthly_rollup')
@@ -0,0 +1,26 @@
+"""add data_version to user
+
+Revision ID: c5e2a9d47b13
+Revises: b3d8f1a6c270
+Create Date: 2026-07-10 09:41:05.228614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e2a9d47b13'
+down_revision = 'b3d8f1a6c270'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,59 @@
+"""add stored is_transfer / is_money_lent flags to expense
+
+Revision ID: c8e1a4f6b203
+Revises: b5d2f7c81e34
+Create Date: 2026-06-27 11:40:05.263918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e1a4f6b203'
+down_revision = 'b5d2f7c81e34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_transfer', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column('is_money_lent', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+    # Backfill with the same rules app.classification applies on write
+    expense = sa.table('expense',
+        sa.column('category_id', sa.Integer),
+        sa.column('transaction_type', sa.String),
+        sa.column('tags', sa.String),
+        sa.column('description', sa.String),
+        sa.column('is_transfer', sa.Boolean),
+        sa.column('is_money_lent', sa.Boolean),
+    )
+    category = sa.table('category', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    transfer = sa.or_(
+        sa.func.coalesce(expense.c.transaction_type, '').in_(('transfer', 'transfer_out', 'transfer_in')),
+        sa.func.lower(sa.func.coalesce(expense.c.tags, '')).like('%transfer%'),
+        sa.func.lower(sa.func.coalesce(expense.c.description, '')).like('transfer %'),
+        expense.c.category_id.in_(sa.select(category.c.id).where(category.c.name == 'Transfer')),
+    )
+    money_lent = sa.or_(
+        expense.c.category_id.in_(sa.select(category.c.id).where(category.c.name == 'Money Lent')),
+        sa.func.lower(sa.func.coalesce(expense.c.tags, '')).like('%debt_lent%'),
+    )
+    op.execute(expense.update().values(
+        is_transfer=sa.case((transfer, True), else_=False),
+        is_money_lent=sa.case((money_lent, True), else_=False),
+    ))
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_user_transfer_type_date', ['user_id', 'is_transfer', 'transaction_type', 'date'], unique=False)
+        batch_op.create_index('ix_expense_user_lent_date', ['user_id', 'is_money_lent', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_user_lent_date')
+        batch_op.drop_index('ix_expense_user_transfer_type_date')
+        batch_op.drop_column('is_money_lent')
+        batch_op.drop_column('is_transfer')
@@ -0,0 +1,78 @@
+"""add tag and expense_tag tables, split existing expense tag strings
+
+Revision ID: d4f9b2c7e815
+Revises: c8e1a4f6b203
+Create Date: 2026-06-29 09:12:44.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f9b2c7e815'
+down_revision = 'c8e1a4f6b203'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tag = op.create_table('tag',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('tag', schema=None) as batch_op:
+        batch_op.create_index('ix_tag_user_name', ['user_id', 'name'], unique=True)
+
+    expense_tag = op.create_table('expense_tag',
+        sa.Column('expense_id', sa.Integer(), nullable=False),
+        sa.Column('tag_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['expense_id'], ['expense.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('expense_id', 'tag_id')
+    )
+    with op.batch_alter_table('expense_tag', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_tag_tag_id', ['tag_id', 'expense_id'], unique=False)
+
+    # Split the comma-separated strings the same way app.tags.parse_tags does
+    conn = op.get_bind()
+    expense = sa.table('expense',
+        sa.column('id', sa.Integer),
+        sa.column('user_id', sa.Integer),
+        sa.column('tags', sa.String),
+    )
+    rows = conn.execute(
+        sa.select(expense.c.id, expense.c.user_id, expense.c.tags)
+        .where(expense.c.tags.isnot(None), expense.c.tags != '')
+    ).fetchall()
+
+    links = []
+    for expense_id, user_id, tags in rows:
+        names = []
+        for part in tags.split(','):
+            name = part.strip().lower()[:50]
+            if name and name not in names:
+                names.append(name)
+        links.extend((expense_id, user_id, name) for name in names)
+    if not links:
+        return
+
+    op.bulk_insert(tag, [{'user_id': user_id, 'name': name}
+                         for user_id, name in sorted({(u, n) for _, u, n in links})])
+    tag_ids = {(user_id, name): tag_id for tag_id, user_id, name in conn.execute(
+        sa.select(tag.c.id, tag.c.user_id, tag.c.name)
+    )}
+    op.bulk_insert(expense_tag, [{'expense_id': expense_id, 'tag_id': tag_ids[(user_id, name)]}
+                                 for expense_id, user_id, name in links])
+
+
+def downgrade():
+    with op.batch_alter_table('expense_tag', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_tag_tag_id')
+    op.drop_table('expense_tag')
+    with op.batch_alter_table('tag', schema=None) as batch_op:
+        batch_op.drop_index('ix_tag_user_name')
+    op.drop_table('tag')
@@ -0,0 +1,57 @@
+"""add full-text search index for expense text columns
+
+Revision ID: e2a6c9d41f07
+Revises: d4f9b2c7e815
+Create Date: 2026-07-02 15:26:31.804417
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a6c9d41f07'
+down_revision = 'd4f9b2c7e815'
+branch_labels = None
+depends_on = None
+
+# Keep in step with app.search
+COLUMNS = ('description', 'income_source', 'project_type', 'notes', 'tags')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    cols = ', '.join(COLUMNS)
+
+    if dialect == 'sqlite':
+        new = ', '.join(f'new.{c}' for c in COLUMNS)
+        old = ', '.join(f'old.{c}' for c in COLUMNS)
+        delete_old = f"INSERT INTO expense_fts(expense_fts, rowid, {cols}) VALUES ('delete', old.id, {old});"
+        insert_new = f"INSERT INTO expense_fts(rowid, {cols}) VALUES (new.id, {new});"
+        op.execute(
+            f"CREATE VIRTUAL TABLE expense_fts USING fts5({cols}, "
+            "content='expense', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        op.execute(f"CREATE TRIGGER expense_fts_ai AFTER INSERT ON expense BEGIN {insert_new} END")
+        op.execute(f"CREATE TRIGGER expense_fts_ad AFTER DELETE ON expense BEGIN {delete_old} END")
+        op.execute(f"CREATE TRIGGER expense_fts_au AFTER UPDATE OF {cols} ON expense BEGIN {delete_old} {insert_new} END")
+        op.execute("INSERT INTO expense_fts(expense_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        document = " || ' ' || ".join(f"coalesce({c}, '')" for c in COLUMNS)
+        op.execute(f"CREATE INDEX ix_expense_search ON expense USING GIN (to_tsvector('simple', {document}))")
+    elif dialect in ('mysql', 'mariadb'):
+        op.execute(f"CREATE FULLTEXT INDEX ix_expense_fulltext ON expense ({cols})")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS expense_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS expense_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS expense_fts_ai")
+        op.execute("DROP TABLE IF EXISTS expense_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_expense_search")
+    elif dialect in ('mysql', 'mariadb'):
+        op.execute("DROP INDEX ix_expense_fulltext ON expense")
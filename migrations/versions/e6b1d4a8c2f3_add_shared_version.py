@@ -0,0 +1,30 @@
+"""add shared_version table
+
+Revision ID: e6b1d4a8c2f3
+Revises: a7c4e1f93d52
+Create Date: 2026-10-18 09:12:44.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b1d4a8c2f3'
+down_revision = 'a7c4e1f93d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    shared_version = op.create_table('shared_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(shared_version, [{'name': 'fx_rates', 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('shared_version')
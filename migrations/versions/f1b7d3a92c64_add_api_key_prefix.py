@@ -0,0 +1,29 @@
+"""add indexed public key prefix to api_key
+
+Revision ID: f1b7d3a92c64
+Revises: e2a6c9d41f07
+Create Date: 2026-07-06 10:03:17.442915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b7d3a92c64'
+down_revision = 'e2a6c9d41f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing keys keep their PBKDF2 hash and a NULL prefix until first use
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('key_prefix', sa.String(length=16), nullable=True))
+        batch_op.create_index(batch_op.f('ix_api_key_key_prefix'), ['key_prefix'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_api_key_key_prefix'))
+        batch_op.drop_column('key_prefix')
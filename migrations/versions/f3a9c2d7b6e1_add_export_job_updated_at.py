@@ -0,0 +1,26 @@
+"""add export_job.updated_at heartbeat
+
+Revision ID: f3a9c2d7b6e1
+Revises: e6b1d4a8c2f3
+Create Date: 2026-10-18 14:37:05.912447
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c2d7b6e1'
+down_revision = 'e6b1d4a8c2f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('export_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('export_job', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
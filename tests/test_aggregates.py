@@ -0,0 +1,205 @@
+from datetime import datetime
+
+
+def _seed(db):
+    from app.models import Category, Creditor, DebtPayment, Expense, FinancialSummary, User, Wallet
+
+    user = User(email='aggregates-test@example.com', name='Aggregates Tester')
+    user.set_password('testpassword123')
+    db.session.add(user)
+    db.session.commit()
+    wallet = Wallet(user_id=user.id, name='Cash', balance=1000.00, currency='GHS')
+    food = Category(user_id=user.id, name='Food', icon='F')
+    salary = Category(user_id=user.id, name='Salary', icon='S')
+    lent = Category(user_id=user.id, name='Money Lent', icon='L')
+    db.session.add_all([wallet, food, salary, lent])
+    db.session.commit()
+
+    def add(amount, category, when, transaction_type='expense', **extra):
+        db.session.add(Expense(user_id=user.id, amount=amount, description=extra.pop('description', 'Item'),
+                               category_id=category.id, wallet_id=wallet.id,
+                               transaction_type=transaction_type, date=when, **extra))
+
+    add(40.0, food, datetime(2026, 1, 5))
+    add(500.0, salary, datetime(2026, 1, 28), 'income')
+    add(25.0, food, datetime(2026, 2, 3), description='Transfer to Savings')
+    add(60.0, food, datetime(2026, 2, 14))
+    add(100.0, lent, datetime(2026, 2, 20))
+    add(999.0, food, datetime(2026, 3, 1))
+    creditor = Creditor(user_id=user.id, name='Bank', amount=500.0)
+    db.session.add(creditor)
+    db.session.commit()
+    db.session.add(DebtPayment(user_id=user.id, creditor_id=creditor.id, amount=30.0, date=datetime(2026, 2, 10)))
+    # March is covered by a historical summary, 2025 by a yearly one
+    db.session.add(FinancialSummary(user_id=user.id, year=2026, month=3, total_income=10.0, total_expense=20.0))
+    db.session.add(FinancialSummary(user_id=user.id, year=2025, month=None, total_income=900.0, total_expense=800.0))
+    db.session.commit()
+    return user.id
+
+
+def test_monthly_totals_merge_summaries_in_constant_queries():
+    """Month totals should come from O(1) queries and honour FinancialSummary overrides."""
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.aggregates import monthly_totals, yearly_totals
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user_id = _seed(db)
+            months = [(2026, m) for m in range(1, 13)]
+
+            statements = []
+
+            def count_statement(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', count_statement)
+            try:
+                converted = monthly_totals(user_id, months, currency='GHS')
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count_statement)
+            rolled = monthly_totals(user_id, months)
+
+            # Category ids + Expense + three payment tables + summaries
+            assert len(statements) <= 6
+
+            feb = converted[(2026, 2)]
+            assert (feb.expense, feb.lent, feb.debt_payment) == (160.0, 100.0, 30.0)
+            assert feb.total_expense == 190.0
+            assert feb.actual_expense == 60.0
+            assert converted[(2026, 1)].income == 500.0
+            assert converted[(2026, 3)].summary is not None
+            assert converted[(2026, 3)].total_expense == 20.0
+
+            for period in months:
+                assert vars(rolled[period]) == vars(converted[period])
+
+            years = yearly_totals(user_id, [2025, 2026])
+            assert years[2025].total_income == 900.0
+            assert years[2026].total_expense == 40.0 + 190.0 + 20.0
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_range_totals_handles_overlapping_periods():
+    """Overlapping ranges should each see the rows inside them."""
+    from app import create_app, db
+    from app.aggregates import range_totals
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user_id = _seed(db)
+            periods = range_totals(user_id, {
+                'all': (None, None),
+                'february': (datetime(2026, 2, 1), datetime(2026, 3, 1)),
+                'since_feb': (datetime(2026, 2, 1), None),
+            })
+
+            assert periods['all'].expense == 40.0 + 60.0 + 100.0 + 999.0
+            assert periods['february'].expense == 160.0
+            assert periods['february'].debt_payment == 30.0
+            assert periods['since_feb'].expense == 160.0 + 999.0
+            assert periods['since_feb'].income == 0.0
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_lent_totals_leave_out_transfers():
+    """Money-lent transfers count as neither spending nor money lent, live or rolled up."""
+    from app import create_app, db
+    from app.aggregates import monthly_totals, range_totals
+    from app.models import Category, Expense, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user_id = _seed(db)
+            lent = Category.query.filter_by(user_id=user_id, name='Money Lent').one()
+            food = Category.query.filter_by(user_id=user_id, name='Food').one()
+            wallet = Wallet.query.filter_by(user_id=user_id).one()
+            db.session.add_all([
+                Expense(user_id=user_id, amount=70.0, description='Transfer to Ama', category_id=lent.id,
+                        wallet_id=wallet.id, date=datetime(2026, 2, 21)),
+                Expense(user_id=user_id, amount=80.0, description='Loan', tags='debt_lent,transfer',
+                        category_id=food.id, wallet_id=wallet.id, date=datetime(2026, 2, 22)),
+            ])
+            db.session.commit()
+
+            february = range_totals(user_id, {'february': (datetime(2026, 2, 1), datetime(2026, 3, 1))})['february']
+            assert (february.expense, february.lent) == (160.0, 100.0)
+            rolled = monthly_totals(user_id, [(2026, 2)], summaries=False)[(2026, 2)]
+            converted = monthly_totals(user_id, [(2026, 2)], currency='GHS', summaries=False)[(2026, 2)]
+            assert (rolled.expense, rolled.lent) == (converted.expense, converted.lent) == (160.0, 100.0)
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_category_totals_convert_in_one_grouped_query():
+    """Category totals should join the current rates in SQL and keep the legacy original_amount rule."""
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.aggregates import category_totals
+    from app.models import Category, ExchangeRate, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='category-totals-test@example.com', name='Category Totals Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            ghs = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            usd = Wallet(user_id=user.id, name='Dollars', balance=0, currency='USD')
+            eur = Wallet(user_id=user.id, name='Euros', balance=0, currency='EUR')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            travel = Category(user_id=user.id, name='Travel', icon='T')
+            db.session.add_all([ghs, usd, eur, food, travel])
+            db.session.add_all([
+                ExchangeRate(from_currency='USD', to_currency='GHS', rate=10.0, date=datetime(2025, 1, 1)),
+                ExchangeRate(from_currency='USD', to_currency='GHS', rate=15.0, date=datetime(2026, 1, 1)),
+                # Only stored as GHS -> EUR; inverted
+                ExchangeRate(from_currency='GHS', to_currency='EUR', rate=0.05, date=datetime(2026, 1, 1)),
+            ])
+            db.session.commit()
+
+            def add(amount, category, wallet, **extra):
+                db.session.add(Expense(user_id=user.id, amount=amount, description='Item', category_id=category.id,
+                                       wallet_id=wallet.id, date=datetime(2026, 2, 1), **extra))
+
+            add(40.0, food, ghs)
+            add(2.0, food, usd)
+            add(3.0, travel, eur)
+            # Legacy row: GHS wallet but the amount was never converted from USD
+            add(4.0, travel, ghs, original_amount=4.0, original_currency='USD')
+            add(7.0, travel, ghs, transaction_type='income')
+            db.session.commit()
+
+            user_id, food_id, travel_id = user.id, food.id, travel.id
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                totals = category_totals(user_id, 'GHS', Expense.transaction_type == 'expense')
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert len(statements) == 1
+            assert totals == {food_id: 70.0, travel_id: 120.0}
+        finally:
+            db.session.remove()
+            db.drop_all()
@@ -0,0 +1,101 @@
+def test_api_keys_resolve_by_prefix_and_rehash_legacy_keys():
+    """Keys should be found by prefix once per request; legacy PBKDF2 keys upgrade on first use."""
+    from sqlalchemy import event
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import ApiKey, User
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='api-keys-test@example.com', name='API Keys Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            raw_key = ApiKey.generate_key()
+            assert raw_key.startswith('ft_')
+            key = ApiKey(user_id=user.id, name='new', permissions='read')
+            key.set_key(raw_key)
+            legacy = ApiKey(user_id=user.id, name='old', permissions='read',
+                            key_hash=generate_password_hash('legacy-raw-key'))
+            disabled_raw = ApiKey.generate_key()
+            disabled = ApiKey(user_id=user.id, name='off', permissions='read', is_active=False)
+            disabled.set_key(disabled_raw)
+            db.session.add_all([key, legacy, disabled])
+            db.session.commit()
+            assert key.key_hash.startswith('sha256$') and raw_key not in key.key_hash
+
+            client = app.test_client()
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                if 'FROM api_key' in statement:
+                    statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                response = client.get('/api/v1/wallets', headers={'X-API-Key': raw_key})
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert response.status_code == 200
+            # Rate limiter and auth decorator share one lookup
+            assert len(statements) == 1
+            assert 'key_prefix' in statements[0]
+
+            assert client.get('/api/v1/wallets', headers={'X-API-Key': raw_key[:-1] + '!'}).status_code == 401
+            assert client.get('/api/v1/wallets', headers={'X-API-Key': disabled_raw}).status_code == 401
+
+            assert client.get('/api/v1/wallets', headers={'X-API-Key': 'legacy-raw-key'}).status_code == 200
+            db.session.expire_all()
+            legacy = db.session.get(ApiKey, legacy.id)
+            assert legacy.key_prefix is not None and not legacy.is_legacy
+            assert client.get('/api/v1/wallets', headers={'X-API-Key': 'legacy-raw-key'}).status_code == 200
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_unknown_prefixed_keys_skip_the_legacy_scan(monkeypatch):
+    """A bad ``ft_`` key is rejected without hashing it against every legacy row."""
+    from werkzeug import security
+    from werkzeug.security import generate_password_hash
+    import app.api as api
+    from app import create_app, db
+    from app.models import ApiKey, User
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='api-keys-legacy@example.com', name='API Keys Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            db.session.add_all([
+                ApiKey(user_id=user.id, name='old', permissions='read', key_hash=generate_password_hash('old-key')),
+                ApiKey(user_id=user.id, name='off', permissions='read', is_active=False,
+                       key_hash=generate_password_hash('off-key')),
+            ])
+            db.session.commit()
+
+            checked = []
+
+            def check_password_hash(pwhash, password):
+                checked.append(password)
+                return security.check_password_hash(pwhash, password)
+
+            monkeypatch.setattr(api, 'check_password_hash', check_password_hash)
+
+            assert api.find_api_key(ApiKey.generate_key()) is None
+            assert checked == []
+            # Inactive legacy rows are never hashed against
+            assert api.find_api_key('off-key') is None
+            assert checked == ['off-key']
+            assert api.find_api_key('old-key').name == 'old'
+        finally:
+            db.session.remove()
+            db.drop_all()
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+
+def test_api_cursor_pages_and_cached_counts():
+    """?cursor= should walk the full history once; include_total=false should skip the COUNT."""
+    from sqlalchemy import event
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.api import count_cache
+    from app.models import ApiKey, Category, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='api-pages-test@example.com', name='API Pages Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, food,
+                                ApiKey(user_id=user.id, name='sync', key_hash=generate_password_hash('sync-key'))])
+            db.session.commit()
+            start = datetime(2026, 1, 1)
+            for i in range(45):
+                db.session.add(Expense(user_id=user.id, amount=1.0, description=f'Item {i}', category_id=food.id,
+                                       wallet_id=wallet.id, date=start + timedelta(days=i // 3)))
+            db.session.commit()
+            count_cache.clear()
+
+            client = app.test_client()
+            headers = {'X-API-Key': 'sync-key'}
+
+            seen, cursor = [], ''
+            while cursor is not None:
+                response = client.get('/api/v1/transactions', headers=headers,
+                                      query_string={'cursor': cursor, 'per_page': 20})
+                assert response.status_code == 200
+                body = response.get_json()
+                assert body['meta']['total'] == 45
+                seen += [row['id'] for row in body['data']]
+                cursor = body['meta']['next_cursor']
+            expected = Expense.query.order_by(Expense.date.desc(), Expense.id.desc()).all()
+            assert seen == [e.id for e in expected]
+            # Three pages, one COUNT between them
+            assert len(count_cache) == 1
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                body = client.get('/api/v1/transactions?page=2&per_page=20&include_total=false',
+                                  headers=headers).get_json()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert 'total' not in body['meta']
+            assert [row['id'] for row in body['data']] == seen[20:40]
+            assert not any('count(' in s.lower() for s in statements)
+
+            assert client.get('/api/v1/creditors?cursor=', headers=headers).get_json()['meta']['next_cursor'] is None
+
+            response = client.get('/api/v1/transactions?cursor=garbage', headers=headers)
+            assert response.status_code == 400
+            assert response.get_json()['error'] == 'Invalid cursor'
+        finally:
+            db.session.remove()
+            db.drop_all()
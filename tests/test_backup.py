@@ -0,0 +1,114 @@
+import gzip
+import io
+import json
+from datetime import datetime
+
+
+def test_streaming_backup_round_trip():
+    """Backups stream as checksummed gzip'd JSON Lines with a fixed number of queries, and restore."""
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.backups import document_checksum
+    from app.models import (BackupHistory, Category, Expense, Goal, GoalTask, Project, ProjectItem,
+                            ProjectItemPayment, User, Wallet)
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='backup-test@example.com', name='Backup Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            uid = user.id
+            wallet = Wallet(user_id=uid, name='Cash', balance=50.0, currency='GHS')
+            food = Category(user_id=uid, name='Food', icon='F')
+            db.session.add_all([wallet, food])
+            db.session.commit()
+
+            def add_children(projects):
+                for n in range(projects):
+                    project = Project(user_id=uid, name=f'Project {n}', funding_source='Self', wallet_id=wallet.id)
+                    goal = Goal(user_id=uid, name=f'Goal {n}', target_amount=100)
+                    db.session.add_all([project, goal])
+                    db.session.flush()
+                    item = ProjectItem(user_id=uid, project_id=project.id, item_name='Cement', cost=10)
+                    db.session.add_all([item, GoalTask(user_id=uid, goal_id=goal.id, title='Save')])
+                    db.session.flush()
+                    db.session.add(ProjectItemPayment(user_id=uid, project_item_id=item.id, amount=5))
+                db.session.commit()
+
+            add_children(2)
+            for day in range(1, 6):
+                db.session.add(Expense(user_id=uid, amount=day, description=f'Lunch {day}', category_id=food.id,
+                                       wallet_id=wallet.id, date=datetime(2026, 1, day)))
+            db.session.commit()
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(uid)
+
+            def backup():
+                statements = []
+
+                def record(conn, cursor, statement, *args):
+                    if statement.lstrip().upper().startswith('SELECT'):
+                        statements.append(statement)
+
+                event.listen(db.engine, 'before_cursor_execute', record)
+                try:
+                    response = client.post('/backup/create')
+                    body = response.get_data()
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', record)
+                assert response.status_code == 200
+                return body, len(statements)
+
+            body, queries = backup()
+            add_children(3)
+            _, more_queries = backup()
+            # Children are loaded per batch, not per parent
+            assert more_queries == queries
+
+            lines = gzip.decompress(body).splitlines(keepends=True)
+            entries = [json.loads(line) for line in lines]
+            assert entries[0]['backup']['backup_version'] == '3.0'
+            sections = [e['section'] for e in entries if 'section' in e]
+            assert sections[:3] == ['wallets', 'categories', 'expenses']
+            projects = [e['record'] for e in entries[entries.index({'section': 'projects'}) + 1:]
+                        if 'record' in e][:2]
+            assert projects[0]['items'][0]['payments'][0]['amount'] == 5
+            end = entries[-1]['end']
+            # 1 wallet, 1 category, 5 expenses, 2 projects + 2 items + 2 payments, 2 goals + 2 tasks
+            assert end['record_count'] == 17
+            history = BackupHistory.query.filter_by(user_id=uid, backup_type='manual').first()
+            assert (history.checksum, history.record_count, history.file_size) == (end['checksum'], 17, len(body))
+
+            def verify(data, name):
+                response = client.post('/backup/verify', data={'file': (io.BytesIO(data), name)},
+                                       content_type='multipart/form-data')
+                return response.get_json()
+
+            assert verify(body, 'backup.jsonl.gz')['valid'] is True
+            tampered = gzip.compress(b''.join(lines).replace(b'"Lunch 3"', b'"Lunch 9"'))
+            assert verify(tampered, 'backup.jsonl.gz')['valid'] is False
+            truncated = gzip.compress(b''.join(lines[:-1]))
+            assert verify(truncated, 'backup.jsonl.gz')['valid'] is False
+
+            # Version 2.0 JSON backups still verify
+            legacy = {'wallets': [{'name': 'Cash'}], 'backup_version': '2.0'}
+            legacy['checksum'] = document_checksum(legacy)
+            assert verify(json.dumps(legacy, indent=2).encode(), 'old.json')['valid'] is True
+
+            response = client.post('/backup/restore', data={
+                'file': (io.BytesIO(body), 'backup.jsonl.gz'), 'restore_mode': 'replace',
+            }, content_type='multipart/form-data')
+            assert response.status_code == 302
+            assert Expense.query.filter_by(user_id=uid).count() == 5
+            assert Project.query.filter_by(user_id=uid).count() == 2
+            assert ProjectItemPayment.query.filter_by(user_id=uid).count() == 2
+            assert BackupHistory.query.filter_by(user_id=uid, backup_type='restore').one().record_count == 17
+        finally:
+            db.session.remove()
+            db.drop_all()
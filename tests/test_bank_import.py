@@ -0,0 +1,379 @@
+import io
+from datetime import datetime
+
+
+def test_fingerprint_normalizes_day_amount_and_description():
+    from app.fingerprints import fingerprint
+
+    base = fingerprint(datetime(2026, 3, 4, 9, 30), -12.5, 'Shoprite  Accra')
+    assert fingerprint(datetime(2026, 3, 4, 18, 0), 12.50, ' shoprite accra ') == base
+    assert fingerprint(datetime(2026, 3, 5), 12.5, 'Shoprite Accra') != base
+    assert fingerprint(datetime(2026, 3, 4), 12.51, 'Shoprite Accra') != base
+    assert len(base) == 64
+
+
+def test_import_skips_duplicates_with_one_lookup_query():
+    """Duplicates across a whole statement should be found with a single indexed IN query."""
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.fingerprints import refingerprint_expenses
+    from app.models import Category, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='bank-import-test@example.com', name='Bank Import Tester')
+            other = User(email='bank-import-other@example.com', name='Other Tester')
+            for u in (user, other):
+                u.set_password('testpassword123')
+            db.session.add_all([user, other])
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Bank', balance=100.0, currency='GHS')
+            other_wallet = Wallet(user_id=other.id, name='Bank', balance=0, currency='GHS')
+            other_cat = Category(user_id=user.id, name='Other', icon='O')
+            db.session.add_all([wallet, other_wallet, other_cat])
+            db.session.commit()
+            db.session.add_all([
+                Expense(user_id=user.id, amount=25.0, description='Shoprite Accra', category_id=other_cat.id,
+                        wallet_id=wallet.id, date=datetime(2026, 3, 4, 14, 0)),
+                Expense(user_id=other.id, amount=40.0, description='Uber trip', category_id=other_cat.id,
+                        wallet_id=other_wallet.id, date=datetime(2026, 3, 5)),
+            ])
+            db.session.commit()
+            user_id, wallet_id = user.id, wallet.id
+            assert db.session.query(Expense).filter_by(user_id=user_id).one().fingerprint
+
+            csv_body = ('Date,Description,Amount\n'
+                        '2026-03-04,SHOPRITE ACCRA,-25.00\n'
+                        '2026-03-05,Uber trip,-40.00\n'
+                        '2026-03-06,Salary,500.00\n')
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+
+            preview = client.post('/banking/check-duplicates', data={
+                'file': (io.BytesIO(csv_body.encode()), 'statement.csv'),
+            }, content_type='multipart/form-data')
+            assert preview.get_json() == {'duplicates': 1, 'total': 3}
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                if 'expense.fingerprint' in statement and statement.lstrip().upper().startswith('SELECT'):
+                    statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                response = client.post('/banking/import', data={
+                    'file': (io.BytesIO(csv_body.encode()), 'statement.csv'),
+                    'wallet_id': str(wallet_id),
+                    'skip_duplicates': 'on',
+                }, content_type='multipart/form-data')
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert response.status_code == 302
+            assert len(statements) == 1
+
+            descriptions = sorted(e.description for e in Expense.query.filter_by(user_id=user_id))
+            assert descriptions == ['Salary', 'Shoprite Accra', 'Uber trip']
+            assert db.session.get(Wallet, wallet_id).balance == 100.0 - 40.0 + 500.0
+
+            # Rows written around the hook are repaired by the maintenance pass
+            db.session.execute(Expense.__table__.update().values(fingerprint=None))
+            assert refingerprint_expenses(user_id) == 3
+            db.session.commit()
+            assert Expense.query.filter(Expense.user_id == user_id, Expense.fingerprint.is_(None)).count() == 0
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_statement_import_commits_in_chunks_and_keeps_derived_data():
+    """Bulk-inserted chunks should carry the flags, tags, rollups and balance the flush hooks would set."""
+    from app import create_app, db
+    from app.bank_import import StatementImport
+    from app.models import Category, Expense, ImportHistory, MonthlyRollup, User, Wallet
+    from app.rollups import rebuild_rollups
+    from app.tags import has_tag
+
+    app = create_app('testing')
+
+    def statement():
+        yield {'amount': -10.0, 'description': 'Shoprite groceries', 'date': datetime(2026, 1, 5)}
+        yield {'amount': 200.0, 'description': 'Salary January', 'date': datetime(2026, 1, 28)}
+        yield {'amount': -10.0, 'description': 'Shoprite groceries', 'date': datetime(2026, 1, 5)}
+        yield {'amount': -50.0, 'description': 'Momo transfer to Ama', 'date': datetime(2026, 2, 2)}
+        yield {'amount': -7.5, 'description': 'Unknown merchant', 'date': datetime(2026, 2, 3)}
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='statement-import-test@example.com', name='Statement Import Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Bank', balance=100.0, currency='GHS')
+            db.session.add_all([wallet] + [Category(user_id=user.id, name=name, icon='C')
+                                           for name in ('Food', 'Salary', 'Transfer', 'Other')])
+            db.session.commit()
+            user_id, wallet_id = user.id, wallet.id
+
+            importer = StatementImport(user_id, wallet, 'statement.csv', chunk_rows=2)
+            history = importer.run(statement())
+            assert (history.status, history.records_imported) == ('completed', 5)
+            # Repeated lines within one statement are separate transactions
+            assert (importer.skipped, importer.categorized) == (0, 4)
+            assert db.session.get(Wallet, wallet_id).balance == 100.0 - 10 + 200 - 10 - 50 - 7.5
+
+            expenses = Expense.query.filter_by(user_id=user_id).all()
+            assert all(e.fingerprint for e in expenses)
+            assert [e.description for e in expenses if e.is_transfer] == ['Momo transfer to Ama']
+            assert Expense.query.filter(Expense.user_id == user_id, has_tag(user_id, 'imported')).count() == 5
+
+            rollups = sorted((r.year, r.month, r.category_id, r.transaction_type, r.total, r.count)
+                             for r in MonthlyRollup.query.filter_by(user_id=user_id))
+            rebuild_rollups(user_id)
+            db.session.commit()
+            assert rollups == sorted((r.year, r.month, r.category_id, r.transaction_type, r.total, r.count)
+                                     for r in MonthlyRollup.query.filter_by(user_id=user_id))
+
+            # Importing it again skips everything
+            again = StatementImport(user_id, db.session.get(Wallet, wallet_id), 'statement.csv', chunk_rows=2)
+            assert again.run(statement()).records_imported == 0
+            assert again.skipped == 5
+
+            def broken():
+                yield {'amount': -3.0, 'description': 'Kiosk', 'date': datetime(2026, 3, 1)}
+                yield {'amount': -4.0, 'description': 'Kiosk', 'date': datetime(2026, 3, 2)}
+                raise ValueError('bad row 3')
+
+            stopped = StatementImport(user_id, db.session.get(Wallet, wallet_id), 'broken.csv', chunk_rows=2)
+            history = stopped.run(broken())
+            assert (history.status, history.records_imported, history.notes) == ('partial', 2, 'bad row 3')
+            assert db.session.get(Wallet, wallet_id).balance == 222.5 - 7.0
+            assert StatementImport(user_id, db.session.get(Wallet, wallet_id), 'empty.csv').run(iter(())) is None
+            assert ImportHistory.query.filter_by(user_id=user_id).count() == 3
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_statement_import_without_executemany_returning():
+    """Dialects without executemany RETURNING (MySQL) must still tag exactly the imported rows."""
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.bank_import import StatementImport
+    from app.models import Category, Expense, User, Wallet
+    from app.tags import has_tag
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        dialect = db.engine.dialect
+        saved = dialect.insert_executemany_returning, dialect.use_insertmanyvalues
+        dialect.insert_executemany_returning = dialect.use_insertmanyvalues = False
+        try:
+            user = User(email='no-returning-test@example.com', name='No Returning Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Bank', balance=0, currency='GHS')
+            other = Category(user_id=user.id, name='Other', icon='O')
+            db.session.add_all([wallet, other])
+            db.session.commit()
+            # Same fingerprint as a statement line, entered by hand before the import
+            db.session.add(Expense(user_id=user.id, amount=3.0, description='Kiosk', category_id=other.id,
+                                   wallet_id=wallet.id, date=datetime(2026, 3, 1)))
+            db.session.commit()
+            user_id = user.id
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            def statement():
+                yield {'amount': -3.0, 'description': 'Kiosk', 'date': datetime(2026, 3, 1)}
+                yield {'amount': -4.0, 'description': 'Kiosk', 'date': datetime(2026, 3, 2)}
+                yield {'amount': 9.0, 'description': 'Refund', 'date': datetime(2026, 3, 3)}
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                importer = StatementImport(user_id, wallet, 'statement.csv', skip_duplicates=False, chunk_rows=2)
+                history = importer.run(statement())
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert (history.status, history.records_imported) == ('completed', 3)
+            assert not any('RETURNING' in s.upper() for s in statements)
+
+            imported = Expense.query.filter(Expense.user_id == user_id, has_tag(user_id, 'imported'))
+            assert sorted(e.date.day for e in imported) == [1, 2, 3]
+            assert Expense.query.filter_by(user_id=user_id).count() == 4
+        finally:
+            dialect.insert_executemany_returning, dialect.use_insertmanyvalues = saved
+            db.session.remove()
+            db.drop_all()
+
+
+def test_excel_statement_import():
+    from openpyxl import Workbook
+    from app import create_app, db
+    from app.models import Category, Expense, ImportHistory, User, Wallet
+
+    app = create_app('testing')
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Posting Date', 'Narration', 'Amount'])
+    sheet.append([datetime(2026, 4, 1), 'Uber ride', -30])
+    sheet.append([None, None, None])
+    sheet.append(['02/04/2026', 'Netflix', '-1,200.00'])
+    upload = io.BytesIO()
+    workbook.save(upload)
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='excel-import-test@example.com', name='Excel Import Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Bank', balance=0, currency='GHS')
+            db.session.add_all([wallet, Category(user_id=user.id, name='Other', icon='O')])
+            db.session.commit()
+            user_id, wallet_id = user.id, wallet.id
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+            response = client.post('/banking/import', data={
+                'file': (io.BytesIO(upload.getvalue()), 'statement.xlsx'), 'wallet_id': str(wallet_id),
+            }, content_type='multipart/form-data')
+            assert response.status_code == 302
+
+            rows = sorted((e.date, e.description, e.amount) for e in Expense.query.filter_by(user_id=user_id))
+            assert rows == [(datetime(2026, 4, 1), 'Uber ride', 30.0), (datetime(2026, 4, 2), 'Netflix', 1200.0)]
+            assert ImportHistory.query.filter_by(user_id=user_id).one().status == 'completed'
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_statement_lines_match_within_tolerance_windows():
+    from app.reconciliation import LedgerEntry, StatementLine, match_lines
+
+    def line(index, day, amount, description):
+        return StatementLine(index, datetime(2026, 5, day), amount, description)
+
+    def entry(expense_id, day, amount, t_type, description):
+        return LedgerEntry(expense_id, datetime(2026, 5, day), amount, t_type, description)
+
+    lines = [
+        line(0, 2, -25.00, 'POS SHOPRITE ACCRA'),   # posted a day late
+        line(1, 3, 500.00, 'SALARY MAY'),
+        line(2, 4, -5.00, 'CAFE'),                   # two identical coffees: either will do
+        line(3, 4, -5.00, 'CAFE'),
+        line(4, 6, -40.00, 'TRANSFER'),              # two different 40.00 rows tie
+        line(5, 20, -99.00, 'Unknown'),
+    ]
+    entries = [
+        entry(1, 1, 25.00, 'expense', 'Shoprite Accra'),
+        entry(2, 1, 25.00, 'income', 'Shoprite refund'),   # wrong direction
+        entry(3, 3, 500.001, 'income', 'Salary'),
+        entry(4, 4, 5.00, 'expense', 'Cafe'),
+        entry(5, 4, 5.00, 'expense', 'Cafe'),
+        entry(6, 6, 40.00, 'transfer_out', 'To Ama'),
+        entry(7, 6, 40.00, 'expense', 'Airtime'),
+        entry(8, 12, 25.00, 'expense', 'Shoprite Accra'),  # outside the date window
+    ]
+    result = match_lines(lines, entries)
+
+    assert [(l.index, e.id) for l, e in result.matched] == [(0, 1), (1, 3), (2, 4), (3, 5)]
+    assert [(l.index, sorted(e.id for e in found)) for l, found in result.ambiguous] == [(4, [6, 7])]
+    assert [l.index for l in result.unmatched] == [5]
+    assert sorted(e.id for e in result.missing) == [2, 6, 7, 8]
+    assert not result.balanced
+
+
+def test_reconcile_with_statement_file():
+    import time
+    from app import create_app, db
+    from app.models import BankReconciliation, Category, Expense, User, Wallet
+    from app.reconciliation import match_statement
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='reconcile-test@example.com', name='Reconcile Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Bank', balance=0, currency='GHS')
+            other = Category(user_id=user.id, name='Other', icon='O')
+            db.session.add_all([wallet, other])
+            db.session.commit()
+            user_id, wallet_id = user.id, wallet.id
+
+            db.session.add_all([
+                Expense(user_id=user_id, amount=25.0, description='Shoprite Accra', category_id=other.id,
+                        wallet_id=wallet_id, date=datetime(2026, 3, 4)),
+                Expense(user_id=user_id, amount=12.0, description='Bolt ride', category_id=other.id,
+                        wallet_id=wallet_id, date=datetime(2026, 3, 5)),
+            ])
+            db.session.commit()
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+            csv_body = ('Date,Description,Amount\n'
+                        '2026-03-05,SHOPRITE ACCRA,-25.00\n'
+                        '2026-03-06,Bank charge,-2.00\n')
+            response = client.post('/banking/reconcile', data={
+                'wallet_id': str(wallet_id), 'statement_balance': '-27.00', 'notes': 'March',
+                'statement_file': (io.BytesIO(csv_body.encode()), 'march.csv'),
+            }, content_type='multipart/form-data')
+            assert response.status_code == 200
+            assert b'Bank charge' in response.data and b'Bolt ride' in response.data
+
+            record = BankReconciliation.query.filter_by(user_id=user_id).one()
+            assert record.status == 'discrepancy'
+            assert record.notes.startswith('March. Lines: 1 matched, 0 ambiguous, 1 unmatched; 1 wallet')
+
+            # Unreadable files are reported, not a server error
+            oversized_field = b'Date,Amount\n"' + b'x' * 200000 + b'",1\n'
+            for body, name in ((b'not a zip file', 'march.xlsx'), (oversized_field, 'march.csv')):
+                response = client.post('/banking/reconcile', data={
+                    'wallet_id': str(wallet_id), 'statement_balance': '-27.00',
+                    'statement_file': (io.BytesIO(body), name),
+                }, content_type='multipart/form-data')
+                assert response.status_code == 302
+                with client.session_transaction() as sess:
+                    assert sess.pop('_flashes')[0][1].startswith('Could not read the statement')
+            assert BankReconciliation.query.filter_by(user_id=user_id).count() == 1
+
+            # A 10k-line statement against as many transactions stays well under a second of matching
+            base = datetime(2025, 1, 1)
+            db.session.execute(Expense.__table__.insert(), [
+                {'user_id': user_id, 'amount': 1 + (i % 700) / 4, 'description': f'Merchant {i % 97}',
+                 'category_id': other.id, 'wallet_id': wallet_id, 'transaction_type': 'expense',
+                 'date': base.replace(day=1 + i % 28, month=1 + (i // 28) % 12)}
+                for i in range(10000)
+            ])
+            db.session.commit()
+            statement = [{'date': base.replace(day=1 + i % 28, month=1 + (i // 28) % 12),
+                          'amount': -(1 + (i % 700) / 4), 'description': f'MERCHANT {i % 97}'}
+                         for i in range(10000)]
+            started = time.perf_counter()
+            result = match_statement(user_id, wallet_id, statement)
+            elapsed = time.perf_counter() - started
+            assert len(result.matched) + len(result.ambiguous) + len(result.unmatched) == 10000
+            assert len(result.matched) == 10000
+            assert elapsed < 5
+        finally:
+            db.session.remove()
+            db.drop_all()
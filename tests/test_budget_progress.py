@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+
+def test_budget_progress_uses_one_query_for_every_window():
+    """Weekly, monthly, yearly and custom budgets should be summed in one statement."""
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.budgets import BudgetProgress, period_starts
+    from app.models import Budget, Category, Expense, User, Wallet
+
+    app = create_app('testing')
+    now = datetime.utcnow()
+    starts = period_starts(now)
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='budget-progress-test@example.com', name='Budget Progress Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            fun = Category(user_id=user.id, name='Fun', icon='E')
+            db.session.add_all([wallet, food, fun])
+            db.session.commit()
+
+            def add(amount, category, when, transaction_type='expense'):
+                db.session.add(Expense(user_id=user.id, amount=amount, description='Item', category_id=category.id,
+                                       wallet_id=wallet.id, transaction_type=transaction_type, date=when))
+
+            add(10.0, food, now)
+            add(20.0, food, starts['weekly'] - timedelta(seconds=1))
+            add(40.0, food, starts['yearly'] - timedelta(days=1))
+            add(99.0, food, now, transaction_type='income')
+            add(5.0, fun, now - timedelta(days=20))
+            add(7.0, fun, now - timedelta(days=2))
+
+            week_start = starts['weekly']
+            budgets = {
+                'weekly': Budget(user_id=user.id, category_id=food.id, amount=10.0, period='weekly', start_date=now),
+                'monthly': Budget(user_id=user.id, category_id=food.id, amount=100.0, period='monthly', start_date=now),
+                'yearly': Budget(user_id=user.id, category_id=food.id, amount=1000.0, period='yearly', start_date=now),
+                'custom': Budget(user_id=user.id, category_id=fun.id, amount=8.0, period='custom',
+                                 start_date=now - timedelta(days=30), end_date=now - timedelta(days=10)),
+                'empty': Budget(user_id=user.id, category_id=fun.id, amount=8.0, period='weekly', start_date=now),
+            }
+            db.session.add_all(budgets.values())
+            db.session.add(Budget(user_id=user.id, category_id=food.id, amount=1.0, period='monthly',
+                                  start_date=now, is_active=False))
+            db.session.commit()
+            ids = {name: budget.id for name, budget in budgets.items()}
+            user_id = user.id
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            with app.test_request_context():
+                event.listen(db.engine, 'before_cursor_execute', record)
+                try:
+                    progress = BudgetProgress.for_user(user_id)
+                    spent = {item.budget.id: item.spent for item in progress}
+                    names = [item.budget.category.name for item in progress]
+                    assert BudgetProgress.for_user(user_id) is progress
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', record)
+                assert len(statements) == 1
+                assert len(names) == 5
+
+                in_month = 30.0 if week_start - timedelta(seconds=1) >= starts['monthly'] else 10.0
+                assert spent[ids['weekly']] == 10.0
+                assert spent[ids['monthly']] == in_month
+                assert spent[ids['yearly']] == (30.0 if week_start - timedelta(seconds=1) >= starts['yearly'] else 10.0)
+                assert spent[ids['custom']] == 5.0
+                assert spent[ids['empty']] == (7.0 if now - timedelta(days=2) >= week_start else 0.0)
+
+                weekly = next(item for item in progress if item.budget.id == ids['weekly'])
+                assert (weekly.percentage, weekly.level, weekly.within) == (100.0, 'exceeded', True)
+
+                # A flushed expense drops the per-request result
+                add(1.0, food, now)
+                db.session.commit()
+                refreshed = BudgetProgress.for_user(user_id)
+                assert refreshed is not progress
+                assert next(i for i in refreshed if i.budget.id == ids['weekly']).spent == 11.0
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_budget_pages_render_from_budget_progress():
+    from app import create_app, db
+    from app.models import Budget, Category, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='budget-pages-test@example.com', name='Budget Pages Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Groceries', icon='F')
+            db.session.add_all([wallet, food])
+            db.session.commit()
+            db.session.add(Budget(user_id=user.id, category_id=food.id, amount=50.0, period='monthly',
+                                  start_date=datetime.utcnow()))
+            db.session.add(Expense(user_id=user.id, amount=45.0, description='Shop', category_id=food.id,
+                                   wallet_id=wallet.id, date=datetime.utcnow()))
+            db.session.commit()
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user.id)
+
+            page = client.get('/budgets')
+            assert page.status_code == 200
+            assert b'GHS 45.00' in page.data and b'90.0% used' in page.data
+            planning = client.get('/budget-planning')
+            assert planning.status_code == 200
+            assert b'GHS 45.00 / 50.00' in planning.data
+            assert client.get('/').status_code == 200
+        finally:
+            db.session.remove()
+            db.drop_all()
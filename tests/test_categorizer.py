@@ -0,0 +1,119 @@
+from datetime import datetime
+
+
+def _keyword_scan(description, categories):
+    """The per-row keyword scan the compiled categorizer replaced."""
+    from app.categorizer import CATEGORY_KEYWORDS
+
+    desc_lower = (description or '').lower()
+    if not desc_lower:
+        return None
+    cat_name_map = {name.lower(): (category_id, name) for category_id, name in categories}
+    for cat_name, keywords in CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in desc_lower:
+                if cat_name.lower() in cat_name_map:
+                    return cat_name_map[cat_name.lower()]
+                for uname, category in cat_name_map.items():
+                    if cat_name.lower() in uname or uname in cat_name.lower():
+                        return category
+    return None
+
+
+def test_compiled_keywords_match_the_keyword_scan():
+    from app.categorizer import Categorizer
+
+    category_sets = [
+        [(1, 'Food'), (2, 'Transport'), (3, 'Shopping'), (4, 'Other')],
+        [(1, 'Food & Dining'), (2, 'Health'), (3, 'Transfer'), (4, 'Salary')],
+        [(1, 'Shopping'), (2, 'Utilities'), (3, 'Entertainment')],
+        [],
+    ]
+    descriptions = [
+        'POS SHOPRITE ACCRA MALL 0231', 'Shop rite', 'Uber trip', 'price of oil', 'MTN airtime topup',
+        'Netflix.com subscription', 'ATM withdrawal', 'mobile-money transfer', 'Kofi hardware',
+        'Business lunch at cafe', 'SHELL FUEL 22', '', None, 'school fees', 'Gas station', 'shopping',
+    ]
+    for categories in category_sets:
+        categorizer = Categorizer(categories)
+        for description in descriptions:
+            assert categorizer.match(description) == _keyword_scan(description, categories), (categories, description)
+
+    assert Categorizer([(1, 'Food'), (2, 'Other')]).default == (2, 'Other')
+    assert Categorizer([(5, 'Bills')]).default == (5, 'Bills')
+
+
+def test_categorizer_learns_merchants_and_is_cached_per_user():
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.automation_engine import _action_auto_categorize
+    from app.categorizer import categorizer_for
+    from app.models import Category, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='categorizer-test@example.com', name='Categorizer Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            hardware = Category(user_id=user.id, name='Home', icon='H')
+            other = Category(user_id=user.id, name='Other', icon='O')
+            db.session.add_all([wallet, food, hardware, other])
+            db.session.commit()
+
+            def add(description, category, when=datetime(2026, 1, 1)):
+                db.session.add(Expense(user_id=user.id, amount=5.0, description=description,
+                                       category_id=category.id, wallet_id=wallet.id, date=when))
+
+            # "Kofi hardware" is always filed under Home, even though "market" is a Food keyword
+            add('KOFI HARDWARE MARKET 001', hardware)
+            add('Kofi Hardware Market 002', hardware)
+            add('Kofi hardware market', food)
+            # Once is not a habit, and Other says nothing
+            add('Ama Fabrics', hardware)
+            add('Zed Shop', other)
+            add('Zed Shop', other)
+            db.session.commit()
+            user_id, food_id, hardware_id = user.id, food.id, hardware.id
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                categorizer = categorizer_for(user_id)
+                assert categorizer_for(user_id) is categorizer
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert len(statements) == 2
+
+            assert categorizer.match('POS kofi hardware market 7781') == (hardware_id, 'Home')
+            assert categorizer.match('Central market') == (food_id, 'Food')
+            assert categorizer.match('Ama fabrics') is None
+            assert categorizer.match('Zed Shop') is None
+
+            # The automation action infers the category when none is given
+            expense = Expense(user_id=user_id, amount=9.0, description='Kofi Hardware Market',
+                              category_id=food_id, wallet_id=wallet.id, date=datetime(2026, 2, 1))
+            db.session.add(expense)
+            db.session.commit()
+            result = _action_auto_categorize(user_id, {}, {'_expense_obj': expense})
+            assert result == 'Re-categorized from "Food" to "Home"'
+            assert expense.category_id == hardware_id
+
+            # Renaming a category rebuilds the matcher
+            db.session.get(Category, food_id).name = 'Groceries'
+            db.session.commit()
+            rebuilt = categorizer_for(user_id)
+            assert rebuilt is not categorizer
+            assert rebuilt.match('Central market') is None
+        finally:
+            db.session.remove()
+            db.drop_all()
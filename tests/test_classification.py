@@ -0,0 +1,78 @@
+from datetime import datetime
+
+
+def test_expense_flags_follow_type_tags_description_and_category():
+    """is_transfer / is_money_lent should be kept current on every write."""
+    from app import create_app, db
+    from app.models import Category, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='classify-test@example.com', name='Classify Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            transfer = Category(user_id=user.id, name='Transfer', icon='T')
+            db.session.add_all([wallet, food, transfer])
+            db.session.commit()
+
+            def expense(**values):
+                values.setdefault('transaction_type', 'expense')
+                values.setdefault('category_id', food.id)
+                return Expense(user_id=user.id, amount=10.0, wallet_id=wallet.id,
+                               date=datetime(2026, 5, 1), **values)
+
+            plain = expense(description='Groceries')
+            described = expense(description='Transfer to Savings')
+            typed = expense(description='Move', transaction_type='transfer_out')
+            by_category = expense(description='Move', category_id=transfer.id)
+            lent = expense(description='Loan', tags='family,DEBT_LENT')
+            new_category = Category(user_id=user.id, name='Money Lent', icon='L')
+            via_relationship = Expense(user_id=user.id, amount=5.0, wallet_id=wallet.id, description='Loan',
+                                       category=new_category, transaction_type='expense')
+            db.session.add_all([plain, described, typed, by_category, lent, via_relationship])
+            db.session.commit()
+
+            assert (plain.is_transfer, plain.is_money_lent) == (False, False)
+            assert described.is_transfer and typed.is_transfer and by_category.is_transfer
+            assert lent.is_money_lent and not lent.is_transfer
+            assert via_relationship.is_money_lent
+
+            plain.tags = 'transfer'
+            by_category.category_id = food.id
+            lent.tags = None
+            db.session.commit()
+
+            assert plain.is_transfer
+            assert not by_category.is_transfer
+            assert not lent.is_money_lent
+
+            # Bulk updates bypass the hook; the maintenance command repairs them
+            Expense.query.filter_by(id=plain.id).update({'tags': None, 'is_transfer': False})
+            Expense.query.filter_by(id=lent.id).update({'category_id': new_category.id})
+            db.session.commit()
+            result = app.test_cli_runner().invoke(args=['db-maintenance', 'reclassify-expenses'])
+            assert result.exit_code == 0
+            db.session.expire_all()
+            assert not db.session.get(Expense, plain.id).is_transfer
+            assert db.session.get(Expense, lent.id).is_money_lent
+            assert db.session.get(Expense, described.id).is_transfer
+
+            # Renaming a category to or from Transfer re-classifies its expenses
+            transfer.name = 'Moves'
+            db.session.commit()
+            food.name = 'Transfer'
+            db.session.commit()
+            assert db.session.get(Expense, by_category.id).is_transfer
+            assert db.session.get(Expense, plain.id).is_transfer
+            new_category.name = 'Loans'
+            db.session.commit()
+            assert not db.session.get(Expense, via_relationship.id).is_money_lent
+        finally:
+            db.session.remove()
+            db.drop_all()
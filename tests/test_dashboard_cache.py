@@ -0,0 +1,167 @@
+from datetime import datetime
+
+
+def test_memory_cache_evicts_least_recently_used():
+    from app.cache import MemoryCache
+
+    cache = MemoryCache(max_entries=2)
+    cache.set('a', 1, 60)
+    cache.set('b', 2, 60)
+    assert cache.get('a') == 1
+    cache.set('c', 3, 60)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    cache.set('d', 4, -1)
+    assert cache.get('d') is None
+
+
+def test_redis_cache_stores_json_not_pickle():
+    import json
+    from app.dashboard import RedisCache
+
+    class FakeConnection:
+        def __init__(self):
+            self.store = {}
+
+        def pipeline(self, *commands):
+            replies = []
+            for name, key, *args in commands:
+                if name == 'GET':
+                    replies.append(self.store.get(key))
+                elif name == 'SET':
+                    replies.append(self.store.__setitem__(key, args[0].encode()) or 'OK')
+            return replies
+
+    connection = FakeConnection()
+    cache = RedisCache(connection)
+    context = {'current_date': datetime(2026, 10, 18, 9, 30), 'oldest_date': datetime(2024, 1, 1),
+               'trend_amounts': [1.5, 2.0], 'budget_alerts': [{'level': 'warning'}], 'data_version': 3}
+    cache.set('7', context, 60)
+    assert json.loads(connection.store['dashboard:0:7'])['current_date'] == '2026-10-18T09:30:00'
+    assert cache.get('7') == context
+
+
+def test_dashboard_is_cached_until_the_users_data_changes():
+    """Repeat loads should hit the cache; a flushed write for that user should invalidate it."""
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.dashboard import dashboard_cache, data_version
+    from app.models import Category, ExchangeRate, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='dashboard-cache-test@example.com', name='Dashboard Cache Tester')
+            other = User(email='dashboard-cache-other@example.com', name='Other Tester')
+            for u in (user, other):
+                u.set_password('testpassword123')
+            db.session.add_all([user, other])
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=250.0, currency='GHS')
+            other_wallet = Wallet(user_id=other.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, other_wallet, food])
+            db.session.commit()
+            user_id, other_id, wallet_id, other_wallet_id, food_id = (
+                user.id, other.id, wallet.id, other_wallet.id, food.id)
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+
+            stats = dashboard_cache().stats
+            assert b'GHS 250.00' in client.get('/').data
+            assert stats()['misses'] == 1
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                assert client.get('/').status_code == 200
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert stats()['hits'] == 1
+            # Session user, recent transactions and the creditor due-date check only
+            assert len(statements) <= 4
+
+            # Another user's writes leave this entry alone
+            db.session.add(Expense(user_id=other_id, amount=5.0, description='Other', category_id=food_id,
+                                   wallet_id=other_wallet_id, date=datetime.utcnow()))
+            db.session.commit()
+            client.get('/')
+            assert stats()['hits'] == 2
+
+            db.session.get(Wallet, wallet_id).balance = 400.0
+            db.session.commit()
+            assert b'GHS 400.00' in client.get('/').data
+            assert stats()['misses'] == 2
+            assert stats()['hit_rate'] == 0.5
+
+            # A rate change bumps one shared version rather than every user's row
+            versions = data_version(user_id), data_version(other_id)
+            statements.clear()
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                db.session.add(ExchangeRate(from_currency='USD', to_currency='GHS', rate=15.0))
+                db.session.commit()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert not [s for s in statements if s.lstrip().upper().startswith('UPDATE') and 'data_version' in s]
+            assert data_version(user_id) != versions[0] and data_version(other_id) != versions[1]
+            assert data_version(user_id).split('.')[0] == versions[0].split('.')[0]
+            client.get('/')
+            assert stats()['misses'] == 3
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_dashboard_api_answers_unchanged_polls_with_304():
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import ApiKey, Category, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='dashboard-api-test@example.com', name='Dashboard API Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=100.0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, food, ApiKey(user_id=user.id, name='app',
+                                                     key_hash=generate_password_hash('dash-key'))])
+            db.session.commit()
+            user_id, wallet_id, food_id, version = user.id, wallet.id, food.id, user.data_version
+
+            client = app.test_client()
+            headers = {'X-API-Key': 'dash-key'}
+            first = client.get('/api/v1/dashboard', headers=headers)
+            assert first.status_code == 200
+            etag = first.headers['ETag']
+            assert not etag.startswith('W/')
+            assert first.get_json()['data']['total_wallet_balance'] == 100.0
+
+            again = client.get('/api/v1/dashboard', headers={**headers, 'If-None-Match': etag})
+            assert again.status_code == 304
+            assert again.data == b''
+
+            db.session.add(Expense(user_id=user_id, amount=30.0, description='Lunch', category_id=food_id,
+                                   wallet_id=wallet_id, date=datetime.utcnow()))
+            db.session.commit()
+            changed = client.get('/api/v1/dashboard', headers={**headers, 'If-None-Match': etag})
+            assert changed.status_code == 200
+            assert changed.headers['ETag'] != etag
+            assert changed.get_json()['data']['monthly_expenses'] == 30.0
+            db.session.expire_all()
+            assert db.session.get(User, user_id).data_version == version + 1
+        finally:
+            db.session.remove()
+            db.drop_all()
@@ -0,0 +1,177 @@
+import csv
+import gzip
+import io
+from datetime import datetime
+
+
+def test_csv_export_streams_selected_columns_and_dates():
+    from app import create_app, db
+    from app.export import stream_csv
+    from app.models import Category, Expense, User, Wallet
+
+    # Rows are flushed in chunks rather than built into one string
+    chunks = list(stream_csv(['N'], ([i] for i in range(5)), chunk_rows=2))
+    assert len(chunks) == 3 and b''.join(chunks).decode() == 'N\r\n0\r\n1\r\n2\r\n3\r\n4\r\n'
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='export-test@example.com', name='Export Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, food])
+            db.session.commit()
+            for day, amount in ((1, 10.0), (15, 20.5), (28, 30.0)):
+                db.session.add(Expense(user_id=user.id, amount=amount, description=f'Meal {day}', category_id=food.id,
+                                       wallet_id=wallet.id, date=datetime(2025, 3, day, 18), tags='lunch, work'))
+            db.session.commit()
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user.id)
+
+            full = client.get('/export/csv')
+            assert full.status_code == 200 and full.mimetype == 'text/csv'
+            assert 'Content-Length' not in full.headers
+            rows = list(csv.reader(io.StringIO(full.get_data(as_text=True))))
+            assert rows[0] == ['Date', 'Description', 'Category', 'Wallet', 'Amount', 'Type', 'Tags', 'Notes']
+            assert rows[1] == ['2025-03-28', 'Meal 28', 'Food', 'Cash', '30.0', 'expense', 'lunch, work', '']
+            assert len(rows) == 4
+
+            ranged = client.get('/settings/export-csv?start=2025-03-15&end=2025-03-28&columns=date,amount&gzip=1')
+            assert ranged.mimetype == 'application/gzip'
+            assert ranged.headers['Content-Disposition'].endswith('.csv.gz')
+            assert 'Content-Length' not in ranged.headers
+            assert gzip.decompress(ranged.data).decode() == 'Date,Amount\r\n2025-03-28,30.0\r\n2025-03-15,20.5\r\n'
+
+            assert client.get('/settings/export-csv?columns=password').status_code == 302
+            assert client.get('/export/csv?start=March').status_code == 302
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_pdf_and_excel_reports_are_built_from_streamed_rows(tmp_path):
+    from openpyxl import load_workbook
+    from app import create_app, db
+    from app.export import PDF_TABLE_ROWS
+    from app.models import Category, Expense, User, Wallet
+
+    app = create_app('testing')
+    app.config['EXPORT_STORAGE_DIR'] = str(tmp_path)
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='report-export-test@example.com', name='Report Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, food])
+            db.session.commit()
+            count = PDF_TABLE_ROWS * 2 + 5
+            db.session.add_all([Expense(user_id=user.id, amount=2.0, description=f'Item {i}', category_id=food.id,
+                                        wallet_id=wallet.id, date=datetime(2025, 1, 1 + i % 28))
+                                for i in range(count)])
+            db.session.add(Expense(user_id=user.id, amount=500.0, description='Salary', category_id=food.id,
+                                   wallet_id=wallet.id, transaction_type='income', date=datetime(2025, 2, 1)))
+            db.session.commit()
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user.id)
+
+            # Exports run as jobs; the testing config runs them inside the request
+            pdf = client.get('/export/pdf', follow_redirects=True)
+            assert pdf.status_code == 200 and b'Your file is ready.' in pdf.data
+            pdf = client.get(pdf.request.path + '/download')
+            assert pdf.status_code == 200 and pdf.data.startswith(b'%PDF')
+
+            excel = client.get(client.get('/export/excel').location + '/download')
+            assert excel.status_code == 200
+            wb = load_workbook(io.BytesIO(excel.data))
+            sheet = wb['Transactions']
+            assert [c.value for c in sheet[3]] == ['Date', 'Description', 'Category', 'Wallet', 'Type', 'Amount']
+            assert [c.value for c in sheet[4]] == ['01/02/2025', 'Salary', 'Food', 'Cash', 'Income', 500.0]
+            assert sheet.max_row == 3 + count + 1
+            summary = {row[0].value: row[1].value for row in wb['Summary'].iter_rows(min_row=3) if row[0].value}
+            assert summary == {'Total Income': 500.0, 'Total Expenses': 2.0 * count,
+                               'Net Balance': 500.0 - 2.0 * count, 'Total Transactions': count + 1}
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_dataset_archive_has_one_typed_parquet_file_per_table(tmp_path):
+    import zipfile
+    from decimal import Decimal
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from app import create_app, db
+    from app.export import write_parquet_archive
+    from app.models import Category, Expense, User, Wallet
+    from app.routes_backup import BACKUP_TABLES
+
+    app = create_app('testing')
+    app.config['EXPORT_STORAGE_DIR'] = str(tmp_path)
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='parquet-export-test@example.com', name='Parquet Tester')
+            other = User(email='parquet-export-other@example.com', name='Other Tester')
+            for u in (user, other):
+                u.set_password('testpassword123')
+            db.session.add_all([user, other])
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=Decimal('125.50'), currency='GHS', is_shared=True)
+            other_wallet = Wallet(user_id=other.id, name='Other', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, other_wallet, food])
+            db.session.commit()
+            db.session.add_all([Expense(user_id=user.id, amount=1.25, description=f'Item {i}', category_id=food.id,
+                                        wallet_id=wallet.id, date=datetime(2025, 3, 1, 9, 30))
+                                for i in range(5)])
+            db.session.commit()
+
+            path = tmp_path / 'direct.zip'
+            with open(path, 'wb') as out:
+                manifest = write_parquet_archive(out, user.id, BACKUP_TABLES, batch_size=2)
+            assert manifest['tables']['expenses'] == {'file': 'expenses.parquet', 'rows': 5}
+            assert manifest['tables']['wallets']['rows'] == 1
+
+            with zipfile.ZipFile(path) as archive:
+                assert set(archive.namelist()) == {f'{name}.parquet' for name, _ in BACKUP_TABLES} | {'manifest.json'}
+                expenses = pq.ParquetFile(io.BytesIO(archive.read('expenses.parquet')))
+                wallets = pq.read_table(io.BytesIO(archive.read('wallets.parquet')))
+                goals = pq.read_table(io.BytesIO(archive.read('goals.parquet')))
+
+            # Each yield_per batch is one row group, and types survive the round trip
+            assert expenses.metadata.num_row_groups == 3
+            schema = expenses.schema_arrow
+            assert schema.field('amount').type == pa.float64()
+            assert schema.field('date').type == pa.timestamp('us')
+            assert expenses.read().column('date')[0].as_py() == datetime(2025, 3, 1, 9, 30)
+            assert wallets.schema.field('is_shared').type == pa.bool_()
+            assert wallets.to_pylist()[0]['is_shared'] is True
+            assert wallets.column('balance').to_pylist() == [Decimal('125.50')]
+            assert goals.num_rows == 0 and 'target_amount' in goals.column_names
+
+            # The settings link queues the same archive as an export job
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user.id)
+            download = client.get(client.get('/settings/export-parquet').location + '/download')
+            assert download.status_code == 200 and download.mimetype == 'application/zip'
+            with zipfile.ZipFile(io.BytesIO(download.data)) as archive:
+                assert pq.read_table(io.BytesIO(archive.read('expenses.parquet'))).num_rows == 5
+        finally:
+            db.session.remove()
+            db.drop_all()
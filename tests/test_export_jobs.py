@@ -0,0 +1,192 @@
+import os
+from datetime import datetime, timedelta
+
+
+def test_export_jobs_run_in_a_worker_and_expire(tmp_path):
+    """Queued exports should be claimed once, report progress, download, and expire."""
+    from sqlalchemy import select
+    from app import create_app, db
+    from app.export_jobs import EXPORTERS, exporter, purge_expired, run_job
+    from app.models import Category, ExportJob, Expense, User, Wallet
+
+    app = create_app('testing')
+    app.config.update(EXPORT_WORKER='external', EXPORT_STORAGE_DIR=str(tmp_path))
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='export-jobs-test@example.com', name='Export Jobs Tester')
+            other = User(email='export-jobs-other@example.com', name='Other Tester')
+            for u in (user, other):
+                u.set_password('testpassword123')
+            db.session.add_all([user, other])
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, food])
+            db.session.commit()
+            db.session.add_all([Expense(user_id=user.id, amount=1.0, description=f'Item {i}', category_id=food.id,
+                                        wallet_id=wallet.id, date=datetime(2025, 1, 1) + timedelta(hours=i))
+                                for i in range(60)])
+            db.session.commit()
+            user_id, other_id = user.id, other.id
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+            json_headers = {'Accept': 'application/json'}
+
+            status_url = client.get('/export/excel').location
+            job_id = int(status_url.rsplit('/', 1)[1])
+            assert client.get(status_url, headers=json_headers).get_json()['status'] == 'pending'
+            assert client.get(status_url + '/download').status_code == 404
+            assert b'Preparing your file' in client.get(status_url).data
+
+            # A separate `flask worker` process (its own app context here) drains the queue
+            with app.app_context():
+                result = app.test_cli_runner().invoke(args=['worker', '--once'])
+            assert '✓ No pending export jobs' in result.output
+            assert run_job(job_id) is False  # already claimed and finished
+
+            status = client.get(status_url, headers=json_headers).get_json()
+            assert (status['status'], status['progress']) == ('done', 100)
+            download = client.get(status['download_url'])
+            assert download.status_code == 200 and download.data.startswith(b'PK')
+            assert download.headers['Content-Disposition'].endswith('.xlsx')
+
+            # Other users can't see the job
+            with app.app_context():
+                other_client = app.test_client()
+                with other_client.session_transaction() as sess:
+                    sess['_user_id'] = str(other_id)
+                assert other_client.get(status_url).status_code == 404
+
+            # Progress is written as rows are processed
+            seen = []
+
+            @exporter('test_progress')
+            def _progress_export(user, params, progress):
+                import io
+                for percent in range(0, 100, 10):
+                    progress(percent)
+                    seen.append(db.session.scalar(select(ExportJob.progress).where(ExportJob.id == params['job'])))
+                return io.BytesIO(b'ok'), 'progress.txt', 'text/plain'
+
+            try:
+                job = ExportJob(user_id=user_id, kind='test_progress', status='pending', progress=0)
+                db.session.add(job)
+                db.session.commit()
+                job.params = f'{{"job": {job.id}}}'
+                db.session.commit()
+                progress_job_id = job.id
+                assert run_job(progress_job_id)
+                assert seen == list(range(0, 100, 10))
+            finally:
+                EXPORTERS.pop('test_progress')
+
+            failed = ExportJob(user_id=user_id, kind='tax_pdf', params='{}', status='pending', progress=0)
+            db.session.add(failed)
+            db.session.commit()
+            failed_id = failed.id
+            run_job(failed_id)
+            failed = client.get(f'/exports/{failed_id}', headers=json_headers).get_json()
+            assert failed['status'] == 'failed' and failed['download_url'] is None
+
+            # Finished files are deleted once they expire
+            job = db.session.get(ExportJob, job_id)
+            stored = os.path.join(str(tmp_path), job.file_path)
+            assert os.path.exists(stored)
+            assert purge_expired(now=job.expires_at + timedelta(seconds=1)) == 2
+            assert not os.path.exists(stored)
+            assert db.session.get(ExportJob, job_id).status == 'expired'
+            assert client.get(status_url + '/download').status_code == 410
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_tax_and_newsletter_pdfs_are_queued(tmp_path):
+    from app import create_app, db
+    from app.models import ExportJob, User
+
+    app = create_app('testing')
+    app.config['EXPORT_STORAGE_DIR'] = str(tmp_path)
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='export-reports-test@example.com', name='Reports Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user.id)
+
+            for url, name in (('/tax-center/export-pdf?year=2025', 'tax_summary_2025.pdf'),
+                              ('/newsletter/download', 'financial_report_')):
+                status_url = client.get(url).location
+                download = client.get(status_url + '/download')
+                assert download.status_code == 200 and download.data.startswith(b'%PDF')
+                assert name in download.headers['Content-Disposition']
+            assert {job.status for job in ExportJob.query} == {'done'}
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_worker_survives_errors_and_requeues_stuck_jobs(tmp_path, monkeypatch):
+    """A failed pass is logged and retried; jobs whose heartbeat stopped are picked up again."""
+    import pytest
+    from app import create_app, db
+    from app import export_jobs
+    from app.models import ExportJob, User
+
+    app = create_app('testing')
+    app.config.update(EXPORT_WORKER='external', EXPORT_STORAGE_DIR=str(tmp_path), EXPORT_JOB_TIMEOUT=600)
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='export-worker-test@example.com', name='Worker Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            now = datetime.utcnow()
+            stuck = ExportJob(user_id=user.id, kind='transactions_excel', status='running', progress=40,
+                              started_at=now - timedelta(seconds=601), updated_at=now - timedelta(seconds=601))
+            # Started long ago but still reporting progress
+            busy = ExportJob(user_id=user.id, kind='transactions_excel', status='running', progress=40,
+                             started_at=now - timedelta(seconds=7200), updated_at=now - timedelta(seconds=60))
+            db.session.add_all([stuck, busy])
+            db.session.commit()
+            stuck_id, busy_id = stuck.id, busy.id
+
+            # The first pass fails; the loop logs it and sleeps instead of dying
+            class Stop(Exception):
+                pass
+
+            purge, failures = export_jobs.purge_expired, []
+
+            def flaky_purge(now=None):
+                if not failures:
+                    failures.append(now)
+                    raise RuntimeError('database went away')
+                return purge(now)
+
+            def sleep(seconds):
+                raise Stop
+
+            monkeypatch.setattr(export_jobs, 'purge_expired', flaky_purge)
+            monkeypatch.setattr(export_jobs.time, 'sleep', sleep)
+            with pytest.raises(Stop):
+                export_jobs.work(poll_interval=1)
+            assert failures
+
+            export_jobs.work(once=True)
+            assert db.session.get(ExportJob, stuck_id).status == 'done'
+            assert db.session.get(ExportJob, busy_id).status == 'running'
+        finally:
+            db.session.remove()
+            db.drop_all()
@@ -0,0 +1,213 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def test_file_provider_crosses_through_its_base(tmp_path):
+    from app.fx import create_provider
+
+    path = tmp_path / 'rates.json'
+    path.write_text(json.dumps({'base': 'USD', 'rates': {'GHS': 15.0, 'EUR': 0.5}}))
+    provider = create_provider(f'file://{path}')
+    assert provider.fetch('USD')['GHS'] == 15.0
+    eur = provider.fetch('eur')
+    assert eur['GHS'] == 30.0 and eur['USD'] == 2.0
+    assert provider.fetch('XYZ') == {}
+
+
+def test_refresh_is_single_flight_per_base():
+    from app.fx import RateCache, RateProvider
+
+    class SlowProvider(RateProvider):
+        calls = 0
+
+        def fetch(self, base):
+            SlowProvider.calls += 1
+            time.sleep(0.2)
+            return {'GHS': 15.0}
+
+    cache = RateCache(app=None, provider=SlowProvider())
+    cache.loaded = True
+    threads = [threading.Thread(target=cache.refresh, args=('USD',)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert SlowProvider.calls == 1
+    cache.provider = None
+    assert cache.get('USD', 'GHS') == 15.0
+    assert cache.get('GHS', 'USD') == 1 / 15.0
+
+
+def test_requests_read_rates_from_memory(tmp_path):
+    """Conversions should not query or fetch once warm; refreshes persist the pairs in use."""
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.fx import PERSIST_LEASE, RateCache, rate_cache
+    from app.models import ExchangeRate, SharedVersion
+    from app.utils import get_exchange_rate
+
+    path = tmp_path / 'rates.json'
+    path.write_text(json.dumps({'base': 'USD', 'rates': {'GHS': 16.0, 'EUR': 0.9, 'NGN': 1500.0}}))
+
+    app = create_app('testing')
+    app.config['FX_PROVIDER'] = f'file://{path}'
+
+    with app.app_context():
+        db.create_all()
+        try:
+            db.session.add_all([
+                ExchangeRate(from_currency='USD', to_currency='GHS', rate=14.0, date=datetime.utcnow() - timedelta(days=3)),
+                ExchangeRate(from_currency='USD', to_currency='GHS', rate=15.0, date=datetime.utcnow()),
+            ])
+            db.session.commit()
+
+            assert get_exchange_rate('USD', 'GHS') == 15.0  # warms the cache
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                assert [get_exchange_rate('USD', 'GHS') for _ in range(10)] == [15.0] * 10
+                assert get_exchange_rate('GHS', 'GHS') == 1.0
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            assert statements == []
+
+            # Reads never wait on an unknown pair; writes fetch it before converting
+            cache = rate_cache()
+            cache.provider, provider = None, cache.provider
+            assert cache.get('USD', 'EUR') is None
+            cache.provider = provider
+            assert get_exchange_rate('USD', 'EUR', fetch=True) == 0.9
+
+            assert cache.refresh('USD') == 3
+            assert get_exchange_rate('USD', 'EUR') == 0.9
+            assert get_exchange_rate('USD', 'NGN') == 1500.0
+            stored = {(r.to_currency, r.rate) for r in
+                      ExchangeRate.query.filter(ExchangeRate.rate.in_([16.0, 0.9, 1500.0]))}
+            assert stored == {('GHS', 16.0), ('EUR', 0.9)}
+
+            # Unchanged rates are not stored again; changed ones are stored once across processes
+            count = ExchangeRate.query.count()
+            assert cache.refresh('USD') == 3
+            assert ExchangeRate.query.count() == count
+            path.write_text(json.dumps({'base': 'USD', 'rates': {'GHS': 16.5, 'EUR': 0.9, 'NGN': 1500.0}}))
+            other = RateCache(app, cache.provider)
+            other.load()
+            assert other.refresh('USD') == 3  # inside the first process's claim: memory only
+            assert ExchangeRate.query.count() == count
+            assert other.get('USD', 'GHS') == 16.5
+            claim = db.session.get(SharedVersion, 'fx_persist:USD')
+            claim.updated_at -= timedelta(seconds=PERSIST_LEASE)
+            db.session.commit()
+            cache.refresh('USD')
+            added = ExchangeRate.query.order_by(ExchangeRate.id).offset(count).all()
+            assert {(r.to_currency, r.rate) for r in added} == {('GHS', 16.5), ('NGN', 1500.0)}
+
+            # Manual rates committed elsewhere reach the cache without a reload
+            db.session.add(ExchangeRate(from_currency='GBP', to_currency='GHS', rate=19.5))
+            db.session.commit()
+            assert get_exchange_rate('GBP', 'GHS') == 19.5
+
+            runner = app.test_cli_runner()
+            result = runner.invoke(args=['db-maintenance', 'refresh-rates', '--base', 'eur'])
+            assert '✓ EUR' in result.output
+            assert get_exchange_rate('EUR', 'GHS') == 16.5 * (1 / 0.9)
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_first_foreign_expense_is_stored_at_the_fetched_rate(tmp_path):
+    """A write in a never-seen currency waits for its rate instead of storing 1:1."""
+    from app import create_app, db
+    from app.models import Category, Expense, User, Wallet
+
+    path = tmp_path / 'rates.json'
+    path.write_text(json.dumps({'base': 'USD', 'rates': {'GHS': 16.0}}))
+
+    app = create_app('testing')
+    app.config['FX_PROVIDER'] = f'file://{path}'
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='fx-write-test@example.com', name='FX Write Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, food])
+            db.session.commit()
+            user_id, wallet_id, food_id = user.id, wallet.id, food.id
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+            response = client.post('/add', data={
+                'description': 'Books', 'category': str(food_id), 'wallet': str(wallet_id),
+                'amount': '10', 'currency': 'USD', 'date': '2026-05-01', 'transaction_type': 'expense',
+            })
+            assert response.status_code == 302
+            expense = Expense.query.filter_by(user_id=user_id).one()
+            assert (expense.amount, expense.original_amount, expense.original_currency) == (160.0, 10.0, 'USD')
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_bulk_conversion_uses_the_rate_in_effect_on_each_date():
+    from app import create_app, db
+    from app.aggregates import monthly_totals
+    from app.fx import RateHistory, convert_amounts
+    from app.models import Category, ExchangeRate, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            db.session.add_all([
+                ExchangeRate(from_currency='USD', to_currency='GHS', rate=10.0, date=datetime(2025, 1, 1)),
+                ExchangeRate(from_currency='USD', to_currency='GHS', rate=12.0, date=datetime(2025, 6, 1)),
+                # Stored the other way round; inverted into the EUR series
+                ExchangeRate(from_currency='GHS', to_currency='EUR', rate=0.05, date=datetime(2025, 3, 1)),
+            ])
+            db.session.commit()
+
+            history = RateHistory.load('GHS', {'USD', 'EUR', 'GHS'})
+            assert history.rates_at('USD', [datetime(2024, 12, 1), datetime(2025, 5, 31), datetime(2025, 6, 1)]).tolist() \
+                == [10.0, 10.0, 12.0]
+
+            converted = convert_amounts(
+                [1, 1, 2, 3, 4],
+                ['USD', 'usd', 'EUR', 'GHS', 'XYZ'],
+                [datetime(2025, 2, 1), datetime(2025, 7, 1), datetime(2025, 4, 1), None, None],
+                'GHS',
+            )
+            assert converted.tolist() == [10.0, 12.0, 40.0, 3.0, 4.0]
+
+            user = User(email='fx-history-test@example.com', name='FX History Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            usd = Wallet(user_id=user.id, name='Dollars', balance=0, currency='USD')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([usd, food])
+            db.session.commit()
+            for month in (2, 7):
+                db.session.add(Expense(user_id=user.id, amount=5.0, description='Lunch', category_id=food.id,
+                                       wallet_id=usd.id, date=datetime(2025, month, 10)))
+            db.session.commit()
+
+            totals = monthly_totals(user.id, [(2025, 2), (2025, 7)], currency='GHS', summaries=False)
+            assert totals[(2025, 2)].expense == 50.0
+            assert totals[(2025, 7)].expense == 60.0
+        finally:
+            db.session.remove()
+            db.drop_all()
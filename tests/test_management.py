@@ -0,0 +1,21 @@
+def test_index_report_finds_no_full_scans_on_hot_queries():
+    """The hot dashboard/budget queries should all be served by an index."""
+    from app import create_app, db
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            runner = app.test_cli_runner()
+            result = runner.invoke(args=['db-maintenance', 'index-report'])
+
+            assert result.exit_code == 0
+            assert 'INDEX REPORT (sqlite)' in result.output
+            assert 'FULL TABLE SCAN' not in result.output
+            assert 'ix_expense_user_type_date' in result.output
+            assert 'ix_expense_user_category_date' in result.output
+            assert 'All hot queries use an index' in result.output
+        finally:
+            db.session.remove()
+            db.drop_all()
@@ -0,0 +1,77 @@
+import re
+from datetime import datetime, timedelta
+
+
+def test_transactions_pages_by_cursor_with_sql_totals():
+    """/transactions should page on (date, id) while count and total cover every filtered row."""
+    from app import create_app, db
+    from app.models import Category, ExchangeRate, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='pagination-test@example.com', name='Pagination Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            ghs = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            usd = Wallet(user_id=user.id, name='Dollars', balance=0, currency='USD')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([ghs, usd, food])
+            db.session.add(ExchangeRate(from_currency='USD', to_currency='GHS', rate=15.0, date=datetime.utcnow()))
+            db.session.commit()
+
+            start = datetime(2026, 1, 1)
+            # Pairs of rows share a date so the id tie-breaker matters
+            for i in range(60):
+                db.session.add(Expense(user_id=user.id, amount=1.0, description=f'Item {i}', category_id=food.id,
+                                       wallet_id=ghs.id, date=start + timedelta(days=i // 2)))
+            db.session.add(Expense(user_id=user.id, amount=10.0, description='Hosting', category_id=food.id,
+                                   wallet_id=usd.id, date=start))
+            # Legacy row: stored in a GHS wallet but never converted from USD
+            db.session.add(Expense(user_id=user.id, amount=2.0, original_amount=2.0, original_currency='USD',
+                                   description='Legacy', category_id=food.id, wallet_id=ghs.id, date=start))
+            db.session.commit()
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user.id)
+
+            def fetch(**params):
+                response = client.get('/transactions', query_string={'ajax': '1', **params})
+                assert response.status_code == 200
+                return response.get_json()
+
+            for order in ('desc', 'asc'):
+                seen, cursor, pages = [], None, 0
+                while True:
+                    data = fetch(order=order, **({'cursor': cursor} if cursor else {}))
+                    assert data['count'] == 62
+                    assert data['total_display'] == 'GHS 240.00'
+                    seen += [int(row_id) for row_id in
+                             re.findall(r'id="expense-(\d+)"', data['html'])]
+                    pages += 1
+                    cursor = data['next_cursor']
+                    if not cursor:
+                        break
+                assert pages == 2
+                assert len(seen) == len(set(seen)) == 62
+
+                expected = Expense.query.order_by(
+                    *((Expense.date.desc(), Expense.id.desc()) if order == 'desc' else (Expense.date, Expense.id))
+                ).all()
+                assert seen == [e.id for e in expected]
+
+            by_amount = fetch(sort='amount', order='desc')
+            assert 'Hosting' in by_amount['html'].split('id="expense-')[1]
+
+            assert fetch(cursor='not-a-cursor')['next_cursor'] is not None
+
+            page = client.get('/transactions')
+            assert b'62 transaction(s)' in page.data
+            assert b'data-next-cursor="' in page.data
+        finally:
+            db.session.remove()
+            db.drop_all()
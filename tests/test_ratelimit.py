@@ -0,0 +1,157 @@
+import socket
+import socketserver
+import threading
+import time
+
+
+class _FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Local stand-in speaking the subset of RESP the Redis backend uses."""
+
+    def _read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            command = self._read_command()
+            if command is None:
+                return
+            name, args = command[0].upper(), command[1:]
+            with self.server.lock:
+                now = time.time()
+                for key in [k for k, (_, expires) in store.items() if expires and expires <= now]:
+                    del store[key]
+                if name == 'SET':
+                    key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+                    if 'NX' in options and key in store:
+                        reply = b'$-1\r\n'
+                    else:
+                        ttl = int(options[options.index('EX') + 1]) if 'EX' in options else None
+                        store[key] = (int(value), now + ttl if ttl else None)
+                        reply = b'+OK\r\n'
+                elif name == 'INCR':
+                    value, expires = store.get(args[0], (0, None))
+                    store[args[0]] = (value + 1, expires)
+                    reply = b':%d\r\n' % (value + 1)
+                else:
+                    reply = b'-ERR unknown command\r\n'
+            self.wfile.write(reply)
+
+
+def test_memory_backend_evicts_idle_buckets():
+    from app.api.ratelimit import MemoryBackend
+
+    backend = MemoryBackend(idle_ttl=60)
+    assert backend.hit('a', 2, 60)[:2] == (True, 1)
+    assert backend.hit('a', 2, 60)[:2] == (True, 0)
+    assert backend.hit('a', 2, 60)[0] is False
+    backend.hit('b', 2, 60)
+    assert backend.evict_idle(now=time.time() + 120) == 2
+    assert backend.buckets == {}
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    from app.api.ratelimit import create_backend
+
+    url = f'sqlite:///{tmp_path}/limits.db'
+    worker_a, worker_b = create_backend(url), create_backend(url)
+    results = [worker.hit('key', 3, 60)[0] for worker in (worker_a, worker_b, worker_a, worker_b)]
+    assert results == [True, True, True, False]
+    assert worker_b.evict_idle(now=time.time() + 10_000) == 1
+
+
+def test_redis_backend_counts_per_window_against_stand_in():
+    from app.api.ratelimit import create_backend
+
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _FakeRedisHandler)
+    server.daemon_threads = True
+    server.store, server.lock = {}, threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        backend = create_backend(f'redis://127.0.0.1:{server.server_address[1]}/0')
+        outcomes = [backend.hit('key', 2, 60) for _ in range(3)]
+        assert [o[0] for o in outcomes] == [True, True, False]
+        assert [o[1] for o in outcomes] == [1, 0, 0]
+        # The counter was created with its expiry
+        assert all(expires for _, expires in server.store.values())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_redis_connection_stays_in_sync_and_never_resends():
+    """An error reply must not strand later replies, and a lost reply must not repeat the INCR."""
+    from app.api.ratelimit import RedisConnection, RedisError
+
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _FakeRedisHandler)
+    server.daemon_threads = True
+    server.store, server.lock = {}, threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = RedisConnection('127.0.0.1', server.server_address[1])
+        try:
+            connection.pipeline(('BOGUS',), ('INCR', 'key'))
+            assert False, 'error reply should raise'
+        except RedisError:
+            pass
+        assert connection.pipeline(('INCR', 'key')) == [2]
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # A server that reads the commands but never answers: the read times out once
+    with socket.create_server(('127.0.0.1', 0)) as silent:
+        connection = RedisConnection('127.0.0.1', silent.getsockname()[1], timeout=0.2)
+        try:
+            connection.pipeline(('INCR', 'key'))
+            assert False, 'missing reply should raise'
+        except OSError:
+            pass
+        assert connection.sock is None
+        peer, _ = silent.accept()
+        with peer:
+            assert peer.recv(4096).count(b'INCR') == 1
+        silent.settimeout(0.2)
+        try:
+            silent.accept()
+            assert False, 'the command should not be resent on a new connection'
+        except socket.timeout:
+            pass
+
+
+def test_api_applies_per_key_limits():
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import ApiKey, User
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='ratelimit-test@example.com', name='Rate Limit Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            db.session.add(ApiKey(user_id=user.id, name='tight', rate_limit=2,
+                                  key_hash=generate_password_hash('tight-key')))
+            db.session.commit()
+
+            client = app.test_client()
+            statuses = [client.get('/api/v1/wallets', headers={'X-API-Key': 'tight-key'}) for _ in range(3)]
+            assert [r.status_code for r in statuses] == [200, 200, 429]
+            assert statuses[0].headers['X-RateLimit-Limit'] == '2'
+            assert statuses[2].get_json()['message'] == 'Maximum 2 requests per minute allowed'
+        finally:
+            db.session.remove()
+            db.drop_all()
@@ -0,0 +1,165 @@
+from datetime import datetime
+
+
+def _rollup_rows(user_id):
+    from app.models import MonthlyRollup
+
+    return {
+        (r.year, r.month, r.category_id, r.transaction_type): (round(r.total, 2), round(r.transfer_total, 2),
+                                                               round(r.lent_total, 2), r.count)
+        for r in MonthlyRollup.query.filter_by(user_id=user_id).all()
+    }
+
+
+def test_monthly_rollups_follow_inserts_updates_and_deletes():
+    """Rollups should track Expense and payment writes and match a full rebuild."""
+    from app import create_app, db
+    from app.models import Category, Creditor, DebtPayment, Expense, User, Wallet
+    from app.rollups import rebuild_rollups, rollup_month_totals
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='rollup-test@example.com', name='Rollup Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=1000.00, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            lent = Category(user_id=user.id, name='Money Lent', icon='L')
+            db.session.add_all([wallet, food, lent])
+            db.session.commit()
+            user_id = user.id
+
+            lunch = Expense(user_id=user_id, amount=40.0, description='Lunch', category_id=food.id,
+                            wallet_id=wallet.id, transaction_type='expense', date=datetime(2026, 3, 4))
+            dinner = Expense(user_id=user_id, amount=60.0, description='Dinner', category_id=food.id,
+                             wallet_id=wallet.id, transaction_type='expense', date=datetime(2026, 3, 9))
+            moved = Expense(user_id=user_id, amount=25.0, description='Transfer to Bank', category_id=food.id,
+                            wallet_id=wallet.id, transaction_type='expense', date=datetime(2026, 3, 10))
+            loan = Expense(user_id=user_id, amount=100.0, description='Loan to Ama', category_id=lent.id,
+                           wallet_id=wallet.id, transaction_type='expense', tags='debt_lent',
+                           date=datetime(2026, 3, 12))
+            creditor = Creditor(user_id=user_id, name='Bank', amount=500.0)
+            db.session.add_all([lunch, dinner, moved, loan, creditor])
+            db.session.commit()
+            db.session.add(DebtPayment(user_id=user_id, creditor_id=creditor.id, amount=30.0,
+                                       date=datetime(2026, 3, 15)))
+            db.session.commit()
+
+            rows = _rollup_rows(user_id)
+            assert rows[(2026, 3, food.id, 'expense')] == (125.0, 25.0, 0.0, 3)
+            assert rows[(2026, 3, lent.id, 'expense')] == (100.0, 0.0, 100.0, 1)
+            assert rows[(2026, 3, 0, 'debt_payment')] == (30.0, 0.0, 0.0, 1)
+
+            # Move one row to another month and change another's amount
+            dinner.date = datetime(2026, 4, 2)
+            lunch.amount = 50.0
+            db.session.commit()
+            db.session.delete(moved)
+            db.session.commit()
+
+            rows = _rollup_rows(user_id)
+            assert rows[(2026, 3, food.id, 'expense')] == (50.0, 0.0, 0.0, 1)
+            assert rows[(2026, 4, food.id, 'expense')] == (60.0, 0.0, 0.0, 1)
+
+            totals = rollup_month_totals(user_id, [(2026, 3), (2026, 4)], lent_category_id=lent.id)
+            assert totals[(2026, 3)]['expense'] == 150.0
+            assert totals[(2026, 3)]['lent'] == 100.0
+            assert totals[(2026, 3)]['debt_payment'] == 30.0
+            assert totals[(2026, 4)]['expense'] == 60.0
+
+            incremental = _rollup_rows(user_id)
+            rebuild_rollups(user_id)
+            db.session.commit()
+            assert _rollup_rows(user_id) == incremental
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_rebuild_rollups_command_backfills_rows():
+    """The CLI backfill should recreate rollups that were never written."""
+    from app import create_app, db
+    from app.models import Category, Expense, MonthlyRollup, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='rollup-cli@example.com', name='Rollup CLI')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            category = Category(user_id=user.id, name='Salary', icon='S')
+            db.session.add_all([wallet, category])
+            db.session.commit()
+            db.session.add(Expense(user_id=user.id, amount=900.0, description='Pay', category_id=category.id,
+                                   wallet_id=wallet.id, transaction_type='income', date=datetime(2025, 12, 28)))
+            db.session.commit()
+            MonthlyRollup.query.delete()
+            db.session.commit()
+
+            result = app.test_cli_runner().invoke(args=['db-maintenance', 'rebuild-rollups'])
+
+            assert result.exit_code == 0
+            assert 'Wrote 1 rollup rows' in result.output
+            rollup = MonthlyRollup.query.one()
+            assert (rollup.year, rollup.month, rollup.transaction_type, rollup.total) == (2025, 12, 'income', 900.0)
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_concurrently_created_bucket_receives_the_delta():
+    """Losing the race to create a bucket adds to the winner's row instead of failing or duplicating it."""
+    from sqlalchemy import insert
+    from sqlalchemy.sql import Update
+    from app import create_app, db
+    from app.models import MonthlyRollup, User
+    from app.rollups import PAYMENT_CATEGORY, apply_deltas
+
+    class RacingConnection:
+        """Creates the bucket from 'another transaction' right after our UPDATE misses it."""
+
+        def __init__(self, connection):
+            self.connection = connection
+            self.raced = False
+
+        def execute(self, statement, *args):
+            result = self.connection.execute(statement, *args)
+            if isinstance(statement, Update) and not self.raced:
+                self.raced = True
+                self.connection.execute(insert(MonthlyRollup.__table__), {
+                    'user_id': user_id, 'year': 2026, 'month': 5, 'category_id': PAYMENT_CATEGORY,
+                    'transaction_type': 'debt_payment', 'total': 10.0, 'transfer_total': 0.0,
+                    'lent_total': 0.0, 'count': 1,
+                })
+            return result
+
+        def begin_nested(self):
+            return self.connection.begin_nested()
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='rollup-race@example.com', name='Rollup Race')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+            apply_deltas(RacingConnection(db.session.connection()),
+                         {(user_id, 2026, 5, PAYMENT_CATEGORY, 'debt_payment'): (25.0, 0.0, 0.0, 1)})
+            db.session.commit()
+
+            assert _rollup_rows(user_id) == {(2026, 5, 0, 'debt_payment'): (35.0, 0.0, 0.0, 2)}
+        finally:
+            db.session.remove()
+            db.drop_all()
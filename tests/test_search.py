@@ -0,0 +1,63 @@
+from datetime import datetime
+
+
+def test_transaction_search_uses_prefix_full_text_index():
+    """Search should match word prefixes, follow edits and rank the best match first."""
+    from app import create_app, db
+    from app.models import Category, Expense, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='search-test@example.com', name='Search Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, food])
+            db.session.commit()
+
+            def expense(description, **extra):
+                return Expense(user_id=user.id, amount=10.0, description=description,
+                               category_id=food.id, wallet_id=wallet.id,
+                               date=extra.pop('date', datetime(2026, 5, 1)), **extra)
+
+            groceries = expense('Groceries at Shoprite', date=datetime(2026, 5, 1))
+            mention = expense('Taxi', notes='dropped groceries home', date=datetime(2026, 5, 3))
+            tagged = expense('Lunch', tags='work,debt_lent')
+            fuel = expense('Fuel')
+            db.session.add_all([groceries, mention, tagged, fuel])
+            db.session.commit()
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user.id)
+
+            def search(q, **params):
+                response = client.get('/transactions', query_string={'search': q, 'ajax': '1', **params})
+                assert response.status_code == 200
+                return response.get_json()
+
+            assert search('groc')['count'] == 2
+            assert search('groc shop')['count'] == 1
+            assert search('debt_lent')['count'] == 1
+            assert search('DEBT')['count'] == 1
+            assert search('%')['count'] == 0
+
+            # Both description words hit the first row; it outranks the newer notes-only match
+            html = search('groceries')['html']
+            assert html.index('Groceries at Shoprite') < html.index('Taxi')
+
+            fuel.description = 'Fuel for groceries run'
+            db.session.commit()
+            assert search('groc')['count'] == 3
+
+            db.session.delete(groceries)
+            db.session.commit()
+            assert search('shoprite')['count'] == 0
+        finally:
+            db.session.remove()
+            db.drop_all()
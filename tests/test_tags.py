@@ -0,0 +1,109 @@
+from datetime import datetime
+
+
+def test_tag_rows_follow_expense_tags_and_back_lookups():
+    """Tag / expense_tag rows should mirror Expense.tags on every write."""
+    from app import create_app, db
+    from app.automation_engine import _action_add_tags
+    from app.models import Category, Expense, Tag, User, Wallet
+    from app.tags import has_tag, parse_tags
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='tags-test@example.com', name='Tags Tester')
+            other = User(email='tags-other@example.com', name='Other Tester')
+            user.set_password('testpassword123')
+            other.set_password('testpassword123')
+            db.session.add_all([user, other])
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, food])
+            db.session.commit()
+
+            def expense(tags, user_id=user.id):
+                return Expense(user_id=user_id, amount=10.0, description='Item', tags=tags,
+                               category_id=food.id, wallet_id=wallet.id, date=datetime(2026, 5, 1))
+
+            def tagged(tag):
+                return Expense.query.filter(Expense.user_id == user.id, has_tag(user.id, tag))
+
+            assert parse_tags(' Work, travel,,work ') == ['work', 'travel']
+
+            work = expense('Work, travel')
+            bad_debt = expense('bad_debt')
+            recovery = expense('bad_debt_recovery')
+            elsewhere = expense('work', user_id=other.id)
+            db.session.add_all([work, bad_debt, recovery, elsewhere])
+            db.session.commit()
+
+            assert [e.id for e in tagged('WORK')] == [work.id]
+            # Exact match: 'bad_debt' no longer picks up 'bad_debt_recovery'
+            assert [e.id for e in tagged('bad_debt')] == [bad_debt.id]
+            assert Tag.query.filter_by(user_id=user.id).count() == 4
+
+            work.tags = 'travel'
+            db.session.commit()
+            assert tagged('work').count() == 0
+            assert [t.name for t in work.tag_items] == ['travel']
+
+            result = _action_add_tags(user.id, {'tags': 'Travel, urgent'}, {'_expense_obj': work})
+            db.session.commit()
+            assert result == 'Tags updated: travel,urgent'
+            assert [e.id for e in tagged('urgent')] == [work.id]
+
+            db.session.delete(work)
+            db.session.commit()
+            assert tagged('travel').count() == 0
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def test_tag_creation_survives_a_concurrent_insert():
+    """A tag created by another request between the lookup and the insert is reused, not duplicated."""
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.models import Category, Expense, Tag, User, Wallet
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(email='tags-race@example.com', name='Tags Tester')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, name='Cash', balance=0, currency='GHS')
+            food = Category(user_id=user.id, name='Food', icon='F')
+            db.session.add_all([wallet, food])
+            db.session.commit()
+            user_id = user.id
+
+            # The other request commits 'work' just before our SAVEPOINT'd insert
+            raced = []
+
+            def concurrent_insert(conn, cursor, statement, *args):
+                if statement.startswith(('SAVEPOINT', 'INSERT INTO tag ')) and not raced:
+                    raced.append(statement)
+                    conn.exec_driver_sql('INSERT INTO tag (user_id, name) VALUES (?, ?)', (user_id, 'work'))
+
+            event.listen(db.engine, 'before_cursor_execute', concurrent_insert)
+            try:
+                expense = Expense(user_id=user_id, amount=10.0, description='Item', tags='Work, travel',
+                                  category_id=food.id, wallet_id=wallet.id, date=datetime(2026, 5, 1))
+                db.session.add(expense)
+                db.session.commit()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', concurrent_insert)
+
+            assert raced
+            assert sorted(t.name for t in Tag.query.filter_by(user_id=user_id)) == ['travel', 'work']
+            assert sorted(t.name for t in db.session.get(Expense, expense.id).tag_items) == ['travel', 'work']
+        finally:
+            db.session.remove()
+            db.drop_all()